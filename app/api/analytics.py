@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from ..sdk.analytics_agent import AnalyticsAgent
+from ..sdk.executor import run_blocking
+from .deps import agent_dependency
 
 router = APIRouter()
 
@@ -12,6 +14,9 @@ class PerformanceRequest(BaseModel):
     end_date: Optional[str] = None
     metrics: Optional[str] = None
 
+class BatchPerformanceRequest(BaseModel):
+    video_ids: List[str]
+
 class AudienceRequest(BaseModel):
     video_id: str
 
@@ -20,6 +25,7 @@ class OptimizationRequest(BaseModel):
     metrics: Dict[str, Any]
     audience_data: Dict[str, Any]
     video_metadata: Dict[str, Any]
+    use_cache: bool = True  # False 时绕过LLM响应缓存
 
 class KeywordTrackingRequest(BaseModel):
     video_id: str
@@ -32,6 +38,11 @@ class ABTestRequest(BaseModel):
 class PerformanceResponse(BaseModel):
     metrics: Dict[str, Any]
 
+class BatchPerformanceResponse(BaseModel):
+    metrics: Dict[str, Dict[str, Any]]
+    errors: Dict[str, str]
+    requests: int  # 实际发出的 videos().list 次数（每次最多 50 个视频）
+
 class AudienceResponse(BaseModel):
     insights: Dict[str, Any]
 
@@ -45,10 +56,10 @@ class ABTestResponse(BaseModel):
     suggestions: List[Dict[str, str]]
 
 @router.post("/analytics/performance", response_model=PerformanceResponse)
-async def get_video_performance(request: PerformanceRequest):
+async def get_video_performance(request: PerformanceRequest, agent: AnalyticsAgent = Depends(agent_dependency(AnalyticsAgent))):
     try:
-        agent = AnalyticsAgent()
-        metrics = agent.get_performance_metrics(
+        metrics = await run_blocking(
+            agent.get_performance_metrics,
             video_id=request.video_id,
             start_date=request.start_date,
             end_date=request.end_date
@@ -59,11 +70,21 @@ async def get_video_performance(request: PerformanceRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
+@router.post("/analytics/performance/batch", response_model=BatchPerformanceResponse)
+async def get_batch_video_performance(request: BatchPerformanceRequest, agent: AnalyticsAgent = Depends(agent_dependency(AnalyticsAgent))):
+    """批量获取视频指标：每 50 个视频合并为一次 API 请求，返回各视频的指标与失败原因"""
+    try:
+        result = await run_blocking(agent.get_batch_performance_metrics, request.video_ids)
+        return BatchPerformanceResponse(**result)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
 @router.post("/analytics/audience", response_model=AudienceResponse)
-async def get_audience_insights(request: AudienceRequest):
+async def get_audience_insights(request: AudienceRequest, agent: AnalyticsAgent = Depends(agent_dependency(AnalyticsAgent))):
     try:
-        agent = AnalyticsAgent()
-        insights = agent.get_audience_insights(video_id=request.video_id)
+        insights = await run_blocking(agent.get_audience_insights, video_id=request.video_id)
         return AudienceResponse(insights=insights)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -71,13 +92,13 @@ async def get_audience_insights(request: AudienceRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
 @router.post("/analytics/optimize", response_model=OptimizationResponse)
-async def get_optimization_suggestions(request: OptimizationRequest):
+async def get_optimization_suggestions(request: OptimizationRequest, agent: AnalyticsAgent = Depends(agent_dependency(AnalyticsAgent))):
     try:
-        agent = AnalyticsAgent()
-        suggestions = agent.generate_optimization_suggestions(
+        suggestions = await agent.agenerate_optimization_suggestions(
             metrics=request.metrics,
             audience_data=request.audience_data,
-            video_metadata=request.video_metadata
+            video_metadata=request.video_metadata,
+            use_cache=request.use_cache
         )
         return OptimizationResponse(suggestions=suggestions)
     except ValueError as e:
@@ -86,10 +107,10 @@ async def get_optimization_suggestions(request: OptimizationRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
 @router.post("/analytics/keywords", response_model=KeywordTrackingResponse)
-async def track_keyword_performance(request: KeywordTrackingRequest):
+async def track_keyword_performance(request: KeywordTrackingRequest, agent: AnalyticsAgent = Depends(agent_dependency(AnalyticsAgent))):
     try:
-        agent = AnalyticsAgent()
-        performance = agent.track_keyword_performance(
+        performance = await run_blocking(
+            agent.track_keyword_performance,
             video_id=request.video_id,
             keywords=request.keywords
         )
@@ -100,10 +121,10 @@ async def track_keyword_performance(request: KeywordTrackingRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
 @router.post("/analytics/ab-test", response_model=ABTestResponse)
-async def get_ab_test_suggestions(request: ABTestRequest):
+async def get_ab_test_suggestions(request: ABTestRequest, agent: AnalyticsAgent = Depends(agent_dependency(AnalyticsAgent))):
     try:
-        agent = AnalyticsAgent()
-        suggestions = agent.generate_ab_test_suggestions(
+        suggestions = await run_blocking(
+            agent.generate_ab_test_suggestions,
             video_id=request.video_id,
             current_metrics=request.current_metrics
         )
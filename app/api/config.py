@@ -1,5 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from typing import Dict, List
+from ..sdk.llm_cache import get_llm_cache
+from ..sdk.search_cache import get_search_cache
+from ..sdk.registry import registry
 
 router = APIRouter()
 
@@ -10,6 +14,13 @@ class LockStatusResponse(BaseModel):
     locked: bool
     message: str
 
+class CacheStatsResponse(BaseModel):
+    enabled: bool
+    stats: Dict[str, int]
+
+class ReloadAgentsResponse(BaseModel):
+    reloaded: List[str]
+
 @router.get("/config/lock-status", response_model=LockStatusResponse)
 async def get_lock_status():
     return LockStatusResponse(
@@ -25,3 +36,30 @@ async def toggle_lock():
         locked=api_locked,
         message="API is now locked" if api_locked else "API is now unlocked"
     )
+
+@router.get("/config/llm-cache", response_model=CacheStatsResponse)
+async def get_llm_cache_stats():
+    cache = get_llm_cache()
+    return CacheStatsResponse(enabled=cache.enabled, stats=cache.stats())
+
+@router.delete("/config/llm-cache", response_model=CacheStatsResponse)
+async def clear_llm_cache():
+    cache = get_llm_cache()
+    cache.clear()
+    return CacheStatsResponse(enabled=cache.enabled, stats=cache.stats())
+
+@router.get("/config/search-cache", response_model=CacheStatsResponse)
+async def get_search_cache_stats():
+    cache = get_search_cache()
+    return CacheStatsResponse(enabled=cache.enabled, stats=cache.stats())
+
+@router.delete("/config/search-cache", response_model=CacheStatsResponse)
+async def clear_search_cache():
+    cache = get_search_cache()
+    cache.clear()
+    return CacheStatsResponse(enabled=cache.enabled, stats=cache.stats())
+
+@router.post("/config/reload-agents", response_model=ReloadAgentsResponse)
+async def reload_agents():
+    """重新读取 .env，已构建的 Agent 将在下次请求时按新配置重建"""
+    return ReloadAgentsResponse(reloaded=registry.reload())
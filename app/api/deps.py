@@ -0,0 +1,18 @@
+"""FastAPI 依赖：从注册表注入进程级复用的 Agent 实例"""
+
+from typing import Callable, Type, TypeVar
+from fastapi import HTTPException
+from ..sdk.registry import get_agent
+
+T = TypeVar("T")
+
+
+def agent_dependency(agent_cls: Type[T]) -> Callable[[], T]:
+    """生成一个依赖函数，配置缺失时返回 400"""
+    def provide() -> T:
+        try:
+            return get_agent(agent_cls)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    provide.__name__ = f"provide_{agent_cls.__name__}"
+    return provide
@@ -1,7 +1,15 @@
-from fastapi import APIRouter, HTTPException, Response
+import os
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from ..sdk.editor_assistant import EditorAssistantAgent # Updated import
+from ..sdk.asset_catalog import get_pexels_catalog
+from ..sdk.image_index import get_image_index
+from ..sdk.timeline_export import EXPORT_FORMATS
+from ..sdk.executor import run_blocking
+from .deps import agent_dependency
 
 router = APIRouter()
 
@@ -10,35 +18,146 @@ class EditorRequest(BaseModel):
 
 class EditorResponse(BaseModel):
     keywords: List[str]
+    keyword_matches: List[Dict[str, Any]] = []
     pexels_results: List[Dict[str, Any]]
     ai_image_prompt: Dict[str, str]
 
+class BatchEditorRequest(BaseModel):
+    script: str
+    max_segment_chars: Optional[int] = None
+    chars_per_second: Optional[float] = None
+
+class TimelineResponse(BaseModel):
+    segments: List[Dict[str, Any]]
+    markers: List[Dict[str, Any]]
+    total_duration: float
+
+class CatalogResponse(BaseModel):
+    videos: List[Dict[str, Any]]
+    stats: Dict[str, int]
+
+class SimilarAssetsResponse(BaseModel):
+    results: List[Dict[str, Any]]
+
+class DuplicateAssetsResponse(BaseModel):
+    groups: List[List[str]]
+    stats: Dict[str, int]
+
 class ExportCsvRequest(BaseModel):
     assets: EditorResponse # Expecting the output of the /editor endpoint
-    csv_path: str = "fcp_labels.csv"
+    csv_path: str = "fcp_labels.csv"  # 仅用作下载文件名，不再写入服务器
     segment_duration: int = 10
+    fps: float = 25
+
+class ExportTimelineRequest(BaseModel):
+    timeline: Optional[TimelineResponse] = None  # /editor/batch 的结果
+    assets: Optional[EditorResponse] = None      # 或 /editor 的单片段结果
+    format: str = "csv"
+    fps: float = 25
+    segment_duration: int = 10
+    title: str = "timeline"
+
+def _export_response(chunks, fmt: str, filename: str) -> StreamingResponse:
+    media_type, extension = EXPORT_FORMATS[fmt]
+    name = f"{os.path.splitext(os.path.basename(filename))[0] or 'timeline'}.{extension}"
+    return StreamingResponse(
+        (chunk.encode("utf-8") for chunk in chunks),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(name)}"},
+    )
 
 @router.post("/editor", response_model=EditorResponse)
-async def get_editor_recommendations(request: EditorRequest):
+async def get_editor_recommendations(request: EditorRequest, agent: EditorAssistantAgent = Depends(agent_dependency(EditorAssistantAgent))):
     try:
-        agent = EditorAssistantAgent()
-        recommendations = agent.recommend_assets_for_segment(request.script_segment)
+        recommendations = await run_blocking(agent.recommend_assets_for_segment, request.script_segment)
         return EditorResponse(**recommendations)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
+@router.post("/editor/batch", response_model=TimelineResponse)
+async def get_editor_timeline(request: BatchEditorRequest, agent: EditorAssistantAgent = Depends(agent_dependency(EditorAssistantAgent))):
+    """整篇脚本一次请求：分段并发推荐素材，返回合并后的时间线"""
+    try:
+        timeline = await run_blocking(
+            agent.recommend_assets_for_script, request.script, request.max_segment_chars, request.chars_per_second
+        )
+        return TimelineResponse(**timeline)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@router.get("/editor/catalog", response_model=CatalogResponse)
+async def search_asset_catalog(
+    keyword: str,
+    limit: int = 10,
+    min_width: Optional[int] = None,
+    min_height: Optional[int] = None,
+    orientation: Optional[str] = None,
+    max_duration: Optional[int] = None,
+):
+    """只查询本地 Pexels 目录，不消耗 API 配额"""
+    try:
+        catalog = get_pexels_catalog()
+        videos = await run_blocking(
+            catalog.videos_for, keyword, limit, min_width, min_height, orientation, max_duration
+        )
+        return CatalogResponse(videos=videos, stats=await run_blocking(catalog.stats))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@router.get("/editor/assets/similar", response_model=SimilarAssetsResponse)
+async def find_similar_assets(path: str, k: int = 10, max_distance: Optional[int] = None):
+    """按感知哈希查询与指定图片相似的本地素材"""
+    try:
+        results = await run_blocking(get_image_index().similar, path, k, max_distance)
+        return SimilarAssetsResponse(results=results)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@router.get("/editor/assets/duplicates", response_model=DuplicateAssetsResponse)
+async def find_duplicate_assets(max_distance: Optional[int] = None):
+    """重新扫描 assets/pexels 与 assets/images，返回画面近似重复的图片分组"""
+    try:
+        index = get_image_index()
+        stats = await run_blocking(index.refresh)
+        groups = await run_blocking(index.duplicate_groups, max_distance)
+        return DuplicateAssetsResponse(groups=groups, stats=stats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@router.post("/editor/export")
+async def export_editor_timeline(request: ExportTimelineRequest, agent: EditorAssistantAgent = Depends(agent_dependency(EditorAssistantAgent))):
+    """流式导出时间线：format 可选 csv / srt / fcpxml，时间码为 HH:MM:SS:FF"""
+    try:
+        source = request.timeline or request.assets
+        if source is None:
+            raise ValueError("需要提供 timeline 或 assets")
+        chunks = agent.export_timeline(
+            source.model_dump(), request.format, request.fps, request.segment_duration, request.title
+        )
+        return _export_response(chunks, request.format, request.title)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
 @router.post("/editor/export-csv")
-async def export_editor_assets_to_csv(request: ExportCsvRequest):
+async def export_editor_assets_to_csv(request: ExportCsvRequest, agent: EditorAssistantAgent = Depends(agent_dependency(EditorAssistantAgent))):
+    """以附件形式流式返回 CSV；csv_path 只决定下载文件名"""
     try:
-        agent = EditorAssistantAgent()
-        # The export_csv_for_fcp method prints to console, but for API,
-        # we might want to return the file or a success message.
-        # For simplicity, let's just return a success message for now.
-        # The file will be created on the server.
-        agent.export_csv_for_fcp(request.assets.model_dump(), request.csv_path, request.segment_duration)
-        return {"message": f"CSV exported successfully to {request.csv_path}"}
+        chunks = agent.export_timeline(
+            request.assets.model_dump(), "csv", request.fps, request.segment_duration
+        )
+        return _export_response(chunks, "csv", request.csv_path)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
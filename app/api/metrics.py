@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..sdk.metrics import render_latest
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus 抓取入口：Agent 耗时、LLM token 用量、缓存命中与上游错误"""
+    return PlainTextResponse(render_latest(), media_type=PROMETHEUS_CONTENT_TYPE)
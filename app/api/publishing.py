@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from ..sdk.publishing_agent import PublishingAgent
+from ..sdk.executor import run_blocking
+from .deps import agent_dependency
+from .sse import sse_structured_response
 
 router = APIRouter()
 
@@ -11,6 +14,7 @@ class SEOMetadataRequest(BaseModel):
     description: str
     transcript: str
     category: str = "Education"
+    use_cache: bool = True  # False 时绕过LLM响应缓存
 
 class PublishRequest(BaseModel):
     video_file: str
@@ -43,14 +47,14 @@ class CardsEndscreenResponse(BaseModel):
     message: str = ""
 
 @router.post("/publish/seo", response_model=SEOMetadataResponse)
-async def generate_seo_metadata(request: SEOMetadataRequest):
+async def generate_seo_metadata(request: SEOMetadataRequest, agent: PublishingAgent = Depends(agent_dependency(PublishingAgent))):
     try:
-        agent = PublishingAgent()
-        metadata = agent.generate_seo_metadata(
+        metadata = await agent.agenerate_seo_metadata(
             title=request.title,
             description=request.description,
             transcript=request.transcript,
-            category=request.category
+            category=request.category,
+            use_cache=request.use_cache
         )
         return SEOMetadataResponse(metadata=metadata)
     except ValueError as e:
@@ -58,11 +62,22 @@ async def generate_seo_metadata(request: SEOMetadataRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
+@router.post("/publish/seo/stream")
+async def stream_seo_metadata(request: SEOMetadataRequest, agent: PublishingAgent = Depends(agent_dependency(PublishingAgent))):
+    """以 SSE 流式返回 SEO 元数据：title、tags 等字段完成即发送 field 事件，done 事件为校验后的完整元数据"""
+    return sse_structured_response(agent.astream_seo_metadata(
+        title=request.title,
+        description=request.description,
+        transcript=request.transcript,
+        category=request.category,
+        use_cache=request.use_cache
+    ))
+
 @router.post("/publish/schedule", response_model=PublishResponse)
-async def schedule_video_upload(request: PublishRequest):
+async def schedule_video_upload(request: PublishRequest, agent: PublishingAgent = Depends(agent_dependency(PublishingAgent))):
     try:
-        agent = PublishingAgent()
-        result = agent.schedule_upload(
+        result = await run_blocking(
+            agent.schedule_upload,
             video_file=request.video_file,
             metadata=request.metadata,
             thumbnail_file=request.thumbnail_file,
@@ -75,10 +90,10 @@ async def schedule_video_upload(request: PublishRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
 @router.post("/publish/optimal-time", response_model=OptimalTimeResponse)
-async def get_optimal_publish_time(request: OptimalTimeRequest):
+async def get_optimal_publish_time(request: OptimalTimeRequest, agent: PublishingAgent = Depends(agent_dependency(PublishingAgent))):
     try:
-        agent = PublishingAgent()
-        optimal_time = agent.get_optimal_publish_time(
+        optimal_time = await run_blocking(
+            agent.get_optimal_publish_time,
             category=request.category,
             target_regions=request.target_regions
         )
@@ -89,10 +104,10 @@ async def get_optimal_publish_time(request: OptimalTimeRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
 @router.post("/publish/cards-endscreen", response_model=CardsEndscreenResponse)
-async def setup_cards_and_endscreen(request: CardsEndscreenRequest):
+async def setup_cards_and_endscreen(request: CardsEndscreenRequest, agent: PublishingAgent = Depends(agent_dependency(PublishingAgent))):
     try:
-        agent = PublishingAgent()
-        success = agent.setup_cards_and_endscreen(
+        success = await run_blocking(
+            agent.setup_cards_and_endscreen,
             video_id=request.video_id,
             related_videos=request.related_videos
         )
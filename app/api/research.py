@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from typing import Dict, List, Optional
 from ..sdk.research_agent import ResearchAgent
+from ..sdk.executor import run_blocking
+from .sse import sse_response
+from .deps import agent_dependency
 
 router = APIRouter()
 
@@ -8,21 +12,57 @@ class ResearchRequest(BaseModel):
     topic: str
     source: str
     time_range: int
+    use_cache: bool = True  # False 时绕过LLM响应缓存
+    mode: str = "single"  # "multi" 时展开多个子查询并发搜索，合并去重后生成报告
+    fetch_content: bool = True  # 抓取搜索结果原文作为报告素材
 
 class ResearchResponse(BaseModel):
     report: str
 
+class LocalSearchResponse(BaseModel):
+    results: List[Dict]
+
 @router.post("/research", response_model=ResearchResponse)
-async def get_research_report(request: ResearchRequest):
+async def get_research_report(request: ResearchRequest, agent: ResearchAgent = Depends(agent_dependency(ResearchAgent))):
     try:
-        agent = ResearchAgent()
-        report = agent.generate_research_report(
+        report = await agent.agenerate_research_report(
             topic=request.topic,
             source=request.source,
-            time_range=request.time_range
+            time_range=request.time_range,
+            use_cache=request.use_cache,
+            mode=request.mode,
+            fetch_content=request.fetch_content
         )
         return ResearchResponse(report=report)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@router.post("/research/stream")
+async def stream_research_report(request: ResearchRequest, agent: ResearchAgent = Depends(agent_dependency(ResearchAgent))):
+    """以 SSE 逐 token 返回研究报告，结束时的 done 事件包含完整报告"""
+    return sse_response(agent.astream_research_report(
+        topic=request.topic,
+        source=request.source,
+        time_range=request.time_range,
+        use_cache=request.use_cache,
+        mode=request.mode,
+        fetch_content=request.fetch_content
+    ))
+
+@router.get("/research/index", response_model=LocalSearchResponse)
+async def search_research_index(
+    query: str,
+    k: int = 10,
+    kind: Optional[str] = None,
+    agent: ResearchAgent = Depends(agent_dependency(ResearchAgent))
+):
+    """在本地研究语料（摘要、原文、历史报告）中做 BM25 检索；kind 可选 snippet/article/report"""
+    try:
+        results = await run_blocking(agent.search_local, query, k, [kind] if kind else None)
+        return LocalSearchResponse(results=results)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
@@ -1,26 +1,38 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from ..sdk.review_agent import ReviewerAgent
+from .sse import sse_response
+from .deps import agent_dependency
 
 router = APIRouter()
 
 class ReviewRequest(BaseModel):
     script_text: str
     style: str = "政经理性"
+    use_cache: bool = True  # False 时绕过LLM响应缓存
 
 class ReviewResponse(BaseModel):
     revised_script: str
 
 @router.post("/review", response_model=ReviewResponse)
-async def review_and_rewrite_script(request: ReviewRequest):
+async def review_and_rewrite_script(request: ReviewRequest, agent: ReviewerAgent = Depends(agent_dependency(ReviewerAgent))):
     try:
-        agent = ReviewerAgent()
-        revised_script = agent.revise_script_workflow(
+        revised_script = await agent.arevise_script_workflow(
             script_text=request.script_text,
-            style=request.style
+            style=request.style,
+            use_cache=request.use_cache
         )
         return ReviewResponse(revised_script=revised_script)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@router.post("/review/stream")
+async def stream_review_and_rewrite(request: ReviewRequest, agent: ReviewerAgent = Depends(agent_dependency(ReviewerAgent))):
+    """以 SSE 依次返回审稿意见（stage=review）与改写脚本（stage=rewrite）"""
+    return sse_response(agent.astream_revise_workflow(
+        script_text=request.script_text,
+        style=request.style,
+        use_cache=request.use_cache
+    ))
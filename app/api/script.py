@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from ..sdk.scriptwriter_agent import ScriptwriterAgent
+from .sse import sse_response
+from .deps import agent_dependency
 
 router = APIRouter()
 
@@ -9,22 +11,34 @@ class ScriptRequest(BaseModel):
     research_summary: str
     style: str = "理性分析"
     duration: str = "medium"  # short: <10min, medium: 10-15min, long: >15min
+    use_cache: bool = True  # False 时绕过LLM响应缓存
 
 class ScriptResponse(BaseModel):
     script: str
 
 @router.post("/script", response_model=ScriptResponse)
-async def generate_video_script(request: ScriptRequest):
+async def generate_video_script(request: ScriptRequest, agent: ScriptwriterAgent = Depends(agent_dependency(ScriptwriterAgent))):
     try:
-        agent = ScriptwriterAgent()
-        script = agent.generate_script(
+        script = await agent.agenerate_script(
             topic_title=request.topic_title,
             research_summary=request.research_summary,
             style=request.style,
-            duration=request.duration
+            duration=request.duration,
+            use_cache=request.use_cache
         )
         return ScriptResponse(script=script)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@router.post("/script/stream")
+async def stream_video_script(request: ScriptRequest, agent: ScriptwriterAgent = Depends(agent_dependency(ScriptwriterAgent))):
+    """以 SSE 逐 token 返回脚本，结束时的 done 事件包含完整脚本"""
+    return sse_response(agent.astream_script(
+        topic_title=request.topic_title,
+        research_summary=request.research_summary,
+        style=request.style,
+        duration=request.duration,
+        use_cache=request.use_cache
+    ))
@@ -0,0 +1,68 @@
+"""Server-Sent Events 工具：把 Agent 的流式输出转发为 SSE"""
+
+import json
+from typing import AsyncIterator, Dict, Tuple, Union
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # 关闭反向代理缓冲，保证首个 token 立即送达
+}
+
+
+def sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def relay_tokens(source: AsyncIterator[Union[str, Tuple[str, str]]]) -> AsyncIterator[str]:
+    """逐个转发 token 事件，结束时发送包含完整文本的 done 事件
+
+    source 可以产出纯文本，也可以产出 (阶段, 文本)；多阶段时 done 事件
+    的 text 为最后一个阶段的完整文本，stages 给出每个阶段的文本。
+    """
+    stages: Dict[str, list] = {}
+    stage = "output"
+    try:
+        async for item in source:
+            if isinstance(item, tuple):
+                stage, delta = item
+            else:
+                delta = item
+            stages.setdefault(stage, []).append(delta)
+            yield sse_event("token", {"stage": stage, "content": delta})
+    except Exception as e:
+        yield sse_event("error", {"detail": f"Internal server error: {e}"})
+        return
+
+    texts = {name: "".join(parts).strip() for name, parts in stages.items()}
+    done = {"text": texts.get(stage, "")}
+    if len(texts) > 1:
+        done["stages"] = texts
+    yield sse_event("done", done)
+
+
+def sse_response(source: AsyncIterator[Union[str, Tuple[str, str]]]) -> StreamingResponse:
+    return StreamingResponse(
+        relay_tokens(source), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+async def relay_structured(source: AsyncIterator[Dict]) -> AsyncIterator[str]:
+    """转发结构化输出事件：每个完成的字段发送 field 事件，校验失败重试前发送 retry，结束时 done 事件携带完整对象"""
+    try:
+        async for item in source:
+            event = item.get("event")
+            if event == "field":
+                yield sse_event("field", {"path": item["path"], "value": item["value"]})
+            elif event == "retry":
+                yield sse_event("retry", {"errors": item["errors"]})
+            elif event == "result":
+                yield sse_event("done", {"data": item["data"]})
+    except Exception as e:
+        yield sse_event("error", {"detail": f"Internal server error: {e}"})
+
+
+def sse_structured_response(source: AsyncIterator[Dict]) -> StreamingResponse:
+    return StreamingResponse(
+        relay_structured(source), media_type="text/event-stream", headers=SSE_HEADERS
+    )
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from typing import Literal, List, Union
+from typing import Literal, List, Optional, Union
 from ..sdk.strategy_agent import StrategyAgent, TimeRange
 from ..sdk.youtube_strategy_agent import YouTubeStrategyAgent
+from .deps import agent_dependency
 
 router = APIRouter()
 
@@ -13,52 +14,70 @@ class StrategyRequest(BaseModel):
     query: str | None = None
     region: Union[str, List[str], None] = None  # 支持单个区域或区域列表
     time_range: Literal["MONTHS_3", "YEAR_1", "YEARS_2"] = "MONTHS_3"  # 默认为近3个月
+    use_cache: bool = True  # False 时绕过LLM响应缓存
+    max_concurrency: Optional[int] = None  # 多区域并发上限，默认读取 STRATEGY_REGION_CONCURRENCY
+
+class RegionRecommendation(BaseModel):
+    region: str
+    recommendation: Optional[str] = None
+    error: Optional[str] = None
 
 class StrategyResponse(BaseModel):
     recommendation: str
+    regions: Optional[List[RegionRecommendation]] = None  # 仅多区域请求时返回
 
 @router.post("/strategy", response_model=StrategyResponse)
-async def get_strategy_recommendation(request: StrategyRequest):
+async def get_strategy_recommendation(request: StrategyRequest, agent: YouTubeStrategyAgent = Depends(agent_dependency(YouTubeStrategyAgent))):
     try:
         # 将字符串时间范围转换为TimeRange枚举
         time_range = TimeRange[request.time_range]
         months_back = time_range.value
+        region_results = None
         
         # 根据来源选择不同的代理
         if request.source == "youtube":
-            agent = YouTubeStrategyAgent()
-            
             # 处理区域参数
             region_param = request.region
             if isinstance(region_param, list):
-                # 如果是区域列表，生成多个区域的建议并合并
+                # 如果是区域列表，并发生成多个区域的建议并按原顺序合并
+                region_results = await agent.agenerate_multi_region_suggestions(
+                    topic=request.topic,
+                    regions=region_param,
+                    category_id=request.category_id,
+                    months_back=months_back,
+                    max_concurrency=request.max_concurrency,
+                    use_cache=request.use_cache
+                )
                 recommendations = []
-                for region in region_param:
-                    rec = agent.generate_topic_suggestions_from_youtube(
-                        topic=request.topic,
-                        category_id=request.category_id,
-                        region=region,
-                        months_back=months_back
+                for result in region_results:
+                    if result["error"]:
+                        recommendations.append(f"## {result['region']} 地区建议\n\n生成失败: {result['error']}")
+                    else:
+                        recommendations.append(f"## {result['region']} 地区建议\n\n{result['recommendation']}")
+
+                if not any(result["recommendation"] for result in region_results):
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"所有地区均未能生成选题建议: {region_results}"
                     )
-                    recommendations.append(f"## {region} 地区建议\n\n{rec}")
-                
                 recommendation = "\n\n".join(recommendations)
             else:
                 # 单个区域或默认区域
                 region = region_param if region_param else "US"
-                recommendation = agent.generate_topic_suggestions_from_youtube(
+                recommendation = await agent.agenerate_topic_suggestions_from_youtube(
                     topic=request.topic,
                     category_id=request.category_id,
                     region=region,
-                    months_back=months_back
+                    months_back=months_back,
+                    use_cache=request.use_cache
                 )
         else:  # news
-            agent = YouTubeStrategyAgent()
-            recommendation = agent.generate_topic_suggestions_from_news(
+            recommendation = await agent.agenerate_topic_suggestions_from_news(
                 topic=request.topic,
                 category_id=request.category_id,
                 query=request.query,
-                months_back=months_back
+                months_back=months_back,
+                use_cache=request.use_cache
             )
         
         if not recommendation:
@@ -67,7 +86,9 @@ async def get_strategy_recommendation(request: StrategyRequest):
                 detail="未能生成选题建议"
             )
             
-        return StrategyResponse(recommendation=recommendation)
+        return StrategyResponse(recommendation=recommendation, regions=region_results)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
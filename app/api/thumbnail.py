@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
 from ..sdk.thumbnail_agent import ThumbnailAgent
+from ..sdk.executor import run_blocking
+from .deps import agent_dependency
+from .sse import sse_structured_response
 
 router = APIRouter()
 
@@ -9,19 +12,31 @@ class ThumbnailRequest(BaseModel):
     title: str
     script_excerpt: str
     style: str = "modern"
+    use_cache: bool = True  # False 时绕过LLM响应缓存
 
 class ThumbnailResponse(BaseModel):
     design: Dict[str, Any]
     asset_suggestions: list[str]
 
+class RenderRequest(BaseModel):
+    title: str
+    subtitle: str = ""
+    design: Optional[Union[Dict[str, Any], str]] = None  # /thumbnail 返回的设计方案，用于取配色
+    backgrounds: Optional[List[str]] = None  # assets/pexels 或 assets/images/backgrounds 下的文件
+    layouts: Optional[List[str]] = None      # left / right / center / bottom
+    count: int = 12
+
+class RenderResponse(BaseModel):
+    thumbnails: List[Dict[str, Any]]
+
 @router.post("/thumbnail", response_model=ThumbnailResponse)
-async def generate_thumbnail_design(request: ThumbnailRequest):
+async def generate_thumbnail_design(request: ThumbnailRequest, agent: ThumbnailAgent = Depends(agent_dependency(ThumbnailAgent))):
     try:
-        agent = ThumbnailAgent()
-        design = agent.generate_thumbnail_design(
+        design = await agent.agenerate_thumbnail_design(
             title=request.title,
             script_excerpt=request.script_excerpt,
-            style=request.style
+            style=request.style,
+            use_cache=request.use_cache
         )
         
         suggestions = agent.get_asset_suggestions(design)
@@ -34,3 +49,34 @@ async def generate_thumbnail_design(request: ThumbnailRequest):
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+
+@router.post("/thumbnail/stream")
+async def stream_thumbnail_design(request: ThumbnailRequest, agent: ThumbnailAgent = Depends(agent_dependency(ThumbnailAgent))):
+    """以 SSE 流式返回设计方案：field 事件为已完成的字段（path 为键/下标列表），done 事件为校验后的完整方案"""
+    return sse_structured_response(agent.astream_thumbnail_design(
+        title=request.title,
+        script_excerpt=request.script_excerpt,
+        style=request.style,
+        use_cache=request.use_cache
+    ))
+
+
+@router.post("/thumbnail/render", response_model=RenderResponse)
+async def render_thumbnails(request: RenderRequest, agent: ThumbnailAgent = Depends(agent_dependency(ThumbnailAgent))):
+    """把设计方案渲染成多张 1280x720 PNG 变体（进程池并行）"""
+    try:
+        thumbnails = await run_blocking(
+            agent.render_thumbnails,
+            request.title,
+            request.subtitle,
+            request.design,
+            request.backgrounds,
+            min(max(request.count, 1), 48),
+            request.layouts,
+        )
+        return RenderResponse(thumbnails=thumbnails)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
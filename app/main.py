@@ -9,7 +9,8 @@ from .api import (
     config,
     thumbnail,
     publishing,
-    analytics
+    analytics,
+    metrics
 )
 from .core.initialize import create_directory_structure
 from .core.config import settings
@@ -46,6 +47,7 @@ app.include_router(config.router, tags=["Config"])
 app.include_router(thumbnail.router, tags=["Thumbnail"])
 app.include_router(publishing.router, tags=["Publishing"])
 app.include_router(analytics.router, tags=["Analytics"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 @app.get("/")
 async def root():
@@ -59,10 +61,12 @@ async def root():
             "/script - 生成视频脚本",
             "/review - 审查和改写脚本",
             "/editor - 剪辑助手",
+            "/editor/batch - 整篇脚本素材时间线",
             "/config - 系统配置",
             "/thumbnail - 生成缩略图设计",
             "/publish - 视频发布管理",
-            "/analytics - 数据分析与优化"
+            "/analytics - 数据分析与优化",
+            "/metrics - Prometheus 指标"
         ]
     }
 
@@ -1,21 +1,47 @@
 import os
-import requests
-import json
-import google.oauth2.credentials
-import google_auth_oauthlib.flow
-import googleapiclient.discovery
+import threading
+import contextvars
 import googleapiclient.errors
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from .llm_client import get_llm_client
+from .resilience import get_policy
+from .metrics import instrument
+from .youtube_client import get_youtube_client
 
 load_dotenv()
 
-# 设置YouTube API的范围
-SCOPES = ['https://www.googleapis.com/auth/youtube.readonly']
-API_SERVICE_NAME = 'youtube'
-API_VERSION = 'v3'
-CLIENT_SECRETS_FILE = 'credentials/client_secret.json'
+# videos().list 单次最多接受 50 个 ID，且无论 ID 数量多少都只消耗 1 个配额单位
+YOUTUBE_BATCH_SIZE = 50
+# 批量查询时同时进行的 videos().list 请求数；总速率仍受 youtube 令牌桶约束
+YOUTUBE_BATCH_CONCURRENCY = int(os.getenv("YOUTUBE_BATCH_CONCURRENCY", "4"))
+YOUTUBE_BATCH_MAX_IDS = int(os.getenv("YOUTUBE_BATCH_MAX_IDS", "5000"))
+# 只取用到的字段，减小响应体
+VIDEO_METRICS_FIELDS = "items(id,snippet(title,publishedAt),statistics)"
+
+_batch_pool: Optional[ThreadPoolExecutor] = None
+_batch_pool_lock = threading.Lock()
+
+
+def _get_batch_pool() -> ThreadPoolExecutor:
+    """批量查询视频指标时按分块并发的线程池"""
+    global _batch_pool
+    if _batch_pool is None:
+        with _batch_pool_lock:
+            if _batch_pool is None:
+                _batch_pool = ThreadPoolExecutor(
+                    max_workers=YOUTUBE_BATCH_CONCURRENCY, thread_name_prefix="youtube-batch"
+                )
+    return _batch_pool
+
+
+def chunk_ids(video_ids: List[str], size: int = YOUTUBE_BATCH_SIZE) -> List[List[str]]:
+    """去掉空白与重复 ID（保持顺序）后按 size 分块"""
+    unique = list(dict.fromkeys(video_id.strip() for video_id in video_ids if video_id and video_id.strip()))
+    return [unique[i:i + size] for i in range(0, len(unique), size)]
+
 
 class AnalyticsAgent:
     def __init__(self):
@@ -25,33 +51,19 @@ class AnalyticsAgent:
             raise ValueError("OPENROUTER_API_KEY or OPENROUTER_MODEL not found in .env file")
 
         self.base_url = "https://openrouter.ai/api/v1"
+        self.llm = get_llm_client(self.OPENROUTER_API_KEY, self.base_url)
+        self.youtube = get_youtube_client()
         self.youtube_api = None
         
     def _get_authenticated_service(self):
-        """获取已认证的YouTube API服务"""
+        """获取已认证的YouTube API服务（进程内共享，只在首次使用时构建）"""
         try:
-            # 检查是否存在已保存的凭据
-            if os.path.exists('credentials/youtube_token.json'):
-                with open('credentials/youtube_token.json', 'r') as token_file:
-                    credentials_data = json.load(token_file)
-                    credentials = google.oauth2.credentials.Credentials.from_authorized_user_info(credentials_data)
-            else:
-                # 如果没有保存的凭据，则进行OAuth2认证流程
-                flow = google_auth_oauthlib.flow.InstalledAppFlow.from_client_secrets_file(
-                    CLIENT_SECRETS_FILE, SCOPES)
-                credentials = flow.run_local_server(port=8080)
-                
-                # 保存凭据以便下次使用
-                with open('credentials/youtube_token.json', 'w') as token_file:
-                    token_file.write(credentials.to_json())
-            
-            # 构建YouTube API客户端
-            return googleapiclient.discovery.build(
-                API_SERVICE_NAME, API_VERSION, credentials=credentials)
+            return self.youtube.service()
         except Exception as e:
             print(f"认证服务创建失败: {e}")
             return None
             
+    @instrument
     def get_performance_metrics(self, video_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> Dict[str, any]:
         """获取视频性能指标"""
         # 如果未提供日期，默认使用过去30天
@@ -71,34 +83,16 @@ class AnalyticsAgent:
             
         try:
             # 获取视频基本信息
-            video_response = self.youtube_api.videos().list(
+            request = self.youtube_api.videos().list(
                 part="snippet,statistics",
                 id=video_id
-            ).execute()
+            )
+            video_response = get_policy("youtube").call(lambda timeout: self.youtube.execute(request))
             
             if not video_response.get('items'):
                 raise ValueError(f"未找到ID为{video_id}的视频")
                 
-            video_info = video_response['items'][0]
-            snippet = video_info['snippet']
-            statistics = video_info['statistics']
-            
-            # 构建性能指标
-            metrics = {
-                "title": snippet.get('title', ''),
-                "published_at": snippet.get('publishedAt', ''),
-                "views": int(statistics.get('viewCount', 0)),
-                "likes": int(statistics.get('likeCount', 0)),
-                "comments": int(statistics.get('commentCount', 0)),
-                "favorites": int(statistics.get('favoriteCount', 0)),
-                # 以下数据需要YouTube Analytics API，这里简化处理
-                "watch_time": self._estimate_watch_time(int(statistics.get('viewCount', 0))),
-                "avg_view_duration": self._estimate_avg_view_duration(),
-                "ctr": self._estimate_ctr(),
-                "avg_view_percentage": self._estimate_avg_view_percentage()
-            }
-            
-            return metrics
+            return self._video_metrics(video_response['items'][0])
         except googleapiclient.errors.HttpError as e:
             print(f"YouTube API请求失败: {e}")
             return self._get_mock_performance_metrics()
@@ -106,6 +100,81 @@ class AnalyticsAgent:
             print(f"获取性能指标时出错: {e}")
             return self._get_mock_performance_metrics()
     
+    def _video_metrics(self, video_info: Dict) -> Dict[str, any]:
+        """videos().list 返回的单个条目 -> 性能指标"""
+        snippet = video_info.get('snippet', {})
+        statistics = video_info.get('statistics', {})
+        views = int(statistics.get('viewCount', 0))
+        return {
+            "title": snippet.get('title', ''),
+            "published_at": snippet.get('publishedAt', ''),
+            "views": views,
+            "likes": int(statistics.get('likeCount', 0)),
+            "comments": int(statistics.get('commentCount', 0)),
+            "favorites": int(statistics.get('favoriteCount', 0)),
+            # 以下数据需要YouTube Analytics API，这里简化处理
+            "watch_time": self._estimate_watch_time(views),
+            "avg_view_duration": self._estimate_avg_view_duration(),
+            "ctr": self._estimate_ctr(),
+            "avg_view_percentage": self._estimate_avg_view_percentage()
+        }
+
+    def _fetch_video_chunk(self, ids: List[str]) -> List[Dict]:
+        """一次 videos().list 查询最多 50 个视频"""
+        request = self.youtube_api.videos().list(
+            part="snippet,statistics",
+            id=",".join(ids),
+            maxResults=len(ids),
+            fields=VIDEO_METRICS_FIELDS
+        )
+        response = get_policy("youtube").call(lambda timeout: self.youtube.execute(request))
+        return response.get('items', [])
+
+    @instrument
+    def get_batch_performance_metrics(self, video_ids: List[str]) -> Dict[str, any]:
+        """批量获取视频性能指标：每 50 个 ID 合并为一次 videos().list，分块并发请求
+
+        返回 {"metrics": {视频ID: 指标}, "errors": {视频ID: 错误信息}, "requests": 请求次数}；
+        某一块请求失败只影响该块中的视频，不存在或无权访问的视频记为错误。
+        """
+        chunks = chunk_ids(video_ids)
+        if not chunks:
+            raise ValueError("视频ID列表为空")
+        total = sum(len(chunk) for chunk in chunks)
+        if total > YOUTUBE_BATCH_MAX_IDS:
+            raise ValueError(f"单次最多查询 {YOUTUBE_BATCH_MAX_IDS} 个视频，实际为 {total} 个")
+
+        if not self.youtube_api:
+            self.youtube_api = self._get_authenticated_service()
+        if not self.youtube_api:
+            return {
+                "metrics": {},
+                "errors": {video_id: "YouTube API客户端初始化失败" for chunk in chunks for video_id in chunk},
+                "requests": 0,
+            }
+
+        pool = _get_batch_pool()
+        futures = [pool.submit(contextvars.copy_context().run, self._fetch_video_chunk, chunk) for chunk in chunks]
+
+        metrics, errors = {}, {}
+        for chunk, future in zip(chunks, futures):
+            try:
+                items = {item['id']: item for item in future.result()}
+            except googleapiclient.errors.HttpError as e:
+                # 默认的错误信息包含整条 URL（50 个 ID），这里只保留状态码与原因
+                errors.update({video_id: f"YouTube API请求失败: HTTP {e.resp.status} {e.reason}" for video_id in chunk})
+                continue
+            except Exception as e:
+                errors.update({video_id: f"YouTube API请求失败: {e}" for video_id in chunk})
+                continue
+            for video_id in chunk:
+                if video_id in items:
+                    metrics[video_id] = self._video_metrics(items[video_id])
+                else:
+                    errors[video_id] = f"未找到ID为{video_id}的视频"
+        return {"metrics": metrics, "errors": errors, "requests": len(chunks)}
+
+    @instrument
     def get_audience_insights(self, video_id: str) -> Dict[str, any]:
         """获取受众洞察"""
         # 实际实现中，这需要YouTube Analytics API的更高权限
@@ -184,13 +253,13 @@ class AnalyticsAgent:
             "avg_view_percentage": 0.65
         }
 
-    def generate_optimization_suggestions(
+    def _build_optimization_prompt(
         self,
         metrics: Dict[str, any],
         audience_data: Dict[str, any],
         video_metadata: Dict[str, any]
     ) -> str:
-        prompt = f"""
+        return f"""
 作为YouTube频道优化专家，请根据以下数据分析视频表现并提供优化建议。
 
 【性能指标】
@@ -232,28 +301,32 @@ class AnalyticsAgent:
 请输出详细的优化报告，重点关注可执行的具体建议。
 """
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.OPENROUTER_API_KEY}"
-        }
-
-        data = {
-            "model": self.OPENROUTER_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-        }
-
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=data
+    @instrument
+    def generate_optimization_suggestions(
+        self,
+        metrics: Dict[str, any],
+        audience_data: Dict[str, any],
+        video_metadata: Dict[str, any],
+        use_cache: bool = True
+    ) -> str:
+        prompt = self._build_optimization_prompt(metrics, audience_data, video_metadata)
+        return self.llm.complete(
+            self.OPENROUTER_MODEL, prompt, agent="AnalyticsAgent", use_cache=use_cache
         )
 
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API请求失败: {response.text}")
-
-        return response.json()["choices"][0]["message"]["content"]
+    @instrument
+    async def agenerate_optimization_suggestions(
+        self,
+        metrics: Dict[str, any],
+        audience_data: Dict[str, any],
+        video_metadata: Dict[str, any],
+        use_cache: bool = True
+    ) -> str:
+        """generate_optimization_suggestions 的 asyncio 版本"""
+        prompt = self._build_optimization_prompt(metrics, audience_data, video_metadata)
+        return await self.llm.acomplete(
+            self.OPENROUTER_MODEL, prompt, agent="AnalyticsAgent", use_cache=use_cache
+        )
 
 # === 示例运行（调试/独立运行用）===
 if __name__ == "__main__":
@@ -0,0 +1,353 @@
+"""搜索结果原文抓取：有界并发下载、按主机限速、正文抽取、内容哈希去重与磁盘缓存
+
+下载在事件循环中并发进行，正文抽取（CPU 密集）放到共享线程池，因此下载与抽取相互重叠。
+缓存结构（assets/cache/articles）：
+    urls/<url 哈希>.json    URL -> 标题、内容哈希、抓取时间
+    docs/<内容哈希>.json    抽取出的正文；不同 URL 转载的同一篇文章只存一份
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from html.parser import HTMLParser
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+from .executor import run_blocking
+from .search_merge import canonical_url
+from . import metrics
+
+load_dotenv()
+
+ARTICLE_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "assets", "cache", "articles"
+)
+ARTICLE_CACHE_TTL = int(os.getenv("ARTICLE_CACHE_TTL", str(7 * 86400)))
+ARTICLE_FETCH_CONCURRENCY = int(os.getenv("ARTICLE_FETCH_CONCURRENCY", "8"))
+ARTICLE_FETCH_PER_HOST = int(os.getenv("ARTICLE_FETCH_PER_HOST", "2"))
+ARTICLE_FETCH_HOST_INTERVAL = float(os.getenv("ARTICLE_FETCH_HOST_INTERVAL", "0.5"))
+ARTICLE_FETCH_TIMEOUT = float(os.getenv("ARTICLE_FETCH_TIMEOUT", "10"))
+ARTICLE_MAX_BYTES = int(os.getenv("ARTICLE_MAX_BYTES", str(2 * 1024 * 1024)))
+
+USER_AGENT = "Mozilla/5.0 (compatible; YouTubeMultiAgentResearch/1.0)"
+
+ARTICLE_FETCHES = metrics.registry.counter(
+    "article_fetches_total", "原文抓取次数；result=cache/fetched/duplicate/error", ("result",)
+)
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+
+# === 正文抽取 ===
+class _TextExtractor(HTMLParser):
+    """收集段落级文本块；<article>/<main> 内的文本单独记录，优先作为正文"""
+
+    SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "iframe"}
+    BLOCK_TAGS = {"p", "h1", "h2", "h3", "h4", "li", "blockquote", "pre", "td", "div", "section", "br"}
+    VOID_TAGS = {"br", "img", "meta", "link", "input", "hr", "source"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.og_title = ""
+        self.blocks: List[str] = []
+        self.main_blocks: List[str] = []
+        self._skip_depth = 0
+        self._main_depth = 0
+        self._in_title = False
+        self._buffer: List[str] = []
+
+    def _flush(self):
+        text = " ".join("".join(self._buffer).split())
+        self._buffer = []
+        if text:
+            self.blocks.append(text)
+            if self._main_depth:
+                self.main_blocks.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "meta":
+            attrs = dict(attrs)
+            if attrs.get("property") == "og:title" and attrs.get("content"):
+                self.og_title = attrs["content"].strip()
+            return
+        if tag in self.VOID_TAGS and tag != "br":
+            return
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in ("article", "main"):
+            self._flush()
+            self._main_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        if tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in ("article", "main") and self._main_depth:
+            self._flush()
+            self._main_depth -= 1
+        elif tag == "title":
+            self._in_title = False
+        if tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self._buffer.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def _is_content_block(text: str) -> bool:
+    """过滤菜单、按钮、版权声明等短文本：保留较长或带句末标点的块"""
+    return len(text) >= 40 or (len(text) >= 12 and re.search(r"[。！？.!?；;]$", text) is not None)
+
+
+def extract_main_text(html: str) -> Dict[str, str]:
+    """从 HTML 中抽取标题与正文"""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass  # 残缺 HTML 尽量保留已解析的部分
+    main = [b for b in parser.main_blocks if _is_content_block(b)]
+    body = [b for b in parser.blocks if _is_content_block(b)]
+    # <article>/<main> 覆盖了大部分正文时才采用，避免只命中侧边的小卡片
+    blocks = main if sum(map(len, main)) >= 0.5 * sum(map(len, body)) else body
+
+    seen, unique = set(), []
+    for block in blocks:
+        if block not in seen:
+            seen.add(block)
+            unique.append(block)
+    return {
+        "title": " ".join((parser.og_title or parser.title).split()),
+        "text": "\n".join(unique),
+    }
+
+
+def content_hash(text: str) -> str:
+    """忽略空白与大小写差异的正文哈希"""
+    normalized = "".join(text.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _decode(raw: bytes, declared: Optional[str]) -> str:
+    encoding = declared
+    if not encoding:
+        match = _META_CHARSET.search(raw[:4096])
+        encoding = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        return raw.decode(encoding, errors="replace")
+    except LookupError:
+        return raw.decode("utf-8", errors="replace")
+
+
+def _is_fetchable(url: str) -> bool:
+    """只抓取 http(s) URL；无法解析的 URL（如搜索结果中残缺的 IPv6 地址）记为失败并跳过"""
+    try:
+        return urlsplit(url).scheme in ("http", "https")
+    except ValueError:
+        ARTICLE_FETCHES.inc(result="error")
+        return False
+
+
+# === 磁盘缓存 ===
+class ArticleStore:
+    """URL 索引与按内容哈希存储的正文"""
+
+    def __init__(self, cache_dir: str = ARTICLE_CACHE_DIR, ttl: int = ARTICLE_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._urls_dir = os.path.join(cache_dir, "urls")
+        self._docs_dir = os.path.join(cache_dir, "docs")
+        os.makedirs(self._urls_dir, exist_ok=True)
+        os.makedirs(self._docs_dir, exist_ok=True)
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        return hashlib.sha256(canonical_url(url).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path: str, data: Dict):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入原文缓存失败: {e}")
+
+    def get(self, url: str) -> Optional[Dict]:
+        record = self._read(os.path.join(self._urls_dir, f"{self.url_key(url)}.json"))
+        if record is None or record.get("fetched_at", 0) + self.ttl < time.time():
+            return None
+        doc = self._read(os.path.join(self._docs_dir, f"{record['content_hash']}.json"))
+        if doc is None:
+            return None
+        return {**record, "text": doc["text"]}
+
+    def put(self, url: str, title: str, text: str) -> Dict:
+        digest = content_hash(text)
+        doc_path = os.path.join(self._docs_dir, f"{digest}.json")
+        if not os.path.exists(doc_path):
+            self._write(doc_path, {"text": text})
+        record = {"url": url, "title": title, "content_hash": digest, "fetched_at": time.time()}
+        self._write(os.path.join(self._urls_dir, f"{self.url_key(url)}.json"), record)
+        return {**record, "text": text}
+
+
+# === 抓取 ===
+class ArticleFetcher:
+    """并发抓取一批 URL；全局并发与单主机并发分别受限，同一主机的请求之间保持最小间隔"""
+
+    def __init__(
+        self,
+        store: Optional[ArticleStore] = None,
+        max_concurrency: int = ARTICLE_FETCH_CONCURRENCY,
+        per_host: int = ARTICLE_FETCH_PER_HOST,
+        host_interval: float = ARTICLE_FETCH_HOST_INTERVAL,
+        timeout: float = ARTICLE_FETCH_TIMEOUT,
+        max_bytes: int = ARTICLE_MAX_BYTES,
+    ):
+        self.store = store or ArticleStore()
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.host_interval = host_interval
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+
+    async def _download(self, client: httpx.AsyncClient, url: str) -> Optional[str]:
+        async with client.stream("GET", url) as response:
+            content_type = response.headers.get("content-type", "")
+            if response.status_code != 200 or ("html" not in content_type and "text" not in content_type):
+                return None
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.max_bytes:
+                    break  # 超大页面只取前面部分，正文通常在前
+            return _decode(b"".join(chunks), response.charset_encoding)
+
+    async def aiter_documents(self, urls: List[str], offload: bool = True) -> AsyncIterator[Dict]:
+        """按完成顺序逐篇产出文档 {url, title, text, content_hash}；失败或重复的 URL 不产出
+
+        offload=False 时正文抽取与缓存读写在当前线程执行（供已运行在线程池中的同步调用使用）。
+        """
+        async def run(func, *args):
+            return await run_blocking(func, *args) if offload else func(*args)
+
+        urls = [url for url in dict.fromkeys(urls) if _is_fetchable(url)]
+        pending, documents = [], []
+        for url, cached in zip(urls, await run(lambda: [self.store.get(url) for url in urls])):
+            if cached is not None:
+                ARTICLE_FETCHES.inc(result="cache")
+                documents.append({**cached, "url": url})
+            else:
+                pending.append(url)
+
+        seen_hashes = set()
+
+        def first_seen(doc: Dict) -> bool:
+            if not doc["text"] or doc["content_hash"] in seen_hashes:
+                ARTICLE_FETCHES.inc(result="duplicate")
+                return False
+            seen_hashes.add(doc["content_hash"])
+            return True
+
+        for doc in documents:
+            if first_seen(doc):
+                yield doc
+        if not pending:
+            return
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        host_next_slot: Dict[str, float] = {}
+        loop = asyncio.get_running_loop()
+
+        async def fetch(client: httpx.AsyncClient, url: str) -> Optional[Dict]:
+            # 单个 URL 的任何失败（非法 URL、网络错误、抽取异常）只丢弃这一篇，不影响整批
+            try:
+                return await fetch_one(client, url)
+            except Exception as e:
+                print(f"抓取原文失败 {url}: {e}")
+                ARTICLE_FETCHES.inc(result="error")
+                return None
+
+        async def fetch_one(client: httpx.AsyncClient, url: str) -> Optional[Dict]:
+            host = urlsplit(url).netloc.lower()
+            host_semaphore = host_semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+            async with semaphore, host_semaphore:
+                # 预约本主机的下一个请求时间片，保证同一主机的请求之间至少间隔 host_interval
+                slot = max(loop.time(), host_next_slot.get(host, 0.0))
+                host_next_slot[host] = slot + self.host_interval
+                if slot > loop.time():
+                    await asyncio.sleep(slot - loop.time())
+                html = await self._download(client, url)
+            if not html:
+                ARTICLE_FETCHES.inc(result="error")
+                return None
+            # 抽取在线程池中进行，此时信号量已释放，其他下载可以继续
+            extracted = await run(extract_main_text, html)
+            if not extracted["text"]:
+                ARTICLE_FETCHES.inc(result="error")
+                return None
+            ARTICLE_FETCHES.inc(result="fetched")
+            return await run(self.store.put, url, extracted["title"], extracted["text"])
+
+        async with httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.max_concurrency),
+        ) as client:
+            for next_done in asyncio.as_completed([fetch(client, url) for url in pending]):
+                doc = await next_done
+                if doc is not None and first_seen(doc):
+                    yield doc
+
+    async def afetch_documents(self, urls: List[str], offload: bool = True) -> Dict[str, Dict]:
+        """抓取全部 URL，返回 url -> 文档"""
+        return {doc["url"]: doc async for doc in self.aiter_documents(urls, offload)}
+
+    def fetch_documents(self, urls: List[str]) -> Dict[str, Dict]:
+        """afetch_documents 的同步版本：在独立事件循环中执行，不占用共享线程池"""
+        return asyncio.run(self.afetch_documents(urls, offload=False))
+
+
+_fetcher: Optional[ArticleFetcher] = None
+_fetcher_lock = threading.Lock()
+
+
+def get_article_fetcher() -> ArticleFetcher:
+    """获取进程内共享的原文抓取器"""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = ArticleFetcher()
+    return _fetcher
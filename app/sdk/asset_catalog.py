@@ -0,0 +1,187 @@
+"""Pexels 视频元数据本地目录：记录每次搜索见过的视频，常用主题直接从本地回答
+
+videos 表保存视频元数据（尺寸、时长、标签与原始 JSON），按尺寸、时长建索引；
+video_keywords 表记录 (关键词, 视频, 排名)，按关键词建索引；
+searches 表记录每个关键词最近一次向 Pexels 查询的时间与条数，用来判断本地覆盖是否仍然新鲜。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from .search_cache import normalize_query
+from . import metrics
+
+load_dotenv()
+
+PEXELS_CATALOG_DB = os.getenv(
+    "PEXELS_CATALOG_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "assets", "cache", "pexels.sqlite3"),
+)
+# 关键词的本地结果在该时长（秒）内视为新鲜，不再请求 Pexels
+PEXELS_CATALOG_TTL = int(os.getenv("PEXELS_CATALOG_TTL", str(7 * 86400)))
+
+CATALOG_LOOKUPS = metrics.registry.counter(
+    "pexels_catalog_lookups_total", "Pexels 本地目录查询次数；result=hit/miss/stale_fallback", ("result",)
+)
+
+
+class PexelsCatalog:
+    """SQLite 存储的 Pexels 视频目录；每个线程使用独立连接，WAL 模式下多进程可同时读写"""
+
+    def __init__(self, path: str = PEXELS_CATALOG_DB, ttl: int = PEXELS_CATALOG_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS videos (
+                id INTEGER PRIMARY KEY,
+                url TEXT,
+                image TEXT,
+                duration INTEGER,
+                width INTEGER,
+                height INTEGER,
+                author TEXT,
+                tags TEXT,
+                raw TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS video_keywords (
+                keyword TEXT NOT NULL,
+                video_id INTEGER NOT NULL,
+                rank INTEGER NOT NULL,
+                seen_at REAL NOT NULL,
+                PRIMARY KEY (keyword, video_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS searches (
+                keyword TEXT PRIMARY KEY,
+                per_page INTEGER NOT NULL,
+                result_count INTEGER NOT NULL,
+                searched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_videos_size ON videos (width, height);
+            CREATE INDEX IF NOT EXISTS idx_videos_duration ON videos (duration);
+            CREATE INDEX IF NOT EXISTS idx_video_keywords_video ON video_keywords (video_id);
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # === 写入 ===
+    def record_search(self, keyword: str, per_page: int, videos: List[Dict]):
+        """保存一次 Pexels 搜索的全部结果，并记录该关键词的查询时间"""
+        keyword = normalize_query(keyword)
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 关键词与视频的对应关系以最近一次搜索为准；视频本身保留在目录中
+            conn.execute("DELETE FROM video_keywords WHERE keyword = ?", (keyword,))
+            for rank, video in enumerate(videos):
+                if not video.get("id"):
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO videos (id, url, image, duration, width, height, author, tags, raw, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        video["id"], video.get("url"), video.get("image"), video.get("duration"),
+                        video.get("width"), video.get("height"), (video.get("user") or {}).get("name"),
+                        json.dumps(video.get("tags") or [], ensure_ascii=False),
+                        json.dumps(video, ensure_ascii=False), now,
+                    )
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO video_keywords (keyword, video_id, rank, seen_at) VALUES (?, ?, ?, ?)",
+                    (keyword, video["id"], rank, now)
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO searches (keyword, per_page, result_count, searched_at) VALUES (?, ?, ?, ?)",
+                (keyword, per_page, len(videos), now)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # === 查询 ===
+    def covers(self, keyword: str, per_page: int) -> bool:
+        """该关键词最近一次搜索是否仍在有效期内，且当时取回的条数足够（或 Pexels 本身就没有更多结果）"""
+        row = self._connect().execute(
+            "SELECT per_page, result_count, searched_at FROM searches WHERE keyword = ?",
+            (normalize_query(keyword),)
+        ).fetchone()
+        if row is None or time.time() - row[2] >= self.ttl:
+            return False
+        searched_per_page, result_count, _ = row
+        return searched_per_page >= per_page or result_count < searched_per_page
+
+    def videos_for(
+        self,
+        keyword: str,
+        limit: int = 10,
+        min_width: Optional[int] = None,
+        min_height: Optional[int] = None,
+        orientation: Optional[str] = None,
+        max_duration: Optional[int] = None,
+    ) -> List[Dict]:
+        """按关键词（及尺寸、方向、时长条件）查询本地目录，按当时的搜索排名排序，返回原始视频 JSON"""
+        filters, params = "", [normalize_query(keyword)]
+        if min_width:
+            filters += " AND v.width >= ?"
+            params.append(min_width)
+        if min_height:
+            filters += " AND v.height >= ?"
+            params.append(min_height)
+        if orientation == "landscape":
+            filters += " AND v.width > v.height"
+        elif orientation == "portrait":
+            filters += " AND v.width < v.height"
+        elif orientation == "square":
+            filters += " AND v.width = v.height"
+        if max_duration:
+            filters += " AND v.duration <= ?"
+            params.append(max_duration)
+        rows = self._connect().execute(
+            "SELECT v.raw FROM video_keywords k JOIN videos v ON v.id = k.video_id "
+            f"WHERE k.keyword = ?{filters} ORDER BY k.rank LIMIT ?",
+            params + [limit]
+        )
+        return [json.loads(raw) for (raw,) in rows]
+
+    def keywords(self) -> List[str]:
+        return [row[0] for row in self._connect().execute("SELECT keyword FROM searches ORDER BY keyword")]
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        return {
+            "videos": conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0],
+            "keywords": conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0],
+            "fresh_keywords": conn.execute(
+                "SELECT COUNT(*) FROM searches WHERE searched_at >= ?", (time.time() - self.ttl,)
+            ).fetchone()[0],
+        }
+
+
+_catalog: Optional[PexelsCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_pexels_catalog() -> PexelsCatalog:
+    """获取进程内共享的 Pexels 视频目录"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = PexelsCatalog()
+    return _catalog
@@ -0,0 +1,250 @@
+"""本地研究语料的倒排索引：中文二元组分词 + BM25 排序，SQLite 存储以支持增量写入与多进程共享
+
+收录搜索摘要（snippet）、抓取的原文（article）和生成过的研究报告（report）。
+中文没有空格分词，这里对连续汉字取重叠二元组（“宁德时代” -> 宁德/德时/时代），
+不依赖分词词典也能较好地匹配专有名词；英文与数字按单词切分并转为小写。
+"""
+
+import os
+import re
+import math
+import time
+import heapq
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CORPUS_INDEX_DB = os.getenv(
+    "CORPUS_INDEX_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "assets", "cache", "corpus.sqlite3"),
+)
+
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_WORD = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+_STOPWORDS = {"the", "a", "an", "of", "and", "or", "to", "in", "on", "for", "is", "are", "with", "by", "at", "as"}
+
+
+def tokenize(text: str) -> List[str]:
+    """中文取重叠二元组（单字成词时保留单字），英文/数字按单词切分"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(word for word in _WORD.findall(_CJK_RUN.sub(" ", text)) if word not in _STOPWORDS)
+    return tokens
+
+
+class CorpusIndex:
+    """BM25 倒排索引
+
+    docs 表保存文档元数据与长度，postings 表保存 (词项, 文档, 词频)，按词项建索引；
+    查询时只读取查询词项的倒排列表，因此耗时与命中文档数成正比而不是与语料总量成正比。
+    """
+
+    def __init__(self, path: str = CORPUS_INDEX_DB):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                doc_key TEXT UNIQUE NOT NULL,
+                kind TEXT NOT NULL,
+                title TEXT,
+                url TEXT,
+                text TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                added_at REAL NOT NULL,
+                window_months INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id);
+            CREATE INDEX IF NOT EXISTS idx_docs_kind ON docs (kind, added_at);
+        """)
+        # 早期版本的索引没有 window_months 列；这些文档的搜索时间窗口未知
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(docs)")}
+        if "window_months" not in columns:
+            conn.execute("ALTER TABLE docs ADD COLUMN window_months INTEGER")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # === 写入 ===
+    def add(
+        self, doc_key: str, text: str, kind: str, title: str = "", url: str = "", window_months: Optional[int] = None
+    ) -> bool:
+        """增量添加文档；同一 doc_key 的内容未变化时跳过，变化时替换旧版本。返回是否写入
+
+        window_months 为得到该文档的搜索时间窗口（月）；内容未变化但窗口更窄时只更新窗口，
+        文档保留见过的最窄窗口。
+        """
+        text = (text or "").strip()
+        if not text:
+            return False
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        terms = Counter(tokenize(f"{title}\n{text}"))
+        if not terms:
+            return False
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, content_hash, window_months FROM docs WHERE doc_key = ?", (doc_key,)
+            ).fetchone()
+            if row is not None:
+                if row[1] == digest:
+                    if window_months is not None and (row[2] is None or window_months < row[2]):
+                        conn.execute("UPDATE docs SET window_months = ? WHERE id = ?", (window_months, row[0]))
+                        conn.execute("COMMIT")
+                    else:
+                        conn.execute("ROLLBACK")
+                    return False
+                conn.execute("DELETE FROM postings WHERE doc_id = ?", (row[0],))
+                conn.execute("DELETE FROM docs WHERE id = ?", (row[0],))
+            cursor = conn.execute(
+                "INSERT INTO docs (doc_key, kind, title, url, text, content_hash, length, added_at, window_months) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_key, kind, title, url, text, digest, sum(terms.values()), time.time(), window_months)
+            )
+            conn.executemany(
+                "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                [(term, cursor.lastrowid, tf) for term, tf in terms.items()]
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add_many(self, documents: Iterable[Dict]) -> int:
+        """批量添加 {doc_key, text, kind, title, url, window_months}，返回实际写入的数量"""
+        return sum(
+            self.add(
+                doc["doc_key"], doc["text"], doc["kind"], doc.get("title", ""), doc.get("url", ""),
+                doc.get("window_months"),
+            )
+            for doc in documents
+        )
+
+    # === 查询 ===
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        kinds: Optional[Iterable[str]] = None,
+        max_age: Optional[float] = None,
+        max_window: Optional[int] = None,
+    ) -> List[Dict]:
+        """BM25 top-k 查询
+
+        kinds 限定文档类型，max_age（秒）只返回最近加入的文档，
+        max_window（月）只返回搜索时间窗口已知且不超过该值的文档。
+        每条结果带 score 与 coverage（命中的查询词项占比，可用来判断证据是否充分）。
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return []
+
+        conn = self._connect()
+        total_docs, total_length = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+        if not total_docs:
+            return []
+        avg_length = total_length / total_docs
+
+        filters, params = "", []
+        if kinds:
+            kinds = list(kinds)
+            filters += f" AND d.kind IN ({','.join('?' * len(kinds))})"
+            params += kinds
+        if max_age is not None:
+            filters += " AND d.added_at >= ?"
+            params.append(time.time() - max_age)
+        if max_window is not None:
+            filters += " AND d.window_months <= ?"
+            params.append(max_window)
+
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for term in query_terms:
+            df = conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+            if not df:
+                continue
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            rows = conn.execute(
+                "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id "
+                f"WHERE p.term = ?{filters}",
+                [term] + params
+            )
+            for doc_id, tf, length in rows:
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+                matched[doc_id] = matched.get(doc_id, 0) + 1
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        if not top:
+            return []
+        rows = conn.execute(
+            f"SELECT id, doc_key, kind, title, url, text, added_at FROM docs WHERE id IN ({','.join('?' * len(top))})",
+            [doc_id for doc_id, _ in top]
+        ).fetchall()
+        by_id = {row[0]: row for row in rows}
+        return [
+            {
+                "doc_key": by_id[doc_id][1],
+                "kind": by_id[doc_id][2],
+                "title": by_id[doc_id][3],
+                "url": by_id[doc_id][4],
+                "text": by_id[doc_id][5],
+                "added_at": by_id[doc_id][6],
+                "score": score,
+                "coverage": matched[doc_id] / len(query_terms),
+            }
+            for doc_id, score in top if doc_id in by_id
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        stats = {kind: count for kind, count in conn.execute("SELECT kind, COUNT(*) FROM docs GROUP BY kind")}
+        stats["terms"] = conn.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+        return stats
+
+
+_index: Optional[CorpusIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_corpus_index() -> CorpusIndex:
+    """获取进程内共享的语料索引"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CorpusIndex()
+    return _index
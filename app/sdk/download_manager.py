@@ -0,0 +1,197 @@
+"""素材下载管理：已存在的文件不再下载、条件 GET 校验、分块流式写入临时文件后原子替换
+
+每个下载目录维护一份 .manifest.json，记录文件对应的 URL、大小、ETag 与 Last-Modified。
+清单中的文件大小与磁盘一致时直接复用，不产生任何网络请求；超过 revalidate_after 后
+才用 If-None-Match / If-Modified-Since 发起条件请求，304 时同样不下载正文。
+"""
+
+import os
+import json
+import time
+import threading
+from email.utils import formatdate
+from typing import Dict, Optional
+
+import requests
+from dotenv import load_dotenv
+from .resilience import UpstreamError, get_policy
+from .singleflight import SingleFlight
+from . import metrics
+
+load_dotenv()
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# 单个文件下载（含重试）的截止时间（秒）
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "120"))
+# 清单记录超过该时长（秒）后，下次使用前用条件 GET 确认远端未变化
+DOWNLOAD_REVALIDATE_AFTER = int(os.getenv("DOWNLOAD_REVALIDATE_AFTER", str(7 * 86400)))
+
+DOWNLOADS = metrics.registry.counter(
+    "downloads_total", "素材下载结果；result=reused/not_modified/downloaded/error", ("upstream", "result")
+)
+DOWNLOAD_BYTES = metrics.registry.counter(
+    "download_bytes_total", "实际下载的字节数", ("upstream",)
+)
+
+
+class DownloadManager:
+    """管理单个目录下的文件下载"""
+
+    MANIFEST_NAME = ".manifest.json"
+
+    def __init__(
+        self,
+        directory: str,
+        upstream: str = "pexels_cdn",
+        timeout: float = DOWNLOAD_TIMEOUT,
+        revalidate_after: int = DOWNLOAD_REVALIDATE_AFTER,
+    ):
+        self.directory = directory
+        self.upstream = upstream
+        self.timeout = timeout
+        self.revalidate_after = revalidate_after
+        self.manifest_path = os.path.join(directory, self.MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+        self._session = requests.Session()
+        os.makedirs(directory, exist_ok=True)
+        self._manifest: Dict[str, Dict] = self._load_manifest()
+
+    # === 清单 ===
+    def _load_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        """在持有 self._lock 时调用；先写临时文件再替换，避免读到半份清单"""
+        tmp_path = f"{self.manifest_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._manifest, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            print(f"写入下载清单失败: {e}")
+
+    def _record(self, filename: str, url: str, size: int, headers) -> None:
+        with self._lock:
+            self._manifest[filename] = {
+                "url": url,
+                "size": size,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "verified_at": time.time(),
+            }
+            self._save_manifest()
+
+    def _touch(self, filename: str) -> None:
+        with self._lock:
+            self._manifest[filename]["verified_at"] = time.time()
+            self._save_manifest()
+
+    def entry(self, filename: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._manifest.get(filename)
+            return dict(entry) if entry else None
+
+    # === 下载 ===
+    def download(self, url: str, filename: str) -> str:
+        """确保 filename 对应 url 的最新内容已在磁盘上，返回本地路径；失败时抛出异常
+
+        同一文件的并发请求只下载一次。
+        """
+        return self._inflight.do(filename, lambda: self._ensure(url, filename))
+
+    def _ensure(self, url: str, filename: str) -> str:
+        path = os.path.join(self.directory, filename)
+        entry = self.entry(filename)
+        size = os.path.getsize(path) if os.path.exists(path) else None
+
+        if entry and entry["url"] == url and entry["size"] == size:
+            if time.time() - entry.get("verified_at", 0) < self.revalidate_after:
+                DOWNLOADS.inc(upstream=self.upstream, result="reused")
+                return path
+            conditions = {}
+            if entry.get("etag"):
+                conditions["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                conditions["If-Modified-Since"] = entry["last_modified"]
+        elif size and not entry:
+            # 清单建立之前下载的文件：以文件修改时间做条件请求，未变化时直接收录
+            conditions = {"If-Modified-Since": formatdate(os.path.getmtime(path), usegmt=True)}
+        else:
+            conditions = {}
+
+        try:
+            return get_policy(self.upstream).call(
+                lambda timeout: self._fetch(url, filename, path, conditions, timeout),
+                deadline=self.timeout,
+                limit=False,  # CDN 文件不计入 API 配额（pexels_cdn 也未配置令牌桶）
+            )
+        except Exception:
+            DOWNLOADS.inc(upstream=self.upstream, result="error")
+            raise
+
+    def _fetch(self, url: str, filename: str, path: str, conditions: Dict[str, str], timeout: float) -> str:
+        with self._session.get(url, headers=conditions, stream=True, timeout=timeout) as response:
+            if response.status_code == 304 and os.path.exists(path):
+                if self.entry(filename):
+                    self._touch(filename)
+                else:
+                    self._record(filename, url, os.path.getsize(path), response.headers)
+                DOWNLOADS.inc(upstream=self.upstream, result="not_modified")
+                return path
+            if response.status_code != 200:
+                raise UpstreamError(
+                    f"下载失败: {response.status_code} {url}",
+                    upstream=self.upstream,
+                    status_code=response.status_code
+                )
+
+            expected = response.headers.get("Content-Length")
+            tmp_path = os.path.join(self.directory, f".{filename}.{threading.get_ident()}.part")
+            written = 0
+            try:
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+                if expected is not None and int(expected) != written and not response.headers.get("Content-Encoding"):
+                    raise UpstreamError(
+                        f"下载不完整: {written}/{expected} 字节 {url}", upstream=self.upstream
+                    )
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        DOWNLOAD_BYTES.inc(written, upstream=self.upstream)
+        DOWNLOADS.inc(upstream=self.upstream, result="downloaded")
+        self._record(filename, url, written, response.headers)
+        return path
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "files": len(self._manifest),
+                "bytes": sum(entry.get("size") or 0 for entry in self._manifest.values()),
+            }
+
+
+_managers: Dict[str, DownloadManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_download_manager(directory: str, upstream: str = "pexels_cdn") -> DownloadManager:
+    """按目录获取进程内共享的下载管理器"""
+    key = os.path.abspath(directory)
+    manager = _managers.get(key)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.get(key)
+            if manager is None:
+                manager = DownloadManager(directory, upstream=upstream)
+                _managers[key] = manager
+    return manager
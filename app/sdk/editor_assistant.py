@@ -2,13 +2,92 @@ import os
 import requests
 import re
 import json
-import csv
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
 from dotenv import load_dotenv
 from urllib.parse import urlencode
 from pathlib import Path
+from .resilience import UpstreamError, get_policy, parse_retry_after
+from .metrics import instrument
+from .download_manager import get_download_manager
+from .keyword_extractor import get_keyword_extractor
+from .asset_catalog import CATALOG_LOOKUPS, get_pexels_catalog
+from .image_index import get_image_index
+from .singleflight import SingleFlight
+from .timeline_export import iter_export, markers_from_assets
 
 load_dotenv()
 
+# 素材搜索与缩略图下载的并发上限
+EDITOR_ASSET_CONCURRENCY = int(os.getenv("EDITOR_ASSET_CONCURRENCY", "8"))
+# 每个片段最多用于搜索素材的关键词数（按出现次数排序后截断）
+EDITOR_MAX_KEYWORDS = int(os.getenv("EDITOR_MAX_KEYWORDS", "8"))
+# 整篇脚本批量处理：分段长度上限（字符）、同时处理的片段数、口播语速（字/秒）
+EDITOR_SEGMENT_CHARS = int(os.getenv("EDITOR_SEGMENT_CHARS", "200"))
+EDITOR_SEGMENT_CONCURRENCY = int(os.getenv("EDITOR_SEGMENT_CONCURRENCY", "4"))
+EDITOR_CHARS_PER_SECOND = float(os.getenv("EDITOR_CHARS_PER_SECOND", "4"))
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;…])")
+
+_asset_pool: Optional[ThreadPoolExecutor] = None
+_asset_pool_lock = threading.Lock()
+_segment_pool: Optional[ThreadPoolExecutor] = None
+_segment_pool_lock = threading.Lock()
+# 多个片段同时搜索同一个词时只请求一次
+_pexels_inflight = SingleFlight()
+
+
+def _get_asset_pool() -> ThreadPoolExecutor:
+    """素材任务专用的有界线程池
+
+    recommend_assets_for_segment 本身通常运行在共享线程池中，
+    若再向共享线程池提交并等待子任务，池被占满时会互相等待，因此单独建池。
+    """
+    global _asset_pool
+    if _asset_pool is None:
+        with _asset_pool_lock:
+            if _asset_pool is None:
+                _asset_pool = ThreadPoolExecutor(
+                    max_workers=EDITOR_ASSET_CONCURRENCY, thread_name_prefix="editor-asset"
+                )
+    return _asset_pool
+
+
+def _get_segment_pool() -> ThreadPoolExecutor:
+    """整篇脚本批量处理时按片段并发的线程池
+
+    每个片段内部还会向素材线程池提交并等待子任务，两级任务放在不同的池中以免互相占满。
+    """
+    global _segment_pool
+    if _segment_pool is None:
+        with _segment_pool_lock:
+            if _segment_pool is None:
+                _segment_pool = ThreadPoolExecutor(
+                    max_workers=EDITOR_SEGMENT_CONCURRENCY, thread_name_prefix="editor-segment"
+                )
+    return _segment_pool
+
+
+def split_script(script: str, max_chars: int = EDITOR_SEGMENT_CHARS):
+    """按段落切分脚本；超长段落按句末标点切句后再拼成不超过 max_chars 的片段"""
+    segments = []
+    for paragraph in script.splitlines():
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        current = ""
+        for sentence in _SENTENCE_END.split(paragraph):
+            if current and len(current) + len(sentence) > max_chars:
+                segments.append(current)
+                current = ""
+            current += sentence
+        if current.strip():
+            segments.append(current.strip())
+    return segments
+
+
 class EditorAssistantAgent:
     def __init__(self):
         self.PEXELS_API_KEY = os.getenv("PEXELS_API_KEY")
@@ -20,39 +99,91 @@ class EditorAssistantAgent:
         self.DOWNLOAD_DIR = "./assets/pexels/"
 
         os.makedirs(self.DOWNLOAD_DIR, exist_ok=True)
+        self.downloads = get_download_manager(self.DOWNLOAD_DIR)
+        self.catalog = get_pexels_catalog()
 
-    # === Step 1: 提取关键词（简化版） ===
+    # === Step 1: 提取关键词 ===
     def extract_keywords(self, text):
-        hint_words = [
-            "中国", "企业", "工厂", "香港", "投资", "全球化", "制裁", "政策", "议员", "电动车", "芯片", "能源", "会议"
-        ]
-        return [kw for kw in hint_words if kw in text]
+        return [item["keyword"] for item in self.extract_keyword_matches(text)]
+
+    def extract_keyword_matches(self, text, limit=EDITOR_MAX_KEYWORDS):
+        """词表匹配（含同义词），返回 [{keyword, search, category, count, positions}]"""
+        return get_keyword_extractor().extract(text, limit=limit)
 
-    # === Step 2: 调用 Pexels API 搜索素材 ===
-    def search_pexels_videos(self, query, per_page=3):
+    # === Step 2: 搜索素材（优先本地目录，未覆盖时调用 Pexels API） ===
+    @instrument
+    def search_pexels_videos(self, query, per_page=3, use_catalog=True):
+        if use_catalog and self.catalog.covers(query, per_page):
+            CATALOG_LOOKUPS.inc(result="hit")
+            return self.catalog.videos_for(query, limit=per_page)
+        return _pexels_inflight.do((query, per_page), lambda: self._search_pexels_api(query, per_page))
+
+    def _search_pexels_api(self, query, per_page):
         params = {"query": query, "per_page": per_page}
-        response = requests.get(self.PEXELS_SEARCH_URL, headers=self.PEXELS_HEADERS, params=params)
-        if response.status_code != 200:
-            print(f"[PEXELS ERROR] {response.status_code}: {response.text}")
-            return []
-        return response.json().get("videos", [])
+
+        def attempt(timeout: float):
+            response = requests.get(
+                self.PEXELS_SEARCH_URL, headers=self.PEXELS_HEADERS, params=params, timeout=timeout
+            )
+            if response.status_code != 200:
+                raise UpstreamError(
+                    f"[PEXELS ERROR] {response.status_code}: {response.text}",
+                    upstream="pexels",
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response.headers.get("Retry-After"))
+                )
+            return response.json().get("videos", [])
+
+        try:
+            videos = get_policy("pexels").call(attempt)
+        except (requests.exceptions.RequestException, UpstreamError) as e:
+            print(e)
+            # Pexels 不可用或配额耗尽时，退回本地目录中已过期的结果
+            stale = self.catalog.videos_for(query, limit=per_page)
+            if stale:
+                CATALOG_LOOKUPS.inc(result="stale_fallback")
+            return stale
+
+        CATALOG_LOOKUPS.inc(result="miss")
+        try:
+            self.catalog.record_search(query, per_page, videos)
+        except Exception as e:
+            print(f"写入 Pexels 本地目录失败: {e}")
+        return videos
 
     # === Step 3: 下载视频缩略图或封面图（供剪辑预览） ===
+    @instrument
     def download_thumbnail(self, video_data):
         video_id = video_data.get("id")
         image_url = video_data.get("image")
         if not video_id or not image_url:
             return None
-        file_path = os.path.join(self.DOWNLOAD_DIR, f"pexels_{video_id}.jpg")
         try:
-            img = requests.get(image_url)
-            with open(file_path, "wb") as f:
-                f.write(img.content)
-            return file_path
+            # 已下载过的缩略图直接复用；下载时分块写入临时文件后原子替换
+            return self.downloads.download(image_url, f"pexels_{video_id}.jpg")
         except Exception as e:
             print(f"Error downloading thumbnail {image_url}: {e}")
             return None
 
+    # === Step 3.5: 合并画面近似重复的素材 ===
+    def collapse_duplicates(self, videos):
+        """按缩略图感知哈希去重：保留靠前的素材，重复项记入其 duplicates 字段"""
+        try:
+            owners = get_image_index().collapse([v["thumbnail"] for v in videos])
+        except Exception as e:
+            print(f"素材去重失败，返回未去重结果: {e}")
+            return videos
+
+        kept = []
+        for video, owner in zip(videos, owners):
+            if owner is None or videos[owner] is video:
+                kept.append(video)
+            else:
+                videos[owner].setdefault("duplicates", []).append(
+                    {"keyword": video["keyword"], "title": video["title"]}
+                )
+        return kept
+
     # === Step 4: AI 图像 Prompt 推荐 ===
     def generate_ai_prompt(self, text):
         return {
@@ -62,42 +193,114 @@ class EditorAssistantAgent:
         }
 
     # === 主调度函数 ===
+    @instrument
     def recommend_assets_for_segment(self, script_segment: str):
-        keywords = self.extract_keywords(script_segment)
+        matches = self.extract_keyword_matches(script_segment)
+        keywords = [item["keyword"] for item in matches]
+        pool = _get_asset_pool()
+
+        # 所有关键词并发搜索（使用词表中的英文搜索词）；某个关键词的搜索一完成就开始下载它的缩略图
+        # 每个任务复制一份当前上下文，子任务中上游调用的指标标签仍归属于发起的 Agent 方法
+        searches = {
+            pool.submit(contextvars.copy_context().run, self.search_pexels_videos, item["search"]): i
+            for i, item in enumerate(matches)
+        }
+        videos_by_keyword = [[] for _ in keywords]
+        for future in as_completed(searches):
+            videos_by_keyword[searches[future]] = [
+                (v, pool.submit(contextvars.copy_context().run, self.download_thumbnail, v))
+                for v in future.result()
+            ]
+
+        # 按关键词顺序、每个关键词内按搜索结果顺序组装，与串行版本的输出一致
         all_videos = []
-        thumbnails = [] # This variable is not used in the return, but kept for consistency with original
-        for kw in keywords:
-            vids = self.search_pexels_videos(kw)
-            for v in vids:
-                thumb_path = self.download_thumbnail(v)
-                thumbnails.append(thumb_path)
+        for kw, videos in zip(keywords, videos_by_keyword):
+            for v, download in videos:
                 all_videos.append({
                     "keyword": kw,
                     "title": v.get("url"),
-                    "thumbnail": thumb_path
+                    "thumbnail": download.result()
                 })
+        all_videos = self.collapse_duplicates(all_videos)
         ai_prompt = self.generate_ai_prompt(script_segment)
         return {
             "keywords": keywords,
+            "keyword_matches": matches,
             "pexels_results": all_videos,
             "ai_image_prompt": ai_prompt
         }
 
-    # === 导出为 FCP 可用 CSV ===
-    def export_csv_for_fcp(self, assets, csv_path="fcp_labels.csv", segment_duration=10):
+    # === 整篇脚本：分段并发处理，合并为一条时间线 ===
+    @instrument
+    def recommend_assets_for_script(self, script: str, max_chars: int = None, chars_per_second: float = None):
+        """返回 {segments, markers, total_duration}
+
+        片段时长按口播语速估算；每个片段的素材在片段时长内均分，得到时间线上的素材标记（单位：秒）。
+        各片段共享关键词提取器、Pexels 本地目录、并发搜索合并与下载管理器，同一素材只搜索、下载一次。
+        某个片段处理失败时不影响其他片段：该片段没有素材和标记，错误信息记入其 error 字段。
+        """
+        segments = split_script(script, max_chars or EDITOR_SEGMENT_CHARS)
+        if not segments:
+            raise ValueError("脚本内容为空")
+        chars_per_second = chars_per_second or EDITOR_CHARS_PER_SECOND
+
+        pool = _get_segment_pool()
+        futures = [pool.submit(contextvars.copy_context().run, self.recommend_assets_for_segment, text) for text in segments]
+
+        timeline, markers, cursor = [], [], 0.0
+        for index, (text, future) in enumerate(zip(segments, futures)):
+            try:
+                assets = future.result()
+            except Exception as e:
+                print(f"片段 {index} 素材推荐失败: {e}")
+                assets = {
+                    "keywords": [],
+                    "keyword_matches": [],
+                    "pexels_results": [],
+                    "ai_image_prompt": self.generate_ai_prompt(text),
+                    "error": str(e),
+                }
+            duration = round(max(1.0, len(text) / chars_per_second), 2)
+            start, end = cursor, round(cursor + duration, 2)
+            timeline.append({"index": index, "text": text, "start": start, "end": end, **assets})
+
+            slot = duration / max(1, len(assets["pexels_results"]))
+            for i, item in enumerate(assets["pexels_results"]):
+                markers.append({
+                    "segment": index,
+                    "start": round(start + i * slot, 2),
+                    "end": round(start + (i + 1) * slot, 2) if i + 1 < len(assets["pexels_results"]) else end,
+                    "keyword": item["keyword"],
+                    "title": item["title"],
+                    "thumbnail": item["thumbnail"],
+                    "ai_image_prompt": assets["ai_image_prompt"]["prompt"],
+                })
+            cursor = end
+
+        return {"segments": timeline, "markers": markers, "total_duration": cursor}
+
+    # === 导出时间线（CSV / SRT / FCPXML） ===
+    def export_timeline(self, timeline, fmt="csv", fps=25, segment_duration=10, title="timeline"):
+        """返回逐块生成导出内容的迭代器
+
+        timeline 可以是 recommend_assets_for_script 的结果（含 markers），
+        也可以是单片段的 recommend_assets_for_segment 结果（每个素材占 segment_duration 秒）。
+        """
+        if "markers" in timeline:
+            markers, total_duration = timeline["markers"], timeline.get("total_duration")
+        else:
+            markers, total_duration = markers_from_assets(timeline, segment_duration), None
+        return iter_export(markers, fmt, fps, title, total_duration)
+
+    # === 导出为 FCP 可用 CSV（写入本地文件，供独立运行时使用） ===
+    def export_csv_for_fcp(self, assets, csv_path="fcp_labels.csv", segment_duration=10, fps=25):
         # Ensure the assets directory exists for the CSV output
         csv_dir = Path(csv_path).parent
         os.makedirs(csv_dir, exist_ok=True)
 
         with open(csv_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Start", "End", "Text"])
-
-            for i, item in enumerate(assets["pexels_results"]):
-                start = f"00:00:{i*segment_duration:02d}"
-                end = f"00:00:{(i+1)*segment_duration:02d}"
-                text = f"关键词：{item['keyword']}\n素材：{item['title']}\nAI图：{assets['ai_image_prompt']['prompt']}"
-                writer.writerow([start, end, text])
+            for chunk in self.export_timeline(assets, "csv", fps, segment_duration):
+                f.write(chunk)
         print(f"✅ Final Cut Pro CSV 已保存至 {csv_path}")
 
 # === 示例用法（调试/独立运行用）===
@@ -0,0 +1,298 @@
+"""素材图片感知哈希索引：dHash + pHash，NumPy 批量计算，按汉明距离查询近似重复与相似图片
+
+每张图片保存两个 64 位哈希：
+- dHash：缩放到 9x8 灰度后比较相邻像素亮度
+- pHash：缩放到 32x32 灰度后做二维 DCT，取左上 8x8 低频系数与其中位数比较
+两者都小于阈值才判为近似重复，可减少单一哈希的误判。
+索引以 uint64 数组形式保存在 assets/cache/image_hashes.npz，只为新增或修改过的文件重新计算。
+"""
+
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+IMAGE_INDEX_PATH = os.getenv("IMAGE_INDEX_PATH", os.path.join(_ROOT, "assets", "cache", "image_hashes.npz"))
+IMAGE_INDEX_DIRS = [
+    path.strip() for path in os.getenv(
+        "IMAGE_INDEX_DIRS", f"{os.path.join(_ROOT, 'assets', 'pexels')},{os.path.join(_ROOT, 'assets', 'images')}"
+    ).split(",") if path.strip()
+]
+# 两种哈希的汉明距离都不超过该值时视为近似重复（64 位中）
+IMAGE_DUPLICATE_DISTANCE = int(os.getenv("IMAGE_DUPLICATE_DISTANCE", "10"))
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
+
+_BIT_WEIGHTS = np.uint64(1) << np.arange(63, -1, -1, dtype=np.uint64)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def _pack_bits(bits: np.ndarray) -> np.ndarray:
+    """(N, 64) 布尔数组 -> (N,) uint64"""
+    return (bits.astype(np.uint64) * _BIT_WEIGHTS).sum(axis=1, dtype=np.uint64)
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """uint64 数组逐元素计算置位数（SWAR），返回 int 数组"""
+    v = values.astype(np.uint64)
+    v = v - ((v >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    v = (v & np.uint64(0x3333333333333333)) + ((v >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    v = (v + (v >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((v * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+
+def hamming(hashes: np.ndarray, query: int) -> np.ndarray:
+    return popcount64(np.bitwise_xor(hashes, np.uint64(query)))
+
+
+def dhash_batch(pixels: np.ndarray) -> np.ndarray:
+    """pixels: (N, 8, 9) 灰度 -> (N,) uint64"""
+    bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+    return _pack_bits(bits.reshape(len(pixels), 64))
+
+
+def phash_batch(pixels: np.ndarray) -> np.ndarray:
+    """pixels: (N, 32, 32) 灰度 -> (N,) uint64"""
+    coefficients = np.einsum("ij,njk,lk->nil", _DCT32, pixels, _DCT32)[:, :8, :8].reshape(len(pixels), 64)
+    # 中位数不含直流分量，避免整体亮度主导
+    medians = np.median(coefficients[:, 1:], axis=1, keepdims=True)
+    return _pack_bits(coefficients > medians)
+
+
+def _load_pixels(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    with Image.open(path) as image:
+        gray = image.convert("L")
+        small = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.float32)
+        large = np.asarray(gray.resize((32, 32), Image.LANCZOS), dtype=np.float32)
+    return small, large
+
+
+def compute_hashes(paths: Sequence[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """批量计算哈希，返回 (成功解码的路径, dhash 数组, phash 数组)；无法解码的文件跳过"""
+    decoded, small, large = [], [], []
+    for path in paths:
+        try:
+            s, l = _load_pixels(path)
+        except (OSError, ValueError) as e:
+            print(f"无法读取图片 {path}: {e}")
+            continue
+        decoded.append(path)
+        small.append(s)
+        large.append(l)
+    if not decoded:
+        return [], np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64)
+    return decoded, dhash_batch(np.stack(small)), phash_batch(np.stack(large))
+
+
+class ImageHashIndex:
+    """图片哈希索引；paths 与 dhash/phash/mtimes/sizes 数组按下标一一对应"""
+
+    def __init__(
+        self,
+        directories: Iterable[str] = IMAGE_INDEX_DIRS,
+        path: str = IMAGE_INDEX_PATH,
+        max_distance: int = IMAGE_DUPLICATE_DISTANCE,
+    ):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.path = path
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self.paths: List[str] = []
+        self.dhash = np.zeros(0, dtype=np.uint64)
+        self.phash = np.zeros(0, dtype=np.uint64)
+        self.mtimes = np.zeros(0, dtype=np.float64)
+        self.sizes = np.zeros(0, dtype=np.int64)
+        self._position: Dict[str, int] = {}
+        self._load()
+
+    # === 持久化 ===
+    def _load(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                self.paths = [str(p) for p in data["paths"]]
+                self.dhash = data["dhash"]
+                self.phash = data["phash"]
+                self.mtimes = data["mtimes"]
+                self.sizes = data["sizes"]
+        except (OSError, KeyError, ValueError):
+            return
+        self._position = {p: i for i, p in enumerate(self.paths)}
+
+    def _save(self):
+        """在持有 self._lock 时调用；写临时文件后原子替换"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f, paths=np.array(self.paths, dtype=str), dhash=self.dhash, phash=self.phash,
+                    mtimes=self.mtimes, sizes=self.sizes
+                )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"写入图片哈希索引失败: {e}")
+
+    # === 更新 ===
+    def _scan(self) -> Dict[str, os.stat_result]:
+        found = {}
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                        full_path = os.path.abspath(os.path.join(root, name))
+                        found[full_path] = os.stat(full_path)
+        return found
+
+    def refresh(self) -> Dict[str, int]:
+        """扫描索引目录：新增或修改过的文件重新计算哈希，已删除的文件移出索引"""
+        return self._update(self._scan(), prune=True)
+
+    def add_files(self, paths: Iterable[str]) -> Dict[str, int]:
+        """只更新指定文件（如刚下载的缩略图），不扫描目录"""
+        found = {}
+        for path in paths:
+            if path and os.path.exists(path):
+                full_path = os.path.abspath(path)
+                found[full_path] = os.stat(full_path)
+        return self._update(found, prune=False)
+
+    def _update(self, found: Dict[str, os.stat_result], prune: bool) -> Dict[str, int]:
+        with self._lock:
+            changed = [
+                p for p, st in found.items()
+                if p not in self._position
+                or self.mtimes[self._position[p]] != st.st_mtime
+                or self.sizes[self._position[p]] != st.st_size
+            ]
+            removed = [p for p in self.paths if p not in found] if prune else []
+            if not changed and not removed:
+                return {"added": 0, "removed": 0, "total": len(self.paths)}
+
+            decoded, dhashes, phashes = compute_hashes(changed)
+            drop = set(removed) | set(decoded)
+            keep = [i for i, p in enumerate(self.paths) if p not in drop]
+            self.paths = [self.paths[i] for i in keep] + decoded
+            self.dhash = np.concatenate([self.dhash[keep], dhashes])
+            self.phash = np.concatenate([self.phash[keep], phashes])
+            self.mtimes = np.concatenate([self.mtimes[keep], [found[p].st_mtime for p in decoded]]).astype(np.float64)
+            self.sizes = np.concatenate([self.sizes[keep], [found[p].st_size for p in decoded]]).astype(np.int64)
+            self._position = {p: i for i, p in enumerate(self.paths)}
+            self._save()
+            return {"added": len(decoded), "removed": len(removed), "total": len(self.paths)}
+
+    # === 查询 ===
+    def _hashes_of(self, path: str) -> Optional[Tuple[int, int]]:
+        full_path = os.path.abspath(path)
+        if full_path not in self._position:
+            self.add_files([full_path])
+        with self._lock:
+            i = self._position.get(full_path)
+            return None if i is None else (int(self.dhash[i]), int(self.phash[i]))
+
+    def similar(self, path: str, k: int = 10, max_distance: Optional[int] = None) -> List[Dict]:
+        """与指定图片最相似的 k 张图片（不含自身），distance 为两种哈希汉明距离中的较大值"""
+        full_path = os.path.abspath(path)
+        if not any(full_path.startswith(directory + os.sep) for directory in self.directories):
+            raise ValueError(f"图片不在索引目录中: {path}")
+        hashes = self._hashes_of(path)
+        if hashes is None:
+            return []
+        with self._lock:
+            paths, dhash, phash = self.paths, self.dhash, self.phash
+            self_index = self._position[os.path.abspath(path)]
+        distances = np.maximum(hamming(dhash, hashes[0]), hamming(phash, hashes[1]))
+        distances[self_index] = 65  # 排除自身
+        if max_distance is not None:
+            candidates = np.flatnonzero(distances <= max_distance)
+        else:
+            candidates = np.arange(len(paths))
+        order = candidates[np.argsort(distances[candidates], kind="stable")][:k]
+        return [{"path": paths[i], "distance": int(distances[i])} for i in order if distances[i] <= 64]
+
+    def duplicate_groups(self, max_distance: Optional[int] = None) -> List[List[str]]:
+        """全索引近似重复分组（并查集），只返回包含两张及以上图片的组"""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        with self._lock:
+            paths, dhash, phash = self.paths, self.dhash, self.phash
+        parent = list(range(len(paths)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i in range(len(paths) - 1):
+            # 每行一次向量化比较，只与下标更大的图片比较
+            distances = np.maximum(hamming(dhash[i + 1:], int(dhash[i])), hamming(phash[i + 1:], int(phash[i])))
+            for j in np.flatnonzero(distances <= max_distance):
+                parent[find(i + 1 + int(j))] = find(i)
+
+        groups: Dict[int, List[str]] = {}
+        for i, p in enumerate(paths):
+            groups.setdefault(find(i), []).append(p)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def collapse(self, paths: Sequence[Optional[str]], max_distance: Optional[int] = None) -> List[Optional[int]]:
+        """对有序的图片列表去重：返回每张图片归属的代表下标（自身为代表时等于自身下标，无法哈希时为 None）
+
+        靠前的图片作为代表，后面与任一代表近似重复的图片归入该代表。
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        self.add_files([p for p in paths if p])
+        representatives: List[int] = []
+        rep_dhash, rep_phash = [], []
+        result: List[Optional[int]] = []
+        for i, path in enumerate(paths):
+            hashes = self._hashes_of(path) if path else None
+            if hashes is None:
+                result.append(None)
+                continue
+            if representatives:
+                distances = np.maximum(
+                    hamming(np.array(rep_dhash, dtype=np.uint64), hashes[0]),
+                    hamming(np.array(rep_phash, dtype=np.uint64), hashes[1]),
+                )
+                nearest = int(np.argmin(distances))
+                if distances[nearest] <= max_distance:
+                    result.append(representatives[nearest])
+                    continue
+            representatives.append(i)
+            rep_dhash.append(hashes[0])
+            rep_phash.append(hashes[1])
+            result.append(i)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"images": len(self.paths), "bytes": int(self.dhash.nbytes + self.phash.nbytes)}
+
+
+_index: Optional[ImageHashIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_image_index() -> ImageHashIndex:
+    """获取进程内共享的图片哈希索引"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ImageHashIndex()
+    return _index
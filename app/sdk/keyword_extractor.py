@@ -0,0 +1,203 @@
+"""脚本关键词提取：Aho-Corasick 自动机一次扫描匹配整张词表
+
+词表（默认 templates/editor/keywords.json）中每个词条包含规范关键词、同义词与 Pexels 英文搜索词，
+所有写法都编译进同一个自动机，扫描耗时只与文本长度和命中数有关，与词表大小无关。
+匹配前对每个字符做 NFKC 归一化与小写（全角英文、大小写不同的写法都能命中），
+逐字符处理保证返回的位置对应原文下标。
+"""
+
+import os
+import json
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 词表随仓库发布，相对路径按项目根目录解析，与启动目录无关
+EDITOR_KEYWORDS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    os.getenv("EDITOR_KEYWORDS_FILE", os.path.join("templates", "editor", "keywords.json")),
+)
+
+
+@lru_cache(maxsize=65536)
+def _normalize_char(char: str) -> str:
+    """单字符归一化；归一化后变成多个字符的（如 ㈱）保持原样，以免位置错位"""
+    normalized = unicodedata.normalize("NFKC", char).lower()
+    return normalized if len(normalized) == 1 else char
+
+
+def _normalize(text: str) -> str:
+    return "".join(_normalize_char(char) for char in text)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+class AhoCorasick:
+    """多模式串匹配自动机
+
+    goto 为每个状态的转移表，fail 为失配指针，output 为到达该状态时命中的模式编号
+    （构建时已沿失配链合并，扫描时无需再回溯输出）。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+        for pattern in patterns:
+            self._insert(pattern)
+        self._build_failure_links()
+
+    def _insert(self, pattern: str):
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _build_failure_links(self):
+        # 广度优先：深度更浅的状态的失配指针先确定
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterable[Tuple[int, int, int]]:
+        """逐个产出 (起始下标, 结束下标, 模式编号)，包含相互重叠的命中"""
+        goto, fail, output, patterns = self.goto, self.fail, self.output, self.patterns
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                yield index + 1 - len(patterns[pattern_id]), index + 1, pattern_id
+
+
+class KeywordExtractor:
+    """基于词表的关键词提取器
+
+    词表条目格式：{"keyword": "芯片", "synonyms": ["半导体", ...], "search": "semiconductor chip"}；
+    search 缺省时使用 keyword 本身作为 Pexels 搜索词。
+    """
+
+    def __init__(self, entries: List[Dict]):
+        self.entries: List[Dict] = []
+        surfaces: Dict[str, int] = {}
+        for entry in entries:
+            keyword = entry["keyword"]
+            entry_id = len(self.entries)
+            self.entries.append({
+                "keyword": keyword,
+                "search": entry.get("search") or keyword,
+                "category": entry.get("category"),
+            })
+            for surface in [keyword] + list(entry.get("synonyms", [])):
+                normalized = _normalize(surface).strip()
+                if normalized:
+                    # 同一写法出现在多个词条中时以先出现的词条为准
+                    surfaces.setdefault(normalized, entry_id)
+
+        self._surfaces = list(surfaces)
+        self._entry_of = [surfaces[surface] for surface in self._surfaces]
+        # 纯英文/数字写法需要整词匹配，避免 "ai" 命中 "said"
+        self._needs_boundary = [all(_is_word_char(c) or c in " -." for c in s) for s in self._surfaces]
+        self.automaton = AhoCorasick(self._surfaces)
+
+    @classmethod
+    def from_file(cls, path: str = EDITOR_KEYWORDS_FILE) -> "KeywordExtractor":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["keywords"] if isinstance(data, dict) else data)
+
+    def __len__(self) -> int:
+        return len(self._surfaces)
+
+    def _scan(self, text: str, overlapping: bool) -> List[Tuple[int, int, int]]:
+        """返回 (起始下标, 结束下标, 写法编号)，按位置排序"""
+        normalized = _normalize(text)
+        matches = []
+        for start, end, surface_id in self.automaton.iter_matches(normalized):
+            if self._needs_boundary[surface_id] and (
+                (start > 0 and _is_word_char(normalized[start - 1]))
+                or (end < len(normalized) and _is_word_char(normalized[end]))
+            ):
+                continue
+            matches.append((start, end, surface_id))
+        # 同一起点时更长的命中排在前面
+        matches.sort(key=lambda match: (match[0], match[0] - match[1]))
+        if overlapping:
+            return matches
+
+        selected, covered_until = [], 0
+        for match in matches:
+            if match[0] >= covered_until:
+                selected.append(match)
+                covered_until = match[1]
+        return selected
+
+    def find_matches(self, text: str, overlapping: bool = False) -> List[Dict]:
+        """返回命中列表 [{keyword, surface, start, end}]，按出现位置排序
+
+        overlapping=False 时按“最左最长”取不重叠的命中（“新能源汽车” 不再同时报出 “能源”）。
+        """
+        return [
+            {
+                "keyword": self.entries[self._entry_of[surface_id]]["keyword"],
+                "surface": text[start:end],
+                "start": start,
+                "end": end,
+            }
+            for start, end, surface_id in self._scan(text, overlapping)
+        ]
+
+    def extract(self, text: str, limit: Optional[int] = None) -> List[Dict]:
+        """按规范关键词汇总：[{keyword, search, category, count, positions}]
+
+        按出现次数降序、首次出现位置升序排列；positions 为 [start, end] 列表。
+        """
+        summary: Dict[int, Dict] = {}
+        for start, end, surface_id in self._scan(text, overlapping=False):
+            entry_id = self._entry_of[surface_id]
+            item = summary.get(entry_id)
+            if item is None:
+                item = summary[entry_id] = {**self.entries[entry_id], "count": 0, "positions": []}
+            item["count"] += 1
+            item["positions"].append([start, end])
+        ranked = sorted(summary.values(), key=lambda item: (-item["count"], item["positions"][0][0]))
+        return ranked[:limit] if limit else ranked
+
+
+_extractor: Optional[KeywordExtractor] = None
+_extractor_mtime: Optional[float] = None
+_extractor_lock = threading.Lock()
+
+
+def get_keyword_extractor(path: str = EDITOR_KEYWORDS_FILE) -> KeywordExtractor:
+    """获取进程内共享的关键词提取器；词表文件修改后下次调用时自动重新编译"""
+    global _extractor, _extractor_mtime
+    mtime = os.path.getmtime(path)
+    if _extractor is None or _extractor_mtime != mtime:
+        with _extractor_lock:
+            if _extractor is None or _extractor_mtime != mtime:
+                _extractor = KeywordExtractor.from_file(path)
+                _extractor_mtime = mtime
+    return _extractor
@@ -0,0 +1,230 @@
+"""LLM 响应缓存：以请求内容哈希为键，内存 LRU + 磁盘两级存储"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "assets", "cache", "llm"
+)
+
+# 各 Agent 的缓存有效期（秒），0 表示不缓存
+DEFAULT_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))
+AGENT_TTLS = {
+    "YouTubeStrategyAgent": 6 * 3600,
+    "StrategyAgent": 6 * 3600,
+    "ResearchAgent": 3600,
+    "ScriptwriterAgent": 3600,
+    "ReviewerAgent": 3600,
+    "ThumbnailAgent": 3600,
+    "PublishingAgent": 3600,
+    "AnalyticsAgent": 600,
+}
+
+
+class LLMCache:
+    """内容寻址的 LLM 响应缓存，支持 TTL、容量上限淘汰和命中统计"""
+
+    def __init__(
+        self,
+        cache_dir: str = CACHE_DIR,
+        max_entries: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")),
+        max_disk_bytes: int = int(os.getenv("LLM_CACHE_MAX_DISK_MB", "100")) * 1024 * 1024,
+        enabled: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() != "false",
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.enabled = enabled
+
+        self._memory: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "evictions": 0,
+        }
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._disk_bytes = sum(
+            os.path.getsize(os.path.join(self.cache_dir, name))
+            for name in os.listdir(self.cache_dir) if name.endswith(".json")
+        )
+
+    @staticmethod
+    def make_key(payload: Dict) -> str:
+        """根据 model、messages、temperature、max_tokens（及 response_format）计算缓存键"""
+        material = {
+            "model": payload.get("model"),
+            "messages": payload.get("messages"),
+            "temperature": payload.get("temperature"),
+            "max_tokens": payload.get("max_tokens"),
+        }
+        if payload.get("response_format"):
+            # 只在结构化输出时加入，保持已有缓存键不变
+            material["response_format"] = payload["response_format"]
+        raw = json.dumps(material, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def ttl_for(agent: Optional[str]) -> int:
+        """获取指定 Agent 的缓存有效期"""
+        env_ttl = os.getenv(f"LLM_CACHE_TTL_{agent.upper()}") if agent else None
+        if env_ttl is not None:
+            return int(env_ttl)
+        return AGENT_TTLS.get(agent, DEFAULT_TTL)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key: str, expires_at: float, body: Dict):
+        self._memory[key] = (expires_at, body)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """读取缓存，过期或不存在时返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            record = None
+
+        with self._lock:
+            hit = record is not None and record.get("expires_at", 0) > now
+            if hit:
+                self._remember(key, record["expires_at"], record["body"])
+                self._stats["hits"] += 1
+                self._stats["disk_hits"] += 1
+            else:
+                self._stats["misses"] += 1
+
+        if hit:
+            # 刷新修改时间，使磁盘淘汰近似 LRU
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            return record["body"]
+
+        if record is not None:
+            self._remove_file(path)
+        return None
+
+    def set(self, key: str, body: Dict, ttl: int):
+        """写入缓存（内存与磁盘）"""
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires_at, body)
+
+        data = json.dumps(
+            {"created_at": time.time(), "expires_at": expires_at, "body": body},
+            ensure_ascii=False
+        ).encode("utf-8")
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入LLM缓存失败: {e}")
+            return
+
+        with self._lock:
+            self._disk_bytes += len(data) - previous
+            over_limit = self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def delete(self, key: str):
+        """删除单个条目（如未通过校验的结构化输出）"""
+        with self._lock:
+            self._memory.pop(key, None)
+        self._remove_file(self._path(key))
+
+    def _remove_file(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _evict_disk(self):
+        """按最近修改时间淘汰磁盘缓存，直到低于容量上限"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        entries.sort()
+
+        for _, path in entries:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            self._remove_file(path)
+            with self._lock:
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        """清空内存与磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                self._remove_file(os.path.join(self.cache_dir, name))
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中/未命中计数与当前占用"""
+        with self._lock:
+            return {
+                **self._stats,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """获取进程内共享的 LLM 缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
@@ -0,0 +1,455 @@
+"""共享的 OpenRouter 客户端：所有 Agent 通过同一个长连接池调用 /chat/completions"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+import weakref
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from .llm_cache import LLMCache, get_llm_cache
+from .singleflight import SingleFlight
+from .resilience import UpstreamError, get_policy, parse_retry_after
+from . import metrics
+
+load_dotenv()
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# 连接池大小与超时（秒），可通过环境变量调整
+DEFAULT_POOL_SIZE = int(os.getenv("OPENROUTER_POOL_SIZE", "10"))
+DEFAULT_TIMEOUT = float(os.getenv("OPENROUTER_TIMEOUT", "120"))
+DEFAULT_CONNECT_TIMEOUT = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "10"))
+
+
+class LLMClient:
+    """带连接池的 OpenRouter 客户端，同时提供同步与 asyncio 接口"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = OPENROUTER_BASE_URL,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        cache: Optional[LLMCache] = None,
+    ):
+        if not api_key:
+            raise ValueError("OPENROUTER_API_KEY not found in .env file")
+
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.cache = cache or get_llm_cache()
+        self._inflight = SingleFlight()
+        self.policy = get_policy("openrouter")
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+
+        # 同步会话：keep-alive 连接在所有线程间复用
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers.update(self.headers)
+
+        # 异步客户端与事件循环绑定，每个循环各持有一个
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _read_timeout(self, timeout: Optional[float], remaining: float) -> float:
+        """单次尝试的读超时：调用方指定值（或默认值）与剩余截止时间中的较小者"""
+        return min(timeout if timeout is not None else self.timeout, remaining)
+
+    def _timeout(self, timeout: Optional[float], remaining: float) -> Tuple[float, float]:
+        return (min(self.connect_timeout, remaining), self._read_timeout(timeout, remaining))
+
+    def _async_timeout(self, timeout: Optional[float], remaining: float) -> httpx.Timeout:
+        return httpx.Timeout(
+            self._read_timeout(timeout, remaining), connect=min(self.connect_timeout, remaining)
+        )
+
+    @staticmethod
+    def _raise_for_status(status_code: int, text: str, headers) -> None:
+        if status_code != 200:
+            raise UpstreamError(
+                f"OpenRouter API请求失败: {text}",
+                upstream="openrouter",
+                status_code=status_code,
+                retry_after=parse_retry_after(headers.get("Retry-After"))
+            )
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def build_payload(
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        response_format: Optional[Dict] = None,
+    ) -> Dict:
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if response_format:
+            payload["response_format"] = response_format
+        return payload
+
+    def _cache_ttl(self, agent: Optional[str], use_cache: bool) -> int:
+        if not use_cache or not self.cache.enabled:
+            return 0
+        return self.cache.ttl_for(agent)
+
+    @staticmethod
+    def _extract_content(body: Dict) -> str:
+        return body["choices"][0]["message"]["content"]
+
+    @staticmethod
+    def _parse_stream_line(line: str, usage: Optional[Dict] = None) -> Optional[str]:
+        """解析一行 SSE 数据，返回增量文本；流结束时返回 None
+
+        最后一个数据块携带的 usage 字段会写入传入的 usage 字典。
+        """
+        if not line.startswith("data:"):
+            return ""  # 空行或 ": OPENROUTER PROCESSING" 之类的注释
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        chunk = json.loads(data)
+        if "error" in chunk:
+            raise UpstreamError(f"OpenRouter API请求失败: {chunk['error']}", upstream="openrouter")
+        if usage is not None and chunk.get("usage"):
+            usage.update(chunk["usage"])
+        choices = chunk.get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content") or ""
+
+    @staticmethod
+    def _cached_body(content: str) -> Dict:
+        """将流式拼接出的完整文本包装成与非流式一致的缓存结构"""
+        return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+    # === 同步接口 ===
+    def chat_completion(self, payload: Dict, timeout: Optional[float] = None) -> Dict:
+        """发送一次 chat completion 请求（含重试与熔断），返回完整的响应 JSON"""
+        def attempt(remaining: float) -> Dict:
+            response = self._session.post(
+                f"{self.base_url}/chat/completions",
+                json=payload,
+                timeout=self._timeout(timeout, remaining)
+            )
+            self._raise_for_status(response.status_code, response.text, response.headers)
+            return response.json()
+
+        return self.policy.call(attempt)
+
+    def _fetch(self, payload: Dict, timeout: Optional[float], agent: Optional[str]) -> Dict:
+        """请求上游并记录耗时与 token 用量"""
+        started = time.perf_counter()
+        try:
+            body = self.chat_completion(payload, timeout=timeout)
+        finally:
+            self._observe_request(agent, started)
+        metrics.record_llm_call(agent, "upstream")
+        metrics.record_llm_usage(agent, payload["model"], body)
+        return body
+
+    @staticmethod
+    def _observe_request(agent: Optional[str], started: float):
+        agent_label, method = metrics.operation_labels(agent)
+        metrics.LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, agent=agent_label, method=method)
+
+    def complete(
+        self,
+        model: str,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        timeout: Optional[float] = None,
+        agent: Optional[str] = None,
+        use_cache: bool = True,
+        response_format: Optional[Dict] = None,
+    ) -> str:
+        """以单条用户消息调用模型，返回生成的文本
+
+        命中缓存时不请求上游；未命中时，相同请求的并发调用合并为一次上游请求。
+        use_cache=False 时既不读写缓存，也不与其他调用合并。
+        """
+        payload = self.build_payload(
+            model, [{"role": "user", "content": prompt}], temperature, max_tokens, response_format
+        )
+        if not use_cache:
+            return self._extract_content(self._fetch(payload, timeout, agent))
+
+        key = self.cache.make_key(payload)
+        ttl = self._cache_ttl(agent, use_cache)
+        body = self.cache.get(key) if ttl else None
+        if body is not None:
+            metrics.record_llm_call(agent, "cache")
+            return self._extract_content(body)
+
+        leader = []
+
+        def fetch() -> Dict:
+            leader.append(True)
+            fetched = self._fetch(payload, timeout, agent)
+            self.cache.set(key, fetched, ttl)
+            return fetched
+        body = self._inflight.do(key, fetch)
+        if not leader:
+            metrics.record_llm_call(agent, "coalesced")
+        return self._extract_content(body)
+
+    def stream_complete(
+        self,
+        model: str,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        timeout: Optional[float] = None,
+        agent: Optional[str] = None,
+        use_cache: bool = True,
+        response_format: Optional[Dict] = None,
+    ) -> Iterator[str]:
+        """以 stream: true 调用模型，逐段产出生成的文本"""
+        payload = self.build_payload(
+            model, [{"role": "user", "content": prompt}], temperature, max_tokens, response_format
+        )
+        ttl = self._cache_ttl(agent, use_cache)
+        key = self.cache.make_key(payload) if ttl else None
+        if key:
+            body = self.cache.get(key)
+            if body is not None:
+                metrics.record_llm_call(agent, "cache")
+                yield self._extract_content(body)
+                return
+
+        payload["stream"] = True
+        payload["usage"] = {"include": True}  # 让最后一个数据块带上 token 用量
+
+        def open_stream(remaining: float) -> requests.Response:
+            response = self._session.post(
+                f"{self.base_url}/chat/completions",
+                json=payload,
+                timeout=self._timeout(timeout, remaining),
+                stream=True
+            )
+            if response.status_code != 200:
+                text = response.text
+                response.close()
+                self._raise_for_status(response.status_code, text, response.headers)
+            return response
+
+        # 只对建立连接阶段重试；开始产出 token 后不再重放
+        parts, usage = [], {}
+        started = time.perf_counter()
+        try:
+            with self.policy.call(open_stream, hedge=False) as response:
+                for line in response.iter_lines(decode_unicode=True):
+                    delta = self._parse_stream_line(line or "", usage)
+                    if delta is None:
+                        break
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        finally:
+            self._observe_request(agent, started)
+        metrics.record_llm_call(agent, "upstream")
+        metrics.record_llm_usage(agent, payload["model"], {"usage": usage})
+
+        if key:
+            self.cache.set(key, self._cached_body("".join(parts)), ttl)
+
+    # === 异步接口 ===
+    async def achat_completion(self, payload: Dict, timeout: Optional[float] = None) -> Dict:
+        """chat_completion 的 asyncio 版本"""
+        client = self._async_client()
+
+        async def attempt(remaining: float) -> Dict:
+            response = await client.post(
+                "/chat/completions",
+                json=payload,
+                timeout=self._async_timeout(timeout, remaining)
+            )
+            self._raise_for_status(response.status_code, response.text, response.headers)
+            return response.json()
+
+        return await self.policy.acall(attempt)
+
+    async def _afetch(self, payload: Dict, timeout: Optional[float], agent: Optional[str]) -> Dict:
+        """_fetch 的 asyncio 版本"""
+        started = time.perf_counter()
+        try:
+            body = await self.achat_completion(payload, timeout=timeout)
+        finally:
+            self._observe_request(agent, started)
+        metrics.record_llm_call(agent, "upstream")
+        metrics.record_llm_usage(agent, payload["model"], body)
+        return body
+
+    async def acomplete(
+        self,
+        model: str,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        timeout: Optional[float] = None,
+        agent: Optional[str] = None,
+        use_cache: bool = True,
+        response_format: Optional[Dict] = None,
+    ) -> str:
+        """complete 的 asyncio 版本"""
+        payload = self.build_payload(
+            model, [{"role": "user", "content": prompt}], temperature, max_tokens, response_format
+        )
+        if not use_cache:
+            return self._extract_content(await self._afetch(payload, timeout, agent))
+
+        key = self.cache.make_key(payload)
+        ttl = self._cache_ttl(agent, use_cache)
+        body = self.cache.get(key) if ttl else None
+        if body is not None:
+            metrics.record_llm_call(agent, "cache")
+            return self._extract_content(body)
+
+        leader = []
+
+        async def fetch() -> Dict:
+            leader.append(True)
+            fetched = await self._afetch(payload, timeout, agent)
+            self.cache.set(key, fetched, ttl)
+            return fetched
+        body = await self._inflight.ado(key, fetch)
+        if not leader:
+            metrics.record_llm_call(agent, "coalesced")
+        return self._extract_content(body)
+
+    async def astream_complete(
+        self,
+        model: str,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        timeout: Optional[float] = None,
+        agent: Optional[str] = None,
+        use_cache: bool = True,
+        response_format: Optional[Dict] = None,
+    ) -> AsyncIterator[str]:
+        """stream_complete 的 asyncio 版本"""
+        payload = self.build_payload(
+            model, [{"role": "user", "content": prompt}], temperature, max_tokens, response_format
+        )
+        ttl = self._cache_ttl(agent, use_cache)
+        key = self.cache.make_key(payload) if ttl else None
+        if key:
+            body = self.cache.get(key)
+            if body is not None:
+                metrics.record_llm_call(agent, "cache")
+                yield self._extract_content(body)
+                return
+
+        payload["stream"] = True
+        payload["usage"] = {"include": True}  # 让最后一个数据块带上 token 用量
+        client = self._async_client()
+
+        async def open_stream(remaining: float) -> httpx.Response:
+            request = client.build_request(
+                "POST",
+                "/chat/completions",
+                json=payload,
+                timeout=self._async_timeout(timeout, remaining)
+            )
+            response = await client.send(request, stream=True)
+            if response.status_code != 200:
+                await response.aread()
+                await response.aclose()
+                self._raise_for_status(response.status_code, response.text, response.headers)
+            return response
+
+        # 只对建立连接阶段重试；开始产出 token 后不再重放
+        parts, usage = [], {}
+        started = time.perf_counter()
+        try:
+            response = await self.policy.acall(open_stream, hedge=False)
+            try:
+                async for line in response.aiter_lines():
+                    delta = self._parse_stream_line(line, usage)
+                    if delta is None:
+                        break
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            finally:
+                await response.aclose()
+        finally:
+            self._observe_request(agent, started)
+        metrics.record_llm_call(agent, "upstream")
+        metrics.record_llm_usage(agent, payload["model"], {"usage": usage})
+
+        if key:
+            self.cache.set(key, self._cached_body("".join(parts)), ttl)
+
+    def evict(
+        self,
+        model: str,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        response_format: Optional[Dict] = None,
+    ):
+        """删除某个请求的缓存结果（调用方发现缓存内容不可用时）"""
+        payload = self.build_payload(
+            model, [{"role": "user", "content": prompt}], temperature, max_tokens, response_format
+        )
+        self.cache.delete(self.cache.make_key(payload))
+
+    def close(self):
+        """关闭同步连接池"""
+        self._session.close()
+
+    async def aclose(self):
+        """关闭当前事件循环上的异步连接池"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+_clients: Dict[Tuple[str, str], LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(api_key: str, base_url: str = OPENROUTER_BASE_URL) -> LLMClient:
+    """获取进程内共享的 LLMClient（按 API Key 与地址复用）"""
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = LLMClient(api_key, base_url=base_url)
+                _clients[key] = client
+    return client
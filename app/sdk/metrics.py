@@ -0,0 +1,325 @@
+"""进程内指标：Agent 方法耗时、LLM token 用量、缓存命中、上游错误，以 Prometheus 文本格式导出
+
+Agent 的公开方法用 @instrument 装饰，调用期间的 agent/method 标签保存在 contextvar 中，
+LLMClient 与 UpstreamPolicy 在记录 token 和上游指标时读取它。
+多 worker 部署时每个进程各自统计，由 Prometheus 按实例抓取后聚合。
+"""
+
+import time
+import inspect
+import functools
+import threading
+import contextvars
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# 秒；覆盖从缓存命中（毫秒级）到长脚本生成（分钟级）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_current_operation: contextvars.ContextVar = contextvars.ContextVar("current_operation", default=None)
+
+
+def current_operation() -> Optional[Tuple[str, str]]:
+    """当前正在执行的 (agent, method)，不在任何被装饰方法内时为 None"""
+    return _current_operation.get()
+
+
+def operation_labels(agent: Optional[str] = None) -> Tuple[str, str]:
+    """返回用于打标签的 (agent, method)；缺少上下文时用传入的 agent 名兜底"""
+    operation = _current_operation.get()
+    if operation is not None:
+        return operation
+    return (agent or "unknown", "unknown")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+        return self.header() + "".join(line + "\n" for line in lines)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：[各桶计数..., sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0] * len(self.buckets) + [0.0, 0]
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[-1] if state else 0
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        lines = []
+        for key, state in items:
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), state[:-2] + [state[-1]]):
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return self.header() + "".join(line + "\n" for line in lines)
+
+
+class MetricsRegistry:
+    """按注册顺序导出的指标集合"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+
+registry = MetricsRegistry()
+
+# === Agent 方法 ===
+AGENT_CALL_SECONDS = registry.histogram(
+    "agent_call_duration_seconds", "Agent 方法端到端耗时（含上游调用与缓存）", ("agent", "method")
+)
+AGENT_CALL_ERRORS = registry.counter(
+    "agent_call_errors_total", "Agent 方法抛出的异常数", ("agent", "method", "error")
+)
+
+# === LLM ===
+LLM_REQUEST_SECONDS = registry.histogram(
+    "llm_request_duration_seconds", "实际发往 OpenRouter 的请求耗时", ("agent", "method")
+)
+LLM_CALLS = registry.counter(
+    "llm_calls_total", "LLM 调用次数；source=upstream/cache/coalesced", ("agent", "method", "source")
+)
+LLM_CACHE_HITS = registry.counter(
+    "llm_cache_hits_total", "LLM 响应缓存命中次数", ("agent", "method")
+)
+LLM_PROMPT_TOKENS = registry.counter(
+    "llm_prompt_tokens_total", "上游返回的 prompt token 数", ("agent", "method", "model")
+)
+LLM_COMPLETION_TOKENS = registry.counter(
+    "llm_completion_tokens_total", "上游返回的 completion token 数", ("agent", "method", "model")
+)
+
+# === 第三方上游 ===
+UPSTREAM_REQUEST_SECONDS = registry.histogram(
+    "upstream_request_duration_seconds", "单次上游请求（每次重试/对冲各计一次）耗时",
+    ("upstream", "agent", "method")
+)
+UPSTREAM_ERRORS = registry.counter(
+    "upstream_errors_total", "上游请求失败次数", ("upstream", "agent", "method", "error")
+)
+RATE_LIMIT_WAIT_SECONDS = registry.histogram(
+    "rate_limit_wait_seconds", "请求在本地令牌桶中排队的时间", ("upstream",)
+)
+UPSTREAM_CIRCUIT_OPEN = registry.gauge(
+    "upstream_circuit_open", "熔断器状态（0=closed，1=open/half_open）", ("upstream",)
+)
+
+
+def record_llm_usage(agent: Optional[str], model: str, body: Dict):
+    """从 completion 响应的 usage 字段累加 token 计数"""
+    usage = (body or {}).get("usage") or {}
+    if not usage:
+        return
+    agent_label, method = operation_labels(agent)
+    labels = {"agent": agent_label, "method": method, "model": model or "unknown"}
+    LLM_PROMPT_TOKENS.inc(usage.get("prompt_tokens") or 0, **labels)
+    LLM_COMPLETION_TOKENS.inc(usage.get("completion_tokens") or 0, **labels)
+
+
+def record_llm_call(agent: Optional[str], source: str):
+    agent_label, method = operation_labels(agent)
+    LLM_CALLS.inc(agent=agent_label, method=method, source=source)
+    if source == "cache":
+        LLM_CACHE_HITS.inc(agent=agent_label, method=method)
+
+
+def _error_name(error: BaseException) -> str:
+    status = getattr(error, "status_code", None)
+    return f"{type(error).__name__}:{status}" if status else type(error).__name__
+
+
+def instrument(func: Callable) -> Callable:
+    """装饰 Agent 的公开方法：记录耗时与异常，并在调用期间设置 agent/method 标签
+
+    支持普通函数、协程函数以及同步/异步生成器（流式接口按完整消费计时）。
+    """
+    method = func.__name__
+
+    def _start(self) -> Tuple[Tuple[str, str], float]:
+        return (type(self).__name__, method), time.perf_counter()
+
+    def _finish(operation, started, error: Optional[BaseException] = None):
+        agent, name = operation
+        AGENT_CALL_SECONDS.observe(time.perf_counter() - started, agent=agent, method=name)
+        if error is not None:
+            AGENT_CALL_ERRORS.inc(agent=agent, method=name, error=_error_name(error))
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def async_gen_wrapper(self, *args, **kwargs):
+            operation, started = _start(self)
+            agen = func(self, *args, **kwargs)
+            try:
+                while True:
+                    # 只在推进生成器时设置标签，避免泄漏到消费方的上下文
+                    token = _current_operation.set(operation)
+                    try:
+                        item = await agen.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        _current_operation.reset(token)
+                    yield item
+            except BaseException as e:
+                _finish(operation, started, e if isinstance(e, Exception) else None)
+                await agen.aclose()
+                raise
+            _finish(operation, started)
+        return async_gen_wrapper
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def gen_wrapper(self, *args, **kwargs):
+            operation, started = _start(self)
+            gen = func(self, *args, **kwargs)
+            try:
+                while True:
+                    token = _current_operation.set(operation)
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        break
+                    finally:
+                        _current_operation.reset(token)
+                    yield item
+            except BaseException as e:
+                _finish(operation, started, e if isinstance(e, Exception) else None)
+                gen.close()
+                raise
+            _finish(operation, started)
+        return gen_wrapper
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            operation, started = _start(self)
+            token = _current_operation.set(operation)
+            try:
+                result = await func(self, *args, **kwargs)
+            except Exception as e:
+                _finish(operation, started, e)
+                raise
+            finally:
+                _current_operation.reset(token)
+            _finish(operation, started)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        operation, started = _start(self)
+        token = _current_operation.set(operation)
+        try:
+            result = func(self, *args, **kwargs)
+        except Exception as e:
+            _finish(operation, started, e)
+            raise
+        finally:
+            _current_operation.reset(token)
+        _finish(operation, started)
+        return result
+    return wrapper
+
+
+def render_latest() -> str:
+    """导出所有指标的 Prometheus 文本格式"""
+    return registry.render()
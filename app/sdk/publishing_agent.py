@@ -1,10 +1,64 @@
 import os
-import requests
-from typing import Dict, Optional
+import json
+from typing import AsyncIterator, Dict, Optional
 from dotenv import load_dotenv
+from .llm_client import get_llm_client
+from .metrics import instrument
+from .structured_output import agenerate_structured, astream_structured, generate_structured
 
 load_dotenv()
 
+_STRINGS = {"type": "array", "items": {"type": "string"}}
+
+# SEO 元数据的输出结构；title 与 tags 位于最前，流式输出时最先可用
+SEO_METADATA_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string", "minLength": 1, "maxLength": 100},
+        "tags": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+        "alternative_titles": _STRINGS,
+        "title_notes": {"type": "string"},
+        "description": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string", "minLength": 1},
+                "key_points": _STRINGS,
+                "timestamps": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"time": {"type": "string"}, "label": {"type": "string"}},
+                        "required": ["time", "label"],
+                        "additionalProperties": False,
+                    },
+                },
+                "cta": {"type": "string"},
+            },
+            "required": ["summary", "key_points", "timestamps", "cta"],
+            "additionalProperties": False,
+        },
+        "related_tags": _STRINGS,
+        "trending_tags": _STRINGS,
+        "category": {
+            "type": "object",
+            "properties": {"primary": {"type": "string"}, "secondary": {"type": "string"}, "playlists": _STRINGS},
+            "required": ["primary", "secondary", "playlists"],
+            "additionalProperties": False,
+        },
+        "publishing": {
+            "type": "object",
+            "properties": {"best_time": {"type": "string"}, "promotion": _STRINGS, "engagement": _STRINGS},
+            "required": ["best_time", "promotion", "engagement"],
+            "additionalProperties": False,
+        },
+    },
+    "required": [
+        "title", "tags", "alternative_titles", "title_notes", "description",
+        "related_tags", "trending_tags", "category", "publishing",
+    ],
+    "additionalProperties": False,
+}
+
 class PublishingAgent:
     def __init__(self):
         self.OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -13,15 +67,10 @@ class PublishingAgent:
             raise ValueError("OPENROUTER_API_KEY or OPENROUTER_MODEL not found in .env file")
 
         self.base_url = "https://openrouter.ai/api/v1"
+        self.llm = get_llm_client(self.OPENROUTER_API_KEY, self.base_url)
 
-    def generate_seo_metadata(
-        self,
-        title: str,
-        description: str,
-        transcript: str,
-        category: str = "Education"
-    ) -> Dict[str, any]:
-        prompt = f"""
+    def _build_seo_prompt(self, title: str, description: str, transcript: str, category: str) -> str:
+        return f"""
 作为YouTube SEO专家，请为以下视频内容生成优化的元数据。
 
 【视频标题】
@@ -38,57 +87,61 @@ class PublishingAgent:
 
 请提供以下SEO优化建议：
 
-1. SEO标题建议：
-   - 主标题（考虑关键词）
-   - 3-5个备选标题
-   - 标题优化说明
-
-2. 描述文案：
-   - 首段重点内容
-   - 关键信息点
-   - 时间戳建议
-   - CTA设计
-
-3. 标签组合：
-   - 主要标签（5-7个）
-   - 相关标签（10-15个）
-   - 趋势标签建议
-
-4. 分类设置：
-   - 主分类建议
-   - 次分类建议
-   - 播放列表建议
-
-5. 发布优化：
-   - 最佳发布时间
-   - 首发推广建议
-   - 互动引导设计
-
-请以JSON格式输出，确保包含所有必要的元数据字段。
+1. SEO标题（title）：考虑关键词的主标题，不超过100个字符；3-5个备选标题（alternative_titles）与优化说明（title_notes）
+2. 标签组合：主要标签 tags（5-7个）、相关标签 related_tags（10-15个）、趋势标签 trending_tags
+3. 描述文案（description）：首段重点内容、关键信息点、时间戳建议、CTA设计
+4. 分类设置（category）：主分类、次分类、播放列表建议
+5. 发布优化（publishing）：最佳发布时间、首发推广建议、互动引导设计
 """
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.OPENROUTER_API_KEY}"
-        }
-
-        data = {
-            "model": self.OPENROUTER_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-        }
-
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=data
+    @instrument
+    def generate_seo_metadata(
+        self,
+        title: str,
+        description: str,
+        transcript: str,
+        category: str = "Education",
+        use_cache: bool = True
+    ) -> Dict[str, any]:
+        """返回符合 SEO_METADATA_SCHEMA 的元数据；模型输出不合格时带错误信息重试一次"""
+        prompt = self._build_seo_prompt(title, description, transcript, category)
+        return generate_structured(
+            self.llm, self.OPENROUTER_MODEL, prompt, SEO_METADATA_SCHEMA, "seo_metadata",
+            agent="PublishingAgent", use_cache=use_cache
         )
 
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API请求失败: {response.text}")
+    @instrument
+    async def agenerate_seo_metadata(
+        self,
+        title: str,
+        description: str,
+        transcript: str,
+        category: str = "Education",
+        use_cache: bool = True
+    ) -> Dict[str, any]:
+        """generate_seo_metadata 的 asyncio 版本"""
+        prompt = self._build_seo_prompt(title, description, transcript, category)
+        return await agenerate_structured(
+            self.llm, self.OPENROUTER_MODEL, prompt, SEO_METADATA_SCHEMA, "seo_metadata",
+            agent="PublishingAgent", use_cache=use_cache
+        )
 
-        return response.json()["choices"][0]["message"]["content"]
+    @instrument
+    async def astream_seo_metadata(
+        self,
+        title: str,
+        description: str,
+        transcript: str,
+        category: str = "Education",
+        use_cache: bool = True
+    ) -> AsyncIterator[Dict]:
+        """流式生成 SEO 元数据：标题、标签等字段完成即产出 field 事件，最后产出校验后的 result 事件"""
+        prompt = self._build_seo_prompt(title, description, transcript, category)
+        async for event in astream_structured(
+            self.llm, self.OPENROUTER_MODEL, prompt, SEO_METADATA_SCHEMA, "seo_metadata",
+            agent="PublishingAgent", use_cache=use_cache
+        ):
+            yield event
 
 # === 示例运行（调试/独立运行用）===
 if __name__ == "__main__":
@@ -100,4 +153,4 @@ if __name__ == "__main__":
         category="Business"
     )
     print("\n=== SEO元数据 ===\n")
-    print(metadata)
+    print(json.dumps(metadata, ensure_ascii=False, indent=2))
@@ -0,0 +1,141 @@
+"""按上游划分的令牌桶限流器，状态保存在 SQLite 中，多个 uvicorn worker 共享同一配额
+
+每次请求先预约一个令牌：桶内有余量则立即放行；否则按补充速率计算需要等待的时间，
+等待不超过 max_wait 时预约成功（令牌数允许为负，相当于排队），超过则直接拒绝，
+由调用方（UpstreamPolicy）转换为 RateLimitedError。
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from .executor import run_blocking
+
+load_dotenv()
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_DB = os.getenv(
+    "RATE_LIMIT_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "assets", "cache", "ratelimit.sqlite3"),
+)
+
+# rate: 每秒补充的令牌数；burst: 桶容量；max_wait: 最长排队秒数
+# 可用 RATE_LIMIT_<NAME>_<KEY> 环境变量覆盖
+RATE_LIMIT_DEFAULTS = {
+    "openrouter": {"rate": 5.0, "burst": 10.0, "max_wait": 30.0},
+    "serper": {"rate": 5.0, "burst": 5.0, "max_wait": 10.0},
+    "pexels": {"rate": 200 / 3600, "burst": 50.0, "max_wait": 30.0},  # 200 次/小时
+    "youtube": {"rate": 10000 / 86400, "burst": 100.0, "max_wait": 10.0},  # 每日 10000 配额单位
+}
+
+
+class TokenBucketStore:
+    """SQLite 中的令牌桶表；BEGIN IMMEDIATE 保证跨进程的读-改-写是原子的"""
+
+    def __init__(self, path: str = RATE_LIMIT_DB):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, name: str, rate: float, burst: float, max_wait: float, cost: float = 1.0) -> Optional[float]:
+        """预约 cost 个令牌，返回需要等待的秒数；超过 max_wait 时不扣减并返回 None"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            tokens -= cost
+            wait = 0.0 if tokens >= 0 else -tokens / rate
+            if wait > max_wait:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "INSERT INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (name, tokens, now)
+            )
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def snapshot(self) -> Dict[str, float]:
+        """各桶当前记录的令牌数（未按时间补充）"""
+        rows = self._connect().execute("SELECT name, tokens FROM buckets").fetchall()
+        return {name: tokens for name, tokens in rows}
+
+
+class RateLimiter:
+    """单个上游的令牌桶"""
+
+    def __init__(self, name: str, rate: float, burst: float, max_wait: float, store: TokenBucketStore):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.store = store
+
+    def _reserve(self, max_wait: Optional[float], cost: float) -> Optional[float]:
+        limit = self.max_wait if max_wait is None else min(self.max_wait, max_wait)
+        return self.store.reserve(self.name, self.rate, self.burst, limit, cost)
+
+    def acquire(self, max_wait: Optional[float] = None, cost: float = 1.0) -> Optional[float]:
+        """阻塞直到获得令牌，返回实际等待的秒数；排队时间将超过 max_wait 时立即返回 None"""
+        wait = self._reserve(max_wait, cost)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, max_wait: Optional[float] = None, cost: float = 1.0) -> Optional[float]:
+        """acquire 的 asyncio 版本；SQLite 读写放到线程池执行"""
+        wait = await run_blocking(self._reserve, max_wait, cost)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+_store: Optional[TokenBucketStore] = None
+_limiters: Dict[str, Optional[RateLimiter]] = {}
+_lock = threading.Lock()
+
+
+def _env_override(name: str, key: str, default: float) -> float:
+    return float(os.getenv(f"RATE_LIMIT_{name.upper()}_{key.upper()}", default))
+
+
+def get_rate_limiter(name: str) -> Optional[RateLimiter]:
+    """获取指定上游的限流器；未配置该上游或限流被关闭时返回 None"""
+    global _store
+    if name in _limiters:
+        return _limiters[name]
+    with _lock:
+        if name not in _limiters:
+            defaults = RATE_LIMIT_DEFAULTS.get(name)
+            limiter = None
+            if RATE_LIMIT_ENABLED and defaults is not None:
+                if _store is None:
+                    _store = TokenBucketStore()
+                limiter = RateLimiter(
+                    name, store=_store,
+                    **{key: _env_override(name, key, value) for key, value in defaults.items()}
+                )
+            _limiters[name] = limiter
+    return _limiters[name]
@@ -0,0 +1,62 @@
+"""Agent 注册表：每个进程只构建一次 Agent，配置变化时自动重建"""
+
+import os
+import threading
+from typing import Dict, List, Tuple, Type, TypeVar
+from dotenv import load_dotenv
+
+T = TypeVar("T")
+
+# Agent 构造时读取的环境变量；任一变化都会触发重建
+AGENT_ENV_KEYS = (
+    "OPENROUTER_API_KEY",
+    "OPENROUTER_MODEL",
+    "SERPER_API_KEY",
+    "PEXELS_API_KEY",
+)
+
+
+class AgentRegistry:
+    """按类缓存 Agent 实例，保留其连接池、缓存和已构建的 API 客户端"""
+
+    def __init__(self):
+        self._agents: Dict[type, Tuple[Tuple, object]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint() -> Tuple:
+        return tuple(os.getenv(key) for key in AGENT_ENV_KEYS)
+
+    def get(self, agent_cls: Type[T]) -> T:
+        """获取 Agent 实例，首次调用或配置变化时才构建"""
+        fingerprint = self._fingerprint()
+        entry = self._agents.get(agent_cls)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+
+        with self._lock:
+            entry = self._agents.get(agent_cls)
+            if entry is None or entry[0] != fingerprint:
+                entry = (fingerprint, agent_cls())
+                self._agents[agent_cls] = entry
+        return entry[1]
+
+    def reset(self) -> List[str]:
+        """丢弃所有已构建的 Agent，返回被丢弃的类名"""
+        with self._lock:
+            names = [cls.__name__ for cls in self._agents]
+            self._agents.clear()
+        return names
+
+    def reload(self) -> List[str]:
+        """重新读取 .env 并丢弃所有 Agent，下次请求时按新配置重建"""
+        load_dotenv(override=True)
+        return self.reset()
+
+
+registry = AgentRegistry()
+
+
+def get_agent(agent_cls: Type[T]) -> T:
+    """从全局注册表获取 Agent 实例"""
+    return registry.get(agent_cls)
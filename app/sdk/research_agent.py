@@ -1,11 +1,41 @@
 import requests
 import os
-from typing import List, Dict
-from datetime import datetime, timedelta
+import re
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from datetime import datetime
 from dotenv import load_dotenv
+from .llm_client import get_llm_client
+from .executor import run_blocking
+from .resilience import UpstreamError, get_policy, parse_retry_after
+from .metrics import instrument
+from .search_cache import get_search_cache
+from .search_merge import canonical_url, merge_results
+from .article_fetcher import get_article_fetcher
+from .corpus_index import get_corpus_index
 
 load_dotenv()
 
+NO_RESULTS_MESSAGE = "未找到相关内容。请尝试修改搜索关键词或放宽时间限制。"
+
+# mode="multi" 时的子查询扩展：角度后缀、实体拆分与多语言搜索
+RESEARCH_ANGLES = ["最新进展", "影响 分析", "数据 统计"]
+RESEARCH_LANGUAGES = [lang for lang in os.getenv("RESEARCH_LANGUAGES", "zh-cn,en").split(",") if lang]
+RESEARCH_MAX_QUERIES = int(os.getenv("RESEARCH_MAX_QUERIES", "6"))
+RESEARCH_CONCURRENCY = int(os.getenv("RESEARCH_CONCURRENCY", "6"))
+RESEARCH_MAX_ARTICLES = int(os.getenv("RESEARCH_MAX_ARTICLES", "10"))
+# 每篇原文放入 prompt 的最大字符数
+RESEARCH_EXCERPT_CHARS = int(os.getenv("RESEARCH_EXCERPT_CHARS", "1500"))
+
+# 本地语料中有足够多（MIN_HITS 个来源）覆盖主题（COVERAGE）的近期（MAX_AGE 秒内）证据时，跳过外部搜索
+RESEARCH_LOCAL_MIN_HITS = int(os.getenv("RESEARCH_LOCAL_MIN_HITS", "5"))
+RESEARCH_LOCAL_MIN_COVERAGE = float(os.getenv("RESEARCH_LOCAL_MIN_COVERAGE", "0.8"))
+RESEARCH_LOCAL_MAX_AGE = int(os.getenv("RESEARCH_LOCAL_MAX_AGE", str(3 * 86400)))
+# 只按标点和英文连接词拆分；“和/与”常出现在词语内部（如“和平”），不作为分隔符
+_ENTITY_SEPARATORS = re.compile(r"\s*(?:[、，,;；/|]|\s+(?:vs\.?|and|&)\s+)\s*", re.IGNORECASE)
+
 class ResearchAgent:
     def __init__(self):
         self.SERPER_API_KEY = os.getenv("SERPER_API_KEY")
@@ -18,22 +48,61 @@ class ResearchAgent:
             raise ValueError("OPENROUTER_API_KEY or OPENROUTER_MODEL not found in .env file")
 
         self.base_url = "https://openrouter.ai/api/v1"
+        self.llm = get_llm_client(self.OPENROUTER_API_KEY, self.base_url)
+        self.search_cache = get_search_cache()
+        self.article_fetcher = get_article_fetcher()
+        self.corpus_index = get_corpus_index()
 
-    def _get_date_range(self, months_back: int = 3) -> str:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30 * months_back)
+    @staticmethod
+    def _search_window(months_back: int) -> int:
+        """实际发给 Serper 的时间窗口（月）"""
         # 调整为更长的时间范围，例如12个月
         # 确保 months_back 至少为 12，以放宽时间限制
-        if months_back < 12: 
-            months_back = 12
-        return f"qdr:m{months_back}"  # 使用Google搜索的时间范围参数
+        return max(months_back, 12)
+
+    def _get_date_range(self, months_back: int = 3) -> str:
+        return f"qdr:m{self._search_window(months_back)}"  # 使用Google搜索的时间范围参数
 
     # === Step 1: 使用 Serper.dev 搜索观点与链接 ===
-    def search_articles(self, query: str, months_back: int, num_results: int = 5) -> List[Dict]:
-        url = "https://google.serper.dev/search"
-        
+    @instrument
+    def search_articles(
+        self,
+        query: str,
+        months_back: int,
+        num_results: int = 5,
+        use_cache: bool = True,
+        language: Optional[str] = None,
+    ) -> List[Dict]:
         # 添加时间限制到查询
         time_range = self._get_date_range(months_back)  # 使用传入的 months_back
+
+        def fetch() -> List[Dict]:
+            return self._fetch_articles(query, time_range, num_results, language)
+
+        try:
+            if use_cache:
+                valid_results = self.search_cache.get_or_fetch(
+                    query, time_range, num_results, fetch, language=language
+                )
+            else:
+                valid_results = fetch()
+
+            if not valid_results:
+                print("Warning: No valid search results found")
+                return []
+
+            return valid_results
+
+        except (requests.exceptions.RequestException, UpstreamError) as e:
+            print(f"Error during search request: {str(e)}")
+            return []
+        except Exception as e:
+            print(f"Unexpected error during search: {str(e)}")
+            return []
+
+    def _fetch_articles(self, query: str, time_range: str, num_results: int, language: Optional[str] = None) -> List[Dict]:
+        """请求 Serper 并筛选有效结果；请求失败时抛出异常，由调用方决定如何处理"""
+        url = "https://google.serper.dev/search"
         search_query = f"{query} when:{time_range}"
         
         headers = {
@@ -47,56 +116,292 @@ class ResearchAgent:
             # 移除地区和语言限制，以获取更广泛的搜索结果
             "tbs": time_range  # 时间范围参数
         }
+        if language:
+            params["hl"] = language
 
-        try:
-            response = requests.post(url, headers=headers, json=params)
-            response.raise_for_status()  # 检查请求是否成功
-            response_json = response.json()
-            
-            # 获取搜索结果
-            results = response_json.get("organic", [])
-            
-            # 筛选有效结果
-            valid_results = []
-            for result in results:
-                if ('title' in result and 'link' in result and 
-                    result['title'].strip() and result['link'].strip()):
-                    valid_results.append({
-                        'title': result['title'],
-                        'link': result['link'],
-                        'snippet': result.get('snippet', '')
-                    })
-                
-                if len(valid_results) >= num_results:
-                    break
+        def attempt(timeout: float) -> Dict:
+            response = requests.post(url, headers=headers, json=params, timeout=timeout)
+            if response.status_code != 200:
+                raise UpstreamError(
+                    f"Serper API请求失败: {response.status_code} {response.text}",
+                    upstream="serper",
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response.headers.get("Retry-After"))
+                )
+            return response.json()
+
+        response_json = get_policy("serper").call(attempt)
+        
+        # 获取搜索结果
+        results = response_json.get("organic", [])
+        
+        # 筛选有效结果
+        valid_results = []
+        for result in results:
+            if ('title' in result and 'link' in result and 
+                result['title'].strip() and result['link'].strip()):
+                valid_results.append({
+                    'title': result['title'],
+                    'link': result['link'],
+                    'snippet': result.get('snippet', '')
+                })
             
-            if not valid_results:
-                print("Warning: No valid search results found")
-                return []
-                
-            return valid_results
+            if len(valid_results) >= num_results:
+                break
+        
+        return valid_results
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error during search request: {str(e)}")
-            return []
-        except Exception as e:
-            print(f"Unexpected error during search: {str(e)}")
+    # === Step 1b: 多路子查询并发搜索 ===
+    def expand_queries(self, topic: str, max_queries: int = RESEARCH_MAX_QUERIES) -> List[Tuple[str, Optional[str]]]:
+        """把主题展开为 (子查询, 搜索语言) 列表：原始主题的多语言搜索、拆分出的实体和不同分析角度"""
+        topic = " ".join(topic.split())
+        queries: List[Tuple[str, Optional[str]]] = [(topic, lang) for lang in RESEARCH_LANGUAGES] or [(topic, None)]
+
+        entities = [part for part in _ENTITY_SEPARATORS.split(topic) if part and part != topic]
+        if len(entities) > 1:
+            queries += [(entity, None) for entity in entities]
+        queries += [(f"{topic} {angle}", None) for angle in RESEARCH_ANGLES]
+
+        seen, unique = set(), []
+        for query in queries:
+            if query not in seen:
+                seen.add(query)
+                unique.append(query)
+        return unique[:max_queries]
+
+    @instrument
+    def search_multi(
+        self,
+        topic: str,
+        months_back: int,
+        num_results: int = 5,
+        use_cache: bool = True,
+        max_articles: int = RESEARCH_MAX_ARTICLES,
+    ) -> List[Dict]:
+        """并发执行所有子查询，按规范化 URL 与近似重复摘要去重后排序"""
+        sub_queries = self.expand_queries(topic)
+        # 独立的短生命周期线程池，避免在共享线程池的工作线程中再向其提交任务导致死锁
+        with ThreadPoolExecutor(max_workers=min(RESEARCH_CONCURRENCY, len(sub_queries))) as pool:
+            result_lists = list(pool.map(
+                lambda sub: self.search_articles(sub[0], months_back, num_results, use_cache, language=sub[1]),
+                sub_queries
+            ))
+        return merge_results(result_lists, limit=max_articles)
+
+    @instrument
+    async def asearch_multi(
+        self,
+        topic: str,
+        months_back: int,
+        num_results: int = 5,
+        use_cache: bool = True,
+        max_articles: int = RESEARCH_MAX_ARTICLES,
+    ) -> List[Dict]:
+        """search_multi 的 asyncio 版本"""
+        semaphore = asyncio.Semaphore(RESEARCH_CONCURRENCY)
+
+        async def search(sub: Tuple[str, Optional[str]]) -> List[Dict]:
+            async with semaphore:
+                return await self.asearch_articles(sub[0], months_back, num_results, use_cache, language=sub[1])
+
+        result_lists = await asyncio.gather(*(search(sub) for sub in self.expand_queries(topic)))
+        return merge_results(list(result_lists), limit=max_articles)
+
+    def _collect_articles(self, topic: str, time_range: int, use_cache: bool, mode: str) -> List[Dict]:
+        if mode == "multi":
+            return self.search_multi(topic, months_back=time_range, use_cache=use_cache)
+        return self.search_articles(query=topic, months_back=time_range, use_cache=use_cache)
+
+    async def _acollect_articles(self, topic: str, time_range: int, use_cache: bool, mode: str) -> List[Dict]:
+        if mode == "multi":
+            return await self.asearch_multi(topic, months_back=time_range, use_cache=use_cache)
+        return await self.asearch_articles(query=topic, months_back=time_range, use_cache=use_cache)
+
+    # === Step 1c: 抓取搜索结果原文 ===
+    def _attach_content(self, articles: List[Dict], documents: Dict[str, Dict]) -> List[Dict]:
+        enriched = []
+        for article in articles:
+            doc = documents.get(article["link"])
+            if doc is not None:
+                article = {**article, "content": doc["text"][:RESEARCH_EXCERPT_CHARS]}
+            enriched.append(article)
+        return enriched
+
+    @instrument
+    def fetch_article_contents(self, articles: List[Dict], window_months: Optional[int] = None) -> List[Dict]:
+        """为搜索结果附加抽取出的原文（content 字段）；抓取失败或内容重复的条目保持原样
+
+        window_months 为这些搜索结果的搜索时间窗口（月），随原文一起写入本地索引。
+        """
+        if not articles:
+            return articles
+        documents = self.article_fetcher.fetch_documents([a["link"] for a in articles])
+        self._index_documents(documents, window_months)
+        return self._attach_content(articles, documents)
+
+    @instrument
+    async def afetch_article_contents(self, articles: List[Dict], window_months: Optional[int] = None) -> List[Dict]:
+        """fetch_article_contents 的 asyncio 版本"""
+        if not articles:
+            return articles
+        documents = await self.article_fetcher.afetch_documents([a["link"] for a in articles])
+        await run_blocking(self._index_documents, documents, window_months)
+        return self._attach_content(articles, documents)
+
+    # === Step 0: 本地语料索引 ===
+    def _index_documents(self, documents: Dict[str, Dict], window_months: Optional[int] = None):
+        self.corpus_index.add_many(
+            {"doc_key": f"article:{canonical_url(url)}", "text": doc["text"], "kind": "article",
+             "title": doc.get("title", ""), "url": url, "window_months": window_months}
+            for url, doc in documents.items()
+        )
+
+    def _index_snippets(self, articles: List[Dict], window_months: Optional[int] = None):
+        """window_months 为得到这些结果的搜索时间窗口（月），复用本地证据时据此判断时效"""
+        self.corpus_index.add_many(
+            {"doc_key": f"snippet:{canonical_url(a['link'])}", "text": a.get("snippet", ""), "kind": "snippet",
+             "title": a["title"], "url": a["link"], "window_months": window_months}
+            for a in articles
+        )
+
+    def _index_report(self, topic: str, report: str):
+        key = hashlib.sha256(f"{topic}\n{report}".encode("utf-8")).hexdigest()
+        self.corpus_index.add(f"report:{key}", report, "report", title=topic)
+
+    @instrument
+    def search_local(self, query: str, k: int = 10, kinds: Optional[List[str]] = None, max_age: Optional[float] = None) -> List[Dict]:
+        """在本地语料索引中做 BM25 查询"""
+        return self.corpus_index.search(query, k=k, kinds=kinds, max_age=max_age)
+
+    def _local_evidence(self, topic: str, time_range: int) -> List[Dict]:
+        """本地已有足够的近期证据时，直接组装成与搜索结果相同结构的文章列表；否则返回空列表
+
+        added_at 只是收录时间而不是发布时间，因此只复用搜索时间窗口不超过 time_range（月）的文档；
+        窗口更宽的搜索得到的结果可能早于请求的时间范围。
+        """
+        hits = self.corpus_index.search(
+            topic, k=RESEARCH_MAX_ARTICLES * 2, kinds=("snippet", "article"),
+            max_age=RESEARCH_LOCAL_MAX_AGE, max_window=time_range
+        )
+        by_url: Dict[str, Dict] = {}
+        for hit in hits:
+            if hit["coverage"] < RESEARCH_LOCAL_MIN_COVERAGE or not hit["url"]:
+                continue
+            # 同一来源的摘要与原文合并为一条
+            article = by_url.setdefault(canonical_url(hit["url"]), {"title": hit["title"], "link": hit["url"], "snippet": ""})
+            if hit["kind"] == "article":
+                article["content"] = hit["text"][:RESEARCH_EXCERPT_CHARS]
+            else:
+                article["snippet"] = hit["text"]
+        if len(by_url) < RESEARCH_LOCAL_MIN_HITS:
             return []
+        print(f"使用本地语料中的 {len(by_url)} 个来源，跳过外部搜索")
+        return list(by_url.values())[:RESEARCH_MAX_ARTICLES]
+
+    def _gather_evidence(self, topic: str, time_range: int, use_cache: bool, mode: str, fetch_content: bool) -> List[Dict]:
+        """本地语料优先；不足时外部搜索（并抓取原文），新结果写回索引。use_cache=False 时总是外部搜索"""
+        articles = self._local_evidence(topic, time_range) if use_cache else []
+        if articles:
+            return articles
+        articles = self._collect_articles(topic, time_range, use_cache, mode)
+        if articles:
+            window = self._search_window(time_range)
+            self._index_snippets(articles, window)
+            if fetch_content:
+                articles = self.fetch_article_contents(articles, window)
+        return articles
+
+    async def _agather_evidence(self, topic: str, time_range: int, use_cache: bool, mode: str, fetch_content: bool) -> List[Dict]:
+        articles = await run_blocking(self._local_evidence, topic, time_range) if use_cache else []
+        if articles:
+            return articles
+        articles = await self._acollect_articles(topic, time_range, use_cache, mode)
+        if articles:
+            window = self._search_window(time_range)
+            await run_blocking(self._index_snippets, articles, window)
+            if fetch_content:
+                articles = await self.afetch_article_contents(articles, window)
+        return articles
 
     # === Step 2: 使用 OpenRouter 总结观点与数据 ===
-    def generate_research_report(self, topic: str, source: str, time_range: int) -> str:
-        # 根据 source 选择不同的搜索方式，这里简化处理，只用 search_articles
-        # 实际应用中可以根据 source 调用不同的搜索方法
-        articles = self.search_articles(query=topic, months_back=time_range)
+    @instrument
+    def generate_research_report(self, topic: str, source: str, time_range: int, use_cache: bool = True, mode: str = "single", fetch_content: bool = True) -> str:
+        # 根据 source 选择不同的搜索方式，这里简化处理，只用 Serper 搜索
+        # mode="multi" 时展开为多个子查询并发搜索，合并去重后再生成报告
+        articles = self._gather_evidence(topic, time_range, use_cache, mode, fetch_content)
         if not articles:
-            return "未找到相关内容。请尝试修改搜索关键词或放宽时间限制。"
+            return NO_RESULTS_MESSAGE
+
+        prompt = self._build_report_prompt(topic, articles)
+        try:
+            report = self.llm.complete(
+                self.OPENROUTER_MODEL, prompt, agent="ResearchAgent", use_cache=use_cache
+            )
+            self._index_report(topic, report)
+            return report
+        except Exception as e:
+            print(f"Error generating research report: {str(e)}")
+            return f"生成研究报告时出错: {str(e)}"
+
+    @instrument
+    async def asearch_articles(
+        self,
+        query: str,
+        months_back: int,
+        num_results: int = 5,
+        use_cache: bool = True,
+        language: Optional[str] = None,
+    ) -> List[Dict]:
+        """search_articles 的 asyncio 包装：同步实现放到共享线程池中执行，不阻塞事件循环
+
+        Serper 请求仍走 requests + 线程池，而不是 httpx.AsyncClient：搜索缓存的后台刷新与
+        SingleFlight 去重都基于线程，原生异步实现需要另一套缓存协调逻辑。
+        """
+        return await run_blocking(self.search_articles, query, months_back, num_results, use_cache, language)
 
+    @instrument
+    async def agenerate_research_report(self, topic: str, source: str, time_range: int, use_cache: bool = True, mode: str = "single", fetch_content: bool = True) -> str:
+        """generate_research_report 的 asyncio 版本"""
+        articles = await self._agather_evidence(topic, time_range, use_cache, mode, fetch_content)
+        if not articles:
+            return NO_RESULTS_MESSAGE
+
+        prompt = self._build_report_prompt(topic, articles)
+        try:
+            report = await self.llm.acomplete(
+                self.OPENROUTER_MODEL, prompt, agent="ResearchAgent", use_cache=use_cache
+            )
+            await run_blocking(self._index_report, topic, report)
+            return report
+        except Exception as e:
+            print(f"Error generating research report: {str(e)}")
+            return f"生成研究报告时出错: {str(e)}"
+
+    @instrument
+    async def astream_research_report(self, topic: str, source: str, time_range: int, use_cache: bool = True, mode: str = "single", fetch_content: bool = True) -> AsyncIterator[str]:
+        """流式生成研究报告：先完成搜索，再逐段产出报告文本"""
+        articles = await self._agather_evidence(topic, time_range, use_cache, mode, fetch_content)
+        if not articles:
+            yield NO_RESULTS_MESSAGE
+            return
+
+        prompt = self._build_report_prompt(topic, articles)
+        parts = []
+        async for delta in self.llm.astream_complete(
+            self.OPENROUTER_MODEL, prompt, agent="ResearchAgent", use_cache=use_cache
+        ):
+            parts.append(delta)
+            yield delta
+        await run_blocking(self._index_report, topic, "".join(parts))
+
+    def _build_report_prompt(self, topic: str, articles: List[Dict]) -> str:
         articles_text = "\n\n".join([
             f"标题: {a['title']}\n链接: {a['link']}\n摘要: {a.get('snippet', '无摘要')}"
+            + (f"\n正文摘录: {a['content']}" if a.get('content') else "")
             for a in articles
         ])
 
-        prompt = f"""
+        return f"""
 你是一名专业的研究分析师，负责为 YouTube 频道生成深度研究报告。请基于以下搜索结果进行分析：
 
 搜索主题：{topic}
@@ -128,31 +433,6 @@ class ResearchAgent:
 请使用 Markdown 格式输出，确保内容客观、专业，并注明信息的时效性。
 """
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.OPENROUTER_API_KEY}"
-        }
-
-        data = {
-            "model": self.OPENROUTER_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-        }
-
-        try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=data
-            )
-            response.raise_for_status()
-            
-            return response.json()["choices"][0]["message"]["content"]
-        except Exception as e:
-            print(f"Error generating research report: {str(e)}")
-            return f"生成研究报告时出错: {str(e)}"
-
 # === 主流程（调试/独立运行用）===
 if __name__ == "__main__":
     import traceback
@@ -0,0 +1,476 @@
+"""上游调用的容错层：截止时间、带抖动的指数退避重试、熔断器和对冲请求
+
+所有 LLM 与第三方调用（OpenRouter、Serper、Pexels API 与 CDN、YouTube）都通过
+get_policy(<上游名>) 获取对应的 UpstreamPolicy 执行。
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from dotenv import load_dotenv
+from . import metrics
+from .rate_limit import RateLimiter, get_rate_limiter
+from .executor import run_blocking
+
+load_dotenv()
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# 各上游的默认策略，可用 UPSTREAM_<NAME>_<KEY> 环境变量覆盖
+UPSTREAM_DEFAULTS = {
+    "openrouter": {"deadline": 180.0, "max_attempts": 3, "hedge": False},
+    "serper": {"deadline": 20.0, "max_attempts": 3, "hedge": False},
+    "pexels": {"deadline": 20.0, "max_attempts": 3, "hedge": True},
+    # Pexels CDN 上的视频/图片文件：与 API 分开熔断和统计延迟；文件较大，不对冲以免重复下载
+    "pexels_cdn": {"deadline": 120.0, "max_attempts": 3, "hedge": False},
+    "youtube": {"deadline": 30.0, "max_attempts": 3, "hedge": False},
+}
+
+
+class UpstreamError(Exception):
+    """上游返回错误响应或不可用"""
+
+    def __init__(self, message: str, upstream: str = "", status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.upstream = upstream
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamError):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+
+class DeadlineExceededError(UpstreamError):
+    """在截止时间内未能得到结果"""
+
+
+class RateLimitedError(UpstreamError):
+    """本地令牌桶排队时间超过上限，请求未发出"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+# 按类名识别各 HTTP 客户端的超时与连接错误（含子类），避免在此处依赖具体的库
+RETRYABLE_ERROR_NAMES = {
+    "ConnectionError", "TimeoutError", "ChunkedEncodingError", "Timeout",  # 内置 / requests
+    "TransportError", "TimeoutException",  # httpx
+}
+
+
+def _status_of(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        # requests.HTTPError 把状态码放在 response.status_code
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        # googleapiclient.errors.HttpError 把状态码放在 resp.status
+        status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """429/5xx、超时和连接错误可以重试，其余错误直接抛出"""
+    if isinstance(error, (CircuitOpenError, DeadlineExceededError, RateLimitedError)):
+        return False
+    status = _status_of(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开，冷却期后放行一个探测请求（half-open）"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[bool]:
+        """放行时返回是否为探测请求（half-open 下唯一放行的那一个），拒绝时返回 None"""
+        with self._lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                return True
+            return None  # 仍在冷却期，或探测请求尚未返回
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def is_open(self) -> bool:
+        """只读的状态检查，不会像 allow() 那样把 open 转为 half_open"""
+        return self.state == "open"
+
+    def release_probe(self):
+        """探测请求未产生结果（被限流拒绝、被取消）就退出时归还探测名额
+
+        冷却期已过，下一个请求可以立即重新探测；已记录成功或失败时状态不是 half_open，不受影响。
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """记录最近的成功请求耗时，用于计算对冲阈值"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class UpstreamPolicy:
+    """单个上游的容错策略
+
+    被调用的函数接收本次尝试可用的超时秒数，应在非 2xx 响应时抛出 UpstreamError。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        deadline: float = 30.0,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        self.name = name
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyTracker()
+        self.limiter = limiter
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        """capped exponential backoff + full jitter；429 时优先遵循 Retry-After"""
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _hedge_delay(self, hedge: bool) -> Optional[float]:
+        if not (self.hedge and hedge) or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_quantile)
+
+    def _check_circuit(self) -> bool:
+        """熔断时抛出 CircuitOpenError；放行时返回本次调用是否持有 half-open 探测名额"""
+        probe = self.breaker.acquire()
+        if probe is None:
+            self._observe(None, "CircuitOpenError")
+            raise CircuitOpenError(f"{self.name} 熔断中，暂时拒绝请求", upstream=self.name)
+        return probe
+
+    def _observe(self, seconds: Optional[float], error: Optional[str] = None):
+        """记录单次尝试的耗时或错误，并同步熔断器状态"""
+        agent, method = metrics.operation_labels()
+        if seconds is not None:
+            metrics.UPSTREAM_REQUEST_SECONDS.observe(seconds, upstream=self.name, agent=agent, method=method)
+        if error is not None:
+            metrics.UPSTREAM_ERRORS.inc(upstream=self.name, agent=agent, method=method, error=error)
+        metrics.UPSTREAM_CIRCUIT_OPEN.set(0 if self.breaker.state == "closed" else 1, upstream=self.name)
+
+    def _rate_limited(self, wait: float) -> RateLimitedError:
+        self._observe(None, "RateLimitedError")
+        return RateLimitedError(
+            f"{self.name} 超出限流配额，排队时间将超过 {wait:.1f}s", upstream=self.name
+        )
+
+    def _throttle(self, remaining: float, limit: bool):
+        """按令牌桶放行；排队时间计入截止时间"""
+        if not (limit and self.limiter):
+            return
+        waited = self.limiter.acquire(max_wait=remaining)
+        if waited is None:
+            raise self._rate_limited(min(remaining, self.limiter.max_wait))
+        if waited:
+            metrics.RATE_LIMIT_WAIT_SECONDS.observe(waited, upstream=self.name)
+
+    async def _athrottle(self, remaining: float, limit: bool):
+        if not (limit and self.limiter):
+            return
+        waited = await self.limiter.aacquire(max_wait=remaining)
+        if waited is None:
+            raise self._rate_limited(min(remaining, self.limiter.max_wait))
+        if waited:
+            metrics.RATE_LIMIT_WAIT_SECONDS.observe(waited, upstream=self.name)
+
+    def _hedge_allowed(self, limit: bool) -> bool:
+        """对冲副本同样消耗配额，但不排队：没有空闲令牌就放弃对冲"""
+        return not (limit and self.limiter) or self.limiter.acquire(max_wait=0) is not None
+
+    @staticmethod
+    def _error_label(error: BaseException) -> str:
+        status = _status_of(error)
+        return str(status) if status is not None else type(error).__name__
+
+    # === 同步接口 ===
+    def call(
+        self,
+        func: Callable[[float], T],
+        deadline: Optional[float] = None,
+        hedge: bool = True,
+        limit: bool = True,
+    ) -> T:
+        """按策略执行 func(timeout)，返回其结果
+
+        limit=False 时不经过令牌桶（如不计入 API 配额的 CDN 下载）。
+        """
+        probe = self._check_circuit()
+        try:
+            return self._call(func, deadline, hedge, limit)
+        finally:
+            if probe:
+                self.breaker.release_probe()
+
+    def _record_non_retryable(self, error: BaseException):
+        """不可重试的错误：只有上游返回了 4xx 才说明服务可达，记为成功
+
+        本地错误（响应体解析失败、SSL 错误等）不能说明上游状态，不计入熔断器；
+        探测请求因此没有结果时，由 call/acall 归还探测名额。
+        """
+        status = _status_of(error)
+        if status is not None and 400 <= status < 500:
+            self.breaker.record_success()
+
+    def _call(self, func: Callable[[float], T], deadline: Optional[float], hedge: bool, limit: bool) -> T:
+        end = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceededError(f"{self.name} 请求超过截止时间", upstream=self.name)
+            self._throttle(remaining, limit)
+            remaining = end - time.monotonic()
+            started = time.monotonic()
+            try:
+                result = self._attempt(func, remaining, self._hedge_delay(hedge), limit)
+            except DeadlineExceededError:
+                self.breaker.record_failure()
+                self._observe(time.monotonic() - started, "DeadlineExceededError")
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    self._record_non_retryable(e)
+                    self._observe(time.monotonic() - started, self._error_label(e))
+                    raise
+                self.breaker.record_failure()
+                self._observe(time.monotonic() - started, self._error_label(e))
+                attempt += 1
+                if attempt >= self.max_attempts or self.breaker.is_open():
+                    raise
+                delay = self._backoff(attempt, e)
+                if time.monotonic() + delay >= end:
+                    raise
+                print(f"[{self.name}] 第{attempt}次请求失败，{delay:.2f}s 后重试: {e}")
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self.latency.add(time.monotonic() - started)
+            self._observe(time.monotonic() - started)
+            return result
+
+    def _attempt(self, func: Callable[[float], T], timeout: float, hedge_delay: Optional[float], limit: bool) -> T:
+        if hedge_delay is None or hedge_delay >= timeout:
+            return func(timeout)
+
+        # 对冲：首个请求超过 p95 仍未返回时再发一个副本，取先完成的结果
+        # 副本在线程池中执行，带上当前上下文以保留指标标签
+        executor = _hedge_executor()
+        futures = {executor.submit(contextvars.copy_context().run, func, timeout)}
+        done, _ = wait(futures, timeout=hedge_delay)
+        if not done and self._hedge_allowed(limit):
+            futures.add(executor.submit(contextvars.copy_context().run, func, timeout - hedge_delay))
+        pending = futures
+        while pending:
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceededError(f"{self.name} 请求超时", upstream=self.name)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        # 所有副本都失败，抛出其中一个异常
+        return done.pop().result()
+
+    # === 异步接口 ===
+    async def acall(
+        self,
+        func: Callable[[float], Awaitable[T]],
+        deadline: Optional[float] = None,
+        hedge: bool = True,
+        limit: bool = True,
+    ) -> T:
+        """call 的 asyncio 版本"""
+        probe = self._check_circuit()
+        try:
+            return await self._acall(func, deadline, hedge, limit)
+        finally:
+            if probe:
+                self.breaker.release_probe()
+
+    async def _acall(
+        self, func: Callable[[float], Awaitable[T]], deadline: Optional[float], hedge: bool, limit: bool
+    ) -> T:
+        loop = asyncio.get_running_loop()
+        end = loop.time() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                raise DeadlineExceededError(f"{self.name} 请求超过截止时间", upstream=self.name)
+            await self._athrottle(remaining, limit)
+            remaining = end - loop.time()
+            started = loop.time()
+            try:
+                result = await asyncio.wait_for(
+                    self._aattempt(func, remaining, self._hedge_delay(hedge), limit), remaining
+                )
+            except asyncio.TimeoutError as e:
+                error = DeadlineExceededError(f"{self.name} 请求超时", upstream=self.name)
+                self.breaker.record_failure()
+                self._observe(loop.time() - started, "DeadlineExceededError")
+                raise error from e
+            except Exception as e:
+                if not is_retryable(e):
+                    self._record_non_retryable(e)
+                    self._observe(loop.time() - started, self._error_label(e))
+                    raise
+                self.breaker.record_failure()
+                self._observe(loop.time() - started, self._error_label(e))
+                attempt += 1
+                if attempt >= self.max_attempts or self.breaker.is_open():
+                    raise
+                delay = self._backoff(attempt, e)
+                if loop.time() + delay >= end:
+                    raise
+                print(f"[{self.name}] 第{attempt}次请求失败，{delay:.2f}s 后重试: {e}")
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self.latency.add(loop.time() - started)
+            self._observe(loop.time() - started)
+            return result
+
+    async def _aattempt(
+        self, func: Callable[[float], Awaitable[T]], timeout: float, hedge_delay: Optional[float], limit: bool
+    ) -> T:
+        if hedge_delay is None or hedge_delay >= timeout:
+            return await func(timeout)
+
+        tasks = {asyncio.ensure_future(func(timeout))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done and await run_blocking(self._hedge_allowed, limit):
+                tasks.add(asyncio.ensure_future(func(timeout - hedge_delay)))
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # 所有副本都失败，抛出其中一个异常
+            return done.pop().result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_policies: Dict[str, UpstreamPolicy] = {}
+_lock = threading.Lock()
+
+
+def _hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("UPSTREAM_HEDGE_POOL_SIZE", "16")),
+                    thread_name_prefix="hedge"
+                )
+    return _hedge_pool
+
+
+def _env_override(name: str, key: str, default):
+    value = os.getenv(f"UPSTREAM_{name.upper()}_{key.upper()}")
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes")
+    return type(default)(value)
+
+
+def get_policy(name: str) -> UpstreamPolicy:
+    """获取指定上游的共享容错策略（熔断状态与延迟统计在进程内共享）"""
+    policy = _policies.get(name)
+    if policy is None:
+        with _lock:
+            policy = _policies.get(name)
+            if policy is None:
+                defaults = UPSTREAM_DEFAULTS.get(name, {"deadline": 30.0, "max_attempts": 3, "hedge": False})
+                policy = UpstreamPolicy(
+                    name,
+                    limiter=get_rate_limiter(name),
+                    **{key: _env_override(name, key, value) for key, value in defaults.items()}
+                )
+                _policies[name] = policy
+    return policy
@@ -1,6 +1,8 @@
 import os
-import requests
+from typing import AsyncIterator, Tuple
 from dotenv import load_dotenv
+from .llm_client import get_llm_client
+from .metrics import instrument
 
 load_dotenv()
 
@@ -12,9 +14,10 @@ class ReviewerAgent:
             raise ValueError("OPENROUTER_API_KEY or OPENROUTER_MODEL not found in .env file")
 
         self.base_url = "https://openrouter.ai/api/v1"
+        self.llm = get_llm_client(self.OPENROUTER_API_KEY, self.base_url)
 
-    def review_script(self, script_text: str, style: str = "政经理性") -> str:
-        prompt = f"""
+    def _build_review_prompt(self, script_text: str, style: str) -> str:
+        return f"""
 你是一名政经类内容的专业审稿员。请对以下脚本进行内容审查，并输出以下维度：
 
 1. 逻辑合理性：是否存在跳跃推理或因果混乱；
@@ -27,31 +30,8 @@ class ReviewerAgent:
 {script_text}
 """
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.OPENROUTER_API_KEY}"
-        }
-
-        data = {
-            "model": self.OPENROUTER_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-        }
-
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=data
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API请求失败: {response.text}")
-
-        return response.json()["choices"][0]["message"]["content"].strip()
-
-    def rewrite_script(self, script_text: str, review_summary: str, style: str = "政经理性") -> str:
-        prompt = f"""
+    def _build_rewrite_prompt(self, script_text: str, review_summary: str, style: str) -> str:
+        return f"""
 你是一位政经类YouTube频道的AI编剧。请根据以下【脚本草稿】和【审稿建议】对内容进行改写，使其更可信、理性、风格统一。
 
 要求：
@@ -69,36 +49,70 @@ class ReviewerAgent:
 请输出改写后的完整脚本。
 """
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.OPENROUTER_API_KEY}"
-        }
-
-        data = {
-            "model": self.OPENROUTER_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-        }
-
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=data
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API请求失败: {response.text}")
-
-        return response.json()["choices"][0]["message"]["content"].strip()
-
-    def revise_script_workflow(self, script_text: str, style: str = "政经理性") -> str:
+    @instrument
+    def review_script(self, script_text: str, style: str = "政经理性", use_cache: bool = True) -> str:
+        prompt = self._build_review_prompt(script_text, style)
+        return self.llm.complete(
+            self.OPENROUTER_MODEL, prompt, agent="ReviewerAgent", use_cache=use_cache
+        ).strip()
+
+    @instrument
+    def rewrite_script(self, script_text: str, review_summary: str, style: str = "政经理性", use_cache: bool = True) -> str:
+        prompt = self._build_rewrite_prompt(script_text, review_summary, style)
+        return self.llm.complete(
+            self.OPENROUTER_MODEL, prompt, agent="ReviewerAgent", use_cache=use_cache
+        ).strip()
+
+    @instrument
+    def revise_script_workflow(self, script_text: str, style: str = "政经理性", use_cache: bool = True) -> str:
         print("🕵️ 正在审稿...")
-        review = self.review_script(script_text, style)
+        review = self.review_script(script_text, style, use_cache=use_cache)
         print("✍️ 正在改写...")
-        revised = self.rewrite_script(script_text, review, style)
+        revised = self.rewrite_script(script_text, review, style, use_cache=use_cache)
         return revised
 
+    @instrument
+    async def areview_script(self, script_text: str, style: str = "政经理性", use_cache: bool = True) -> str:
+        """review_script 的 asyncio 版本"""
+        prompt = self._build_review_prompt(script_text, style)
+        content = await self.llm.acomplete(
+            self.OPENROUTER_MODEL, prompt, agent="ReviewerAgent", use_cache=use_cache
+        )
+        return content.strip()
+
+    @instrument
+    async def arewrite_script(self, script_text: str, review_summary: str, style: str = "政经理性", use_cache: bool = True) -> str:
+        """rewrite_script 的 asyncio 版本"""
+        prompt = self._build_rewrite_prompt(script_text, review_summary, style)
+        content = await self.llm.acomplete(
+            self.OPENROUTER_MODEL, prompt, agent="ReviewerAgent", use_cache=use_cache
+        )
+        return content.strip()
+
+    @instrument
+    async def arevise_script_workflow(self, script_text: str, style: str = "政经理性", use_cache: bool = True) -> str:
+        """revise_script_workflow 的 asyncio 版本"""
+        review = await self.areview_script(script_text, style, use_cache=use_cache)
+        return await self.arewrite_script(script_text, review, style, use_cache=use_cache)
+
+    @instrument
+    async def astream_revise_workflow(self, script_text: str, style: str = "政经理性", use_cache: bool = True) -> AsyncIterator[Tuple[str, str]]:
+        """流式审稿并改写，逐段产出 (阶段, 文本)，阶段为 review 或 rewrite"""
+        review_parts = []
+        async for delta in self.llm.astream_complete(
+            self.OPENROUTER_MODEL, self._build_review_prompt(script_text, style),
+            agent="ReviewerAgent", use_cache=use_cache
+        ):
+            review_parts.append(delta)
+            yield "review", delta
+
+        review = "".join(review_parts).strip()
+        async for delta in self.llm.astream_complete(
+            self.OPENROUTER_MODEL, self._build_rewrite_prompt(script_text, review, style),
+            agent="ReviewerAgent", use_cache=use_cache
+        ):
+            yield "rewrite", delta
+
 # === 示例用法（调试/独立运行用）===
 if __name__ == "__main__":
     agent = ReviewerAgent()
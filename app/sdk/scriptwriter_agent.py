@@ -1,6 +1,8 @@
 import os
-import requests
+from typing import AsyncIterator
 from dotenv import load_dotenv
+from .llm_client import get_llm_client
+from .metrics import instrument
 
 load_dotenv()
 
@@ -12,6 +14,7 @@ class ScriptwriterAgent:
             raise ValueError("OPENROUTER_API_KEY or OPENROUTER_MODEL not found in .env file")
 
         self.base_url = "https://openrouter.ai/api/v1"
+        self.llm = get_llm_client(self.OPENROUTER_API_KEY, self.base_url)
 
     def _get_duration_range(self, duration: str) -> str:
         duration_ranges = {
@@ -21,9 +24,9 @@ class ScriptwriterAgent:
         }
         return duration_ranges.get(duration, "10~15分钟")
 
-    def generate_script(self, topic_title: str, research_summary: str, style: str = "理性分析", duration: str = "medium"):
+    def _build_script_prompt(self, topic_title: str, research_summary: str, style: str, duration: str) -> str:
         duration_range = self._get_duration_range(duration)
-        prompt = f"""
+        return f"""
 你是一名专业政经类视频编剧，帮助YouTuber撰写可口语化的视频脚本。
 
 请根据以下【选题标题】和【研究摘要】，输出一个{duration_range}的口播脚本。风格参考："{style}"。
@@ -47,28 +50,30 @@ class ScriptwriterAgent:
 请开始生成脚本：
 """
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.OPENROUTER_API_KEY}"
-        }
-
-        data = {
-            "model": self.OPENROUTER_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-        }
-
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=data
+    @instrument
+    def generate_script(self, topic_title: str, research_summary: str, style: str = "理性分析", duration: str = "medium", use_cache: bool = True):
+        prompt = self._build_script_prompt(topic_title, research_summary, style, duration)
+        return self.llm.complete(
+            self.OPENROUTER_MODEL, prompt, agent="ScriptwriterAgent", use_cache=use_cache
+        ).strip()
+
+    @instrument
+    async def agenerate_script(self, topic_title: str, research_summary: str, style: str = "理性分析", duration: str = "medium", use_cache: bool = True) -> str:
+        """generate_script 的 asyncio 版本"""
+        prompt = self._build_script_prompt(topic_title, research_summary, style, duration)
+        content = await self.llm.acomplete(
+            self.OPENROUTER_MODEL, prompt, agent="ScriptwriterAgent", use_cache=use_cache
         )
-
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API请求失败: {response.text}")
-
-        return response.json()["choices"][0]["message"]["content"].strip()
+        return content.strip()
+
+    @instrument
+    async def astream_script(self, topic_title: str, research_summary: str, style: str = "理性分析", duration: str = "medium", use_cache: bool = True) -> AsyncIterator[str]:
+        """流式生成视频脚本，逐段产出文本"""
+        prompt = self._build_script_prompt(topic_title, research_summary, style, duration)
+        async for delta in self.llm.astream_complete(
+            self.OPENROUTER_MODEL, prompt, agent="ScriptwriterAgent", use_cache=use_cache
+        ):
+            yield delta
 
 # === 示例运行（调试/独立运行用）===
 if __name__ == "__main__":
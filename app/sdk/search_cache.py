@@ -0,0 +1,166 @@
+"""Serper 搜索结果缓存：按规范化查询、tbs、num（及搜索语言）建键，支持 stale-while-revalidate
+
+新鲜期随搜索时间窗口缩放（qdr:h 只缓存几分钟，qdr:m12 可缓存一天）；
+新鲜期过后的一段时间内仍直接返回旧结果，同时在后台线程池中刷新。
+存储复用 LLMCache 的内存 LRU + 磁盘两级结构，目录为 assets/cache/search。
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import contextvars
+import unicodedata
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from .llm_cache import LLMCache
+from .executor import get_executor
+from .singleflight import SingleFlight
+from . import metrics
+
+load_dotenv()
+
+SEARCH_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "assets", "cache", "search"
+)
+
+# 新鲜期 = 时间窗口 / FRESHNESS_RATIO，并限制在 [MIN_FRESH, MAX_FRESH] 之间
+FRESHNESS_RATIO = float(os.getenv("SEARCH_CACHE_FRESHNESS_RATIO", "48"))
+MIN_FRESH = int(os.getenv("SEARCH_CACHE_MIN_TTL", "300"))
+MAX_FRESH = int(os.getenv("SEARCH_CACHE_MAX_TTL", "86400"))
+# 过期后仍可返回旧结果的时长 = 新鲜期 × STALE_FACTOR
+STALE_FACTOR = float(os.getenv("SEARCH_CACHE_STALE_FACTOR", "4"))
+
+# Google tbs 时间单位对应的秒数
+_TBS_UNITS = {"h": 3600, "d": 86400, "w": 7 * 86400, "m": 30 * 86400, "y": 365 * 86400}
+_TBS_PATTERN = re.compile(r"qdr:([hdwmy])(\d*)")
+
+SEARCH_CACHE_LOOKUPS = metrics.registry.counter(
+    "search_cache_lookups_total", "搜索缓存查询次数；result=fresh/stale/miss", ("upstream", "result")
+)
+
+
+def normalize_query(query: str) -> str:
+    """NFKC 归一化（全角转半角）、小写、合并空白"""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def fresh_ttl_for(tbs: Optional[str]) -> int:
+    """按时间窗口计算新鲜期（秒）；无时间限制的搜索按最长新鲜期处理"""
+    match = _TBS_PATTERN.search(tbs or "")
+    if not match:
+        return MAX_FRESH
+    window = _TBS_UNITS[match.group(1)] * int(match.group(2) or 1)
+    return int(min(MAX_FRESH, max(MIN_FRESH, window / FRESHNESS_RATIO)))
+
+
+class SearchCache:
+    """搜索结果缓存；get_or_fetch 负责命中判断、后台刷新与并发去重"""
+
+    def __init__(self, upstream: str = "serper", cache_dir: str = SEARCH_CACHE_DIR, store: Optional[LLMCache] = None):
+        self.upstream = upstream
+        self.store = store or LLMCache(
+            cache_dir=cache_dir,
+            max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512")),
+            max_disk_bytes=int(os.getenv("SEARCH_CACHE_MAX_DISK_MB", "50")) * 1024 * 1024,
+            enabled=os.getenv("SEARCH_CACHE_ENABLED", "true").lower() != "false",
+        )
+        self._inflight = SingleFlight()
+        self._refreshing: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.store.enabled
+
+    @staticmethod
+    def make_key(query: str, tbs: Optional[str], num: int, language: Optional[str] = None) -> str:
+        material = [normalize_query(query), tbs or "", num] + ([language] if language else [])
+        raw = json.dumps(material, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Tuple[Optional[List[Dict]], bool]:
+        """返回 (结果, 是否仍在新鲜期)；未命中或已超过可容忍的过期时长时结果为 None"""
+        record = self.store.get(key)
+        if record is None:
+            return None, False
+        return record["results"], record["fresh_until"] > time.time()
+
+    def store_results(self, key: str, results: List[Dict], tbs: Optional[str]):
+        fresh = fresh_ttl_for(tbs)
+        record = {"fresh_until": time.time() + fresh, "results": results}
+        self.store.set(key, record, int(fresh * (1 + STALE_FACTOR)))
+
+    def get_or_fetch(
+        self,
+        query: str,
+        tbs: Optional[str],
+        num: int,
+        fetch: Callable[[], List[Dict]],
+        language: Optional[str] = None,
+    ) -> List[Dict]:
+        """命中新鲜结果直接返回；命中过期结果先返回旧值再后台刷新；未命中时同步请求
+
+        未命中时相同键的并发调用只请求一次。fetch 失败时应抛出异常，空结果不写入缓存。
+        """
+        key = self.make_key(query, tbs, num, language)
+        results, fresh = self.lookup(key) if self.enabled else (None, False)
+        if results is not None:
+            SEARCH_CACHE_LOOKUPS.inc(upstream=self.upstream, result="fresh" if fresh else "stale")
+            if not fresh:
+                self._refresh_in_background(key, tbs, fetch)
+            return results
+
+        SEARCH_CACHE_LOOKUPS.inc(upstream=self.upstream, result="miss")
+        if not self.enabled:
+            return fetch()
+
+        def fetch_and_store() -> List[Dict]:
+            fetched = fetch()
+            if fetched:
+                self.store_results(key, fetched, tbs)
+            return fetched
+        return self._inflight.do(key, fetch_and_store)
+
+    def _refresh_in_background(self, key: str, tbs: Optional[str], fetch: Callable[[], List[Dict]]):
+        with self._lock:
+            if key in self._refreshing:
+                return  # 同一个键只保留一个刷新任务
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                results = fetch()
+                if results:
+                    self.store_results(key, results, tbs)
+            except Exception as e:
+                print(f"后台刷新搜索缓存失败: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        get_executor().submit(contextvars.copy_context().run, refresh)
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            refreshing = len(self._refreshing)
+        return {**self.store.stats(), "refreshing": refreshing}
+
+
+_cache: Optional[SearchCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """获取进程内共享的 Serper 搜索缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache()
+    return _cache
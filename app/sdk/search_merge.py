@@ -0,0 +1,89 @@
+"""多路搜索结果合并：按规范化 URL 与近似重复摘要去重，再用 Reciprocal Rank Fusion 排序"""
+
+import re
+import unicodedata
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# RRF 平滑常数，取常用值 60
+RRF_K = 60
+# 摘要字符二元组的 Jaccard 相似度不低于该值时视为近似重复
+NEAR_DUPLICATE_THRESHOLD = 0.7
+
+_TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "mc_cid", "mc_eid", "spm", "from", "ref", "share_token"}
+
+
+def canonical_url(url: str) -> str:
+    """去掉协议差异、www.、片段、跟踪参数和末尾斜杠，并对查询参数排序"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host.startswith("m.") and host.count(".") >= 2:
+        host = host[2:]  # 移动版页面与桌面版视为同一篇
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("", host, path, urlencode(query), ""))
+
+
+def _shingles(text: str) -> Set[str]:
+    """摘要的字符二元组集合；中英文混排时不依赖分词"""
+    normalized = re.sub(r"[\W_]+", "", unicodedata.normalize("NFKC", text).lower())
+    if len(normalized) < 2:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + 2] for i in range(len(normalized) - 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def merge_results(
+    result_lists: List[List[Dict]],
+    limit: Optional[int] = None,
+    threshold: float = NEAR_DUPLICATE_THRESHOLD,
+) -> List[Dict]:
+    """合并多个子查询的结果列表
+
+    同一篇文章在多个子查询中出现时累加 RRF 分数，因此被多个角度同时检索到的结果排名更靠前。
+    返回的每条结果带有 score 与 matched_queries（命中的子查询数）。
+    """
+    merged: List[Dict] = []
+    by_url: Dict[str, Dict] = {}
+    shingles: List[Set[str]] = []
+
+    for results in result_lists:
+        counted: Set[int] = set()  # 同一列表内的重复项只计一次分
+        for rank, result in enumerate(results):
+            score = 1.0 / (RRF_K + rank + 1)
+            url = canonical_url(result["link"])
+            entry = by_url.get(url)
+
+            if entry is None:
+                snippet_shingles = _shingles(result.get("snippet") or result["title"])
+                for i, candidate in enumerate(shingles):
+                    if jaccard(snippet_shingles, candidate) >= threshold:
+                        entry = merged[i]  # 不同网址转载的同一篇稿件
+                        break
+
+            if entry is None:
+                entry = {**result, "score": 0.0, "matched_queries": 0}
+                merged.append(entry)
+                shingles.append(snippet_shingles)
+
+            by_url[url] = entry
+            if id(entry) in counted:
+                continue
+            counted.add(id(entry))
+            entry["score"] += score
+            entry["matched_queries"] += 1
+            if not entry.get("snippet") and result.get("snippet"):
+                entry["snippet"] = result["snippet"]
+
+    merged.sort(key=lambda entry: (entry["score"], entry["matched_queries"]), reverse=True)
+    return merged[:limit] if limit else merged
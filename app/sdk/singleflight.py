@@ -0,0 +1,71 @@
+"""请求合并（single-flight）：相同键的并发调用只向上游发起一次请求，结果与异常共享"""
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """同步调用按线程合并，异步调用按事件循环合并"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._tasks = weakref.WeakKeyDictionary()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """执行 func；若相同 key 的调用正在进行，则等待并复用其结果"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """do 的 asyncio 版本；上游调用作为独立任务运行，单个调用方取消不会影响其他等待者"""
+        loop = asyncio.get_running_loop()
+        tasks = self._tasks.setdefault(loop, {})
+        task = tasks.get(key)
+        if task is None:
+            task = loop.create_task(func())
+            tasks[key] = task
+
+            def _done(t: asyncio.Task):
+                tasks.pop(key, None)
+                if not t.cancelled():
+                    t.exception()  # 标记异常已读取，避免所有等待者都被取消时产生告警
+
+            task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        """当前正在进行的合并请求数"""
+        with self._lock:
+            count = len(self._calls)
+        return count + sum(len(tasks) for tasks in list(self._tasks.values()))
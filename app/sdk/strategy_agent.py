@@ -1,8 +1,9 @@
-import requests
 import os
 from typing import Optional
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from .llm_client import get_llm_client
+from .metrics import instrument
 from enum import Enum
 
 load_dotenv()
@@ -20,14 +21,14 @@ class StrategyAgent:
             raise ValueError("OPENROUTER_API_KEY or OPENROUTER_MODEL not found in .env file")
 
         self.base_url = "https://openrouter.ai/api/v1"
+        self.llm = get_llm_client(self.OPENROUTER_API_KEY, self.base_url)
 
     def _get_date_range(self, time_range: TimeRange) -> tuple[str, str]:
         end_date = datetime.now()
         start_date = end_date - timedelta(days=30 * time_range.value)
         return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
 
-    def generate_topic_suggestions(self, articles, time_range: TimeRange = TimeRange.MONTHS_3):
-        """根据文章生成选题建议，支持不同的时间范围"""
+    def _build_topic_prompt(self, articles, time_range: TimeRange) -> str:
         start_date, end_date = self._get_date_range(time_range)
         news_summaries = "".join([f"- {a['title']} ({a['url']})\n" for a in articles])
 
@@ -37,7 +38,7 @@ class StrategyAgent:
             TimeRange.YEARS_2: "近2年"
         }[time_range]
 
-        prompt = f"""
+        return f"""
 你是一个为政经类YouTube频道策划选题的AI助手。
 根据以下{time_range_text}（{start_date}至{end_date}）的新闻标题和链接，生成5个具备时效性、独特性和观众吸引力的视频选题建议：
 
@@ -57,28 +58,21 @@ class StrategyAgent:
 - 对于近2年的内容，注重长期影响和历史对比
 """
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.OPENROUTER_API_KEY}"
-        }
-
-        data = {
-            "model": self.OPENROUTER_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-        }
-
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=data
+    @instrument
+    def generate_topic_suggestions(self, articles, time_range: TimeRange = TimeRange.MONTHS_3, use_cache: bool = True):
+        """根据文章生成选题建议，支持不同的时间范围"""
+        prompt = self._build_topic_prompt(articles, time_range)
+        return self.llm.complete(
+            self.OPENROUTER_MODEL, prompt, agent="StrategyAgent", use_cache=use_cache
         )
 
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API请求失败: {response.text}")
-
-        return response.json()["choices"][0]["message"]["content"]
+    @instrument
+    async def agenerate_topic_suggestions(self, articles, time_range: TimeRange = TimeRange.MONTHS_3, use_cache: bool = True):
+        """generate_topic_suggestions 的 asyncio 版本"""
+        prompt = self._build_topic_prompt(articles, time_range)
+        return await self.llm.acomplete(
+            self.OPENROUTER_MODEL, prompt, agent="StrategyAgent", use_cache=use_cache
+        )
 
 # === 主流程 ===
 if __name__ == "__main__":
@@ -0,0 +1,425 @@
+"""结构化输出：按 JSON Schema 约束模型输出、校验结果，并在流式输出中增量解析 JSON
+
+- json_schema_format 生成 OpenRouter 的 response_format（json_schema + strict），同时把 Schema 写进提示词，
+  不支持 response_format 的模型也能按格式输出
+- validate 实现常用的 JSON Schema 子集（type/properties/required/additionalProperties/items/enum/长度与数量限制）
+- generate_structured / agenerate_structured 只在解析或校验失败时重试，并把错误反馈给模型；
+  网络错误与限流由 UpstreamPolicy 处理，这里不重复重试
+- IncrementalJSONParser 逐块接收流式文本，每个字段一完成就产出 (路径, 值)
+"""
+
+import os
+import re
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from . import metrics
+
+load_dotenv()
+
+STRUCTURED_MAX_ATTEMPTS = int(os.getenv("STRUCTURED_MAX_ATTEMPTS", "2"))
+
+STRUCTURED_OUTPUTS = metrics.registry.counter(
+    "llm_structured_outputs_total", "结构化输出校验结果；result=valid/retried/invalid", ("agent", "result")
+)
+
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+Path = Tuple[Any, ...]
+
+
+class SchemaValidationError(Exception):
+    """多次尝试后模型输出仍不符合 Schema"""
+
+    def __init__(self, message: str, errors: List[str]):
+        super().__init__(f"{message}: {'; '.join(errors[:5])}")
+        self.errors = errors
+
+
+# === Schema ===
+def json_schema_format(name: str, schema: Dict) -> Dict:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def schema_instructions(schema: Dict) -> str:
+    return (
+        "\n请严格按照以下 JSON Schema 输出，只输出一个 JSON 对象，不要附加解释或 Markdown 代码块：\n"
+        f"{json.dumps(schema, ensure_ascii=False)}\n"
+    )
+
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def _type_matches(instance: Any, expected: str) -> bool:
+    if expected == "integer":
+        return isinstance(instance, int) and not isinstance(instance, bool)
+    if expected == "number":
+        return isinstance(instance, (int, float)) and not isinstance(instance, bool)
+    return isinstance(instance, _TYPES[expected])
+
+
+def validate(instance: Any, schema: Dict, path: str = "$") -> List[str]:
+    """返回校验错误列表，空列表表示通过"""
+    errors: List[str] = []
+    expected = schema.get("type")
+    if expected:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_type_matches(instance, t) for t in types):
+            return [f"{path}: 应为 {'/'.join(types)}，实际为 {type(instance).__name__}"]
+
+    if "enum" in schema and instance not in schema["enum"]:
+        errors.append(f"{path}: 取值应为 {schema['enum']} 之一")
+
+    if isinstance(instance, str):
+        if len(instance) < schema.get("minLength", 0):
+            errors.append(f"{path}: 长度至少为 {schema['minLength']}")
+        if "maxLength" in schema and len(instance) > schema["maxLength"]:
+            errors.append(f"{path}: 长度至多为 {schema['maxLength']}")
+        if "pattern" in schema and not re.search(schema["pattern"], instance):
+            errors.append(f"{path}: 不匹配 {schema['pattern']}")
+
+    elif isinstance(instance, dict):
+        for key in schema.get("required", []):
+            if key not in instance:
+                errors.append(f"{path}: 缺少字段 {key}")
+        properties = schema.get("properties", {})
+        additional = schema.get("additionalProperties", True)
+        for key, value in instance.items():
+            if key in properties:
+                errors.extend(validate(value, properties[key], f"{path}.{key}"))
+            elif additional is False:
+                errors.append(f"{path}: 不允许的字段 {key}")
+            elif isinstance(additional, dict):
+                errors.extend(validate(value, additional, f"{path}.{key}"))
+
+    elif isinstance(instance, list):
+        if len(instance) < schema.get("minItems", 0):
+            errors.append(f"{path}: 至少需要 {schema['minItems']} 项")
+        if "maxItems" in schema and len(instance) > schema["maxItems"]:
+            errors.append(f"{path}: 至多 {schema['maxItems']} 项")
+        if "items" in schema:
+            for i, item in enumerate(instance):
+                errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+
+    return errors
+
+
+def parse_json(text: str) -> Any:
+    """解析模型输出中的 JSON：去掉代码块标记，从第一个 { 或 [ 开始解析，忽略其后的多余文本"""
+    text = _CODE_FENCE.sub("", text.strip())
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("输出中没有 JSON 对象")
+    value, _ = json.JSONDecoder().raw_decode(text, min(starts))
+    return value
+
+
+def _check(text: str, schema: Dict) -> Tuple[Optional[Any], List[str]]:
+    try:
+        data = parse_json(text)
+    except ValueError as e:
+        return None, [f"JSON 解析失败: {e}"]
+    return data, validate(data, schema)
+
+
+def _feedback(prompt: str, errors: List[str]) -> str:
+    return (
+        f"{prompt}\n上一次输出未通过校验，错误如下：\n- " + "\n- ".join(errors[:10])
+        + "\n请修正后重新输出完整的 JSON。\n"
+    )
+
+
+# === 同步 / 异步生成 ===
+def generate_structured(
+    llm,
+    model: str,
+    prompt: str,
+    schema: Dict,
+    name: str,
+    agent: Optional[str] = None,
+    use_cache: bool = True,
+    max_attempts: int = STRUCTURED_MAX_ATTEMPTS,
+    max_tokens: int = 2000,
+) -> Dict:
+    """调用模型并返回通过 Schema 校验的对象；只在解析/校验失败时带着错误信息重试"""
+    response_format = json_schema_format(name, schema)
+    attempt_prompt = prompt + schema_instructions(schema)
+    errors: List[str] = []
+    for attempt in range(max_attempts):
+        text = llm.complete(
+            model, attempt_prompt, max_tokens=max_tokens, agent=agent,
+            use_cache=use_cache, response_format=response_format
+        )
+        data, errors = _check(text, schema)
+        if not errors:
+            STRUCTURED_OUTPUTS.inc(agent=metrics.operation_labels(agent)[0], result="valid" if attempt == 0 else "retried")
+            return data
+        # 不合格的结果不能留在缓存里，否则下次仍会命中
+        llm.evict(model, attempt_prompt, max_tokens=max_tokens, response_format=response_format)
+        attempt_prompt = _feedback(prompt + schema_instructions(schema), errors)
+    STRUCTURED_OUTPUTS.inc(agent=metrics.operation_labels(agent)[0], result="invalid")
+    raise SchemaValidationError("模型输出不符合 Schema", errors)
+
+
+async def agenerate_structured(
+    llm,
+    model: str,
+    prompt: str,
+    schema: Dict,
+    name: str,
+    agent: Optional[str] = None,
+    use_cache: bool = True,
+    max_attempts: int = STRUCTURED_MAX_ATTEMPTS,
+    max_tokens: int = 2000,
+    errors: Optional[List[str]] = None,
+) -> Dict:
+    """generate_structured 的 asyncio 版本；errors 非空时第一次尝试就带上错误反馈（流式输出校验失败后的重试）"""
+    response_format = json_schema_format(name, schema)
+    base_prompt = prompt + schema_instructions(schema)
+    attempt_prompt = _feedback(base_prompt, errors) if errors else base_prompt
+    errors = errors or []
+    for attempt in range(max_attempts):
+        text = await llm.acomplete(
+            model, attempt_prompt, max_tokens=max_tokens, agent=agent,
+            use_cache=use_cache, response_format=response_format
+        )
+        data, errors = _check(text, schema)
+        if not errors:
+            STRUCTURED_OUTPUTS.inc(agent=metrics.operation_labels(agent)[0], result="valid" if attempt == 0 and attempt_prompt == base_prompt else "retried")
+            return data
+        llm.evict(model, attempt_prompt, max_tokens=max_tokens, response_format=response_format)
+        attempt_prompt = _feedback(base_prompt, errors)
+    STRUCTURED_OUTPUTS.inc(agent=metrics.operation_labels(agent)[0], result="invalid")
+    raise SchemaValidationError("模型输出不符合 Schema", errors)
+
+
+async def astream_structured(
+    llm,
+    model: str,
+    prompt: str,
+    schema: Dict,
+    name: str,
+    agent: Optional[str] = None,
+    use_cache: bool = True,
+    max_attempts: int = STRUCTURED_MAX_ATTEMPTS,
+    max_tokens: int = 2000,
+) -> AsyncIterator[Dict]:
+    """流式生成结构化输出
+
+    产出 {"event": "field", "path": [...], "value": ...}（每个字段完成时），
+    最后产出 {"event": "result", "data": ...}；流式结果校验失败时先产出
+    {"event": "retry", "errors": [...]}，再以非流式方式重试。
+    """
+    response_format = json_schema_format(name, schema)
+    attempt_prompt = prompt + schema_instructions(schema)
+    parser = IncrementalJSONParser()
+    parts: List[str] = []
+    async for delta in llm.astream_complete(
+        model, attempt_prompt, max_tokens=max_tokens, agent=agent,
+        use_cache=use_cache, response_format=response_format
+    ):
+        parts.append(delta)
+        try:
+            fields = parser.feed(delta)
+        except ValueError:
+            fields = []  # 流中途出现非法 JSON，留给最终校验处理
+        for path, value in fields:
+            yield {"event": "field", "path": list(path), "value": value}
+
+    data, errors = _check("".join(parts), schema)
+    if not errors:
+        STRUCTURED_OUTPUTS.inc(agent=metrics.operation_labels(agent)[0], result="valid")
+        yield {"event": "result", "data": data}
+        return
+
+    llm.evict(model, attempt_prompt, max_tokens=max_tokens, response_format=response_format)
+    yield {"event": "retry", "errors": errors}
+    if max_attempts <= 1:
+        STRUCTURED_OUTPUTS.inc(agent=metrics.operation_labels(agent)[0], result="invalid")
+        raise SchemaValidationError("模型输出不符合 Schema", errors)
+    data = await agenerate_structured(
+        llm, model, prompt, schema, name, agent, use_cache, max_attempts - 1, max_tokens, errors
+    )
+    yield {"event": "result", "data": data}
+
+
+# === 增量 JSON 解析 ===
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = set("0123456789+-.eE")
+_LITERALS = {"true": True, "false": False, "null": None}
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class _Frame:
+    __slots__ = ("container", "path", "key", "expect")
+
+    def __init__(self, container, path: Path):
+        self.container = container
+        self.path = path
+        self.key = None
+        # 对象：key -> colon -> value -> comma；数组：value -> comma
+        self.expect = "key" if isinstance(container, dict) else "value"
+
+
+class IncrementalJSONParser:
+    """逐字符状态机：feed 任意切分的文本块，返回本次新完成的 (路径, 值)
+
+    路径为键与下标组成的元组，如 ("tags", 2)；对象与数组在闭合时作为整体产出一次。
+    根对象之前的文本（如 ```json）被忽略，根对象闭合后 done 为 True，之后的文本不再处理。
+    value 为当前已解析的部分结果（只包含已完成的字段）。
+    """
+
+    def __init__(self):
+        self.value: Any = None
+        self.done = False
+        self._stack: List[_Frame] = []
+        self._token: Optional[str] = None  # string / number / literal
+        self._buffer: List[str] = []
+        self._escape = False
+        self._unicode: Optional[str] = None
+        self._events: List[Tuple[Path, Any]] = []
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        for char in chunk:
+            if self.done:
+                break
+            self._consume(char)
+        events, self._events = self._events, []
+        return events
+
+    def _consume(self, char: str):
+        if self._token == "string":
+            self._consume_string(char)
+            return
+        if self._token == "number":
+            if char in _NUMBER_CHARS:
+                self._buffer.append(char)
+                return
+            self._finish_number()
+        elif self._token == "literal":
+            if char.isalpha():
+                self._buffer.append(char)
+                return
+            self._finish_literal()
+
+        if char in _WHITESPACE:
+            return
+        if not self._stack:
+            if char in "{[":
+                self._open(char)
+            return  # 根对象之前的任意文本
+        frame = self._stack[-1]
+        if char in "{[":
+            self._expect_value(frame, char)
+            self._open(char)
+        elif char in "}]":
+            self._close(char)
+        elif char == '"':
+            if frame.expect not in ("key", "value"):
+                raise ValueError(f"意外的字符串，期望 {frame.expect}")
+            self._token, self._buffer = "string", []
+        elif char == ":":
+            if frame.expect != "colon":
+                raise ValueError("意外的冒号")
+            frame.expect = "value"
+        elif char == ",":
+            if frame.expect != "comma":
+                raise ValueError("意外的逗号")
+            frame.expect = "key" if isinstance(frame.container, dict) else "value"
+        elif char == "-" or char.isdigit():
+            self._expect_value(frame, char)
+            self._token, self._buffer = "number", [char]
+        elif char.isalpha():
+            self._expect_value(frame, char)
+            self._token, self._buffer = "literal", [char]
+        else:
+            raise ValueError(f"意外的字符 {char!r}")
+
+    @staticmethod
+    def _expect_value(frame: _Frame, char: str):
+        if frame.expect != "value":
+            raise ValueError(f"意外的 {char!r}，期望 {frame.expect}")
+
+    def _consume_string(self, char: str):
+        if self._unicode is not None:
+            self._unicode += char
+            if len(self._unicode) == 4:
+                self._buffer.append(chr(int(self._unicode, 16)))
+                self._unicode = None
+        elif self._escape:
+            self._escape = False
+            if char == "u":
+                self._unicode = ""
+            else:
+                self._buffer.append(_ESCAPES.get(char, char))
+        elif char == "\\":
+            self._escape = True
+        elif char == '"':
+            self._token = None
+            text = "".join(self._buffer)
+            frame = self._stack[-1]
+            if frame.expect == "key":
+                frame.key = text
+                frame.expect = "colon"
+            else:
+                self._add(text)
+        else:
+            self._buffer.append(char)
+
+    def _finish_number(self):
+        self._token = None
+        self._add(json.loads("".join(self._buffer)))
+
+    def _finish_literal(self):
+        self._token = None
+        word = "".join(self._buffer)
+        if word not in _LITERALS:
+            raise ValueError(f"无法识别的字面量 {word!r}")
+        self._add(_LITERALS[word])
+
+    def _child_path(self) -> Path:
+        frame = self._stack[-1]
+        if isinstance(frame.container, dict):
+            return frame.path + (frame.key,)
+        return frame.path + (len(frame.container),)
+
+    def _attach(self, value: Any) -> Path:
+        frame = self._stack[-1]
+        path = self._child_path()
+        if isinstance(frame.container, dict):
+            frame.container[frame.key] = value
+        else:
+            frame.container.append(value)
+        frame.expect = "comma"
+        return path
+
+    def _add(self, value: Any):
+        self._events.append((self._attach(value), value))
+
+    def _open(self, char: str):
+        container: Any = {} if char == "{" else []
+        if self._stack:
+            path = self._attach(container)
+        else:
+            path = ()
+            self.value = container
+        self._stack.append(_Frame(container, path))
+
+    def _close(self, char: str):
+        frame = self._stack[-1]
+        if (char == "}") != isinstance(frame.container, dict):
+            raise ValueError(f"括号不匹配: {char!r}")
+        if frame.expect in ("colon",) or (frame.expect == "value" and isinstance(frame.container, dict)):
+            raise ValueError("对象在键值对中途结束")
+        self._stack.pop()
+        if self._stack:
+            self._events.append((frame.path, frame.container))
+        else:
+            self.done = True
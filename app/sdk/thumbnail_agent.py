@@ -1,9 +1,67 @@
 import os
-import requests
+import json
+from typing import AsyncIterator, Dict
 from dotenv import load_dotenv
+from .llm_client import get_llm_client
+from .metrics import instrument
+from .structured_output import agenerate_structured, astream_structured, generate_structured, parse_json
+from .thumbnail_renderer import DESIGN_PALETTE_SCHEMA, build_variants, default_backgrounds, render_many, LAYOUTS
 
 load_dotenv()
 
+_STRINGS = {"type": "array", "items": {"type": "string"}}
+
+# 缩略图设计方案的输出结构；palette 中的颜色与 layout.style 可直接交给 render_thumbnails
+THUMBNAIL_DESIGN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "layout": {
+            "type": "object",
+            "properties": {
+                "style": {"type": "string", "enum": list(LAYOUTS)},
+                "subject_position": {"type": "string"},
+                "text_layout": {"type": "string"},
+                "background": {"type": "string"},
+            },
+            "required": ["style", "subject_position", "text_layout", "background"],
+            "additionalProperties": False,
+        },
+        "palette": DESIGN_PALETTE_SCHEMA,
+        "visual_elements": {
+            "type": "object",
+            "properties": {"icons": _STRINGS, "image_assets": _STRINGS, "effects": _STRINGS},
+            "required": ["icons", "image_assets", "effects"],
+            "additionalProperties": False,
+        },
+        "typography": {
+            "type": "object",
+            "properties": {
+                "headline": {"type": "string", "minLength": 1},
+                "subtitle": {"type": "string"},
+                "fonts": _STRINGS,
+                "hierarchy": {"type": "string"},
+            },
+            "required": ["headline", "subtitle", "fonts", "hierarchy"],
+            "additionalProperties": False,
+        },
+        "optimization": {
+            "type": "object",
+            "properties": {"ctr_tips": _STRINGS, "ab_tests": _STRINGS, "mobile": _STRINGS},
+            "required": ["ctr_tips", "ab_tests", "mobile"],
+            "additionalProperties": False,
+        },
+    },
+    "required": ["layout", "palette", "visual_elements", "typography", "optimization"],
+    "additionalProperties": False,
+}
+
+DEFAULT_ASSET_SUGGESTIONS = [
+    "高质量的主题相关图片",
+    "醒目的图标或符号",
+    "与主题相关的背景图像",
+    "考虑使用对比色增强视觉效果"
+]
+
 class ThumbnailAgent:
     def __init__(self):
         self.OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -12,9 +70,10 @@ class ThumbnailAgent:
             raise ValueError("OPENROUTER_API_KEY or OPENROUTER_MODEL not found in .env file")
 
         self.base_url = "https://openrouter.ai/api/v1"
+        self.llm = get_llm_client(self.OPENROUTER_API_KEY, self.base_url)
 
-    def generate_thumbnail_design(self, title: str, script_excerpt: str, style: str = "modern") -> dict:
-        prompt = f"""
+    def _build_design_prompt(self, title: str, script_excerpt: str, style: str) -> str:
+        return f"""
 作为一位专业的YouTube缩略图设计师，请为以下视频设计一个引人注目的缩略图方案。
 
 【视频标题】
@@ -28,98 +87,77 @@ class ThumbnailAgent:
 
 请提供以下设计方案：
 
-1. 构图布局：
-   - 主体元素位置
-   - 文字布局
-   - 背景处理
-
-2. 配色方案：
-   - 主色调
-   - 辅助色
-   - 文字颜色
-   - 背景色
-
-3. 关键视觉元素：
-   - 图标/符号建议
-   - 图片素材建议
-   - 特效处理建议
-
-4. 文字处理：
-   - 主标题处理
-   - 副标题建议
-   - 字体推荐
-   - 大小层级
-
-5. 优化建议：
-   - 点击率优化建议
-   - A/B测试方案
-   - 移动端适配建议
-
-请以JSON格式输出，便于后续处理。
+1. 构图布局（layout）：版式（style，文字位于 left/right/center/bottom）、主体元素位置、文字布局、背景处理
+2. 配色方案（palette）：主色调、辅助色、文字颜色、背景色，均为 #RRGGBB
+3. 关键视觉元素（visual_elements）：图标/符号建议、图片素材建议、特效处理建议
+4. 文字处理（typography）：主标题、副标题、字体推荐、大小层级
+5. 优化建议（optimization）：点击率优化建议、A/B测试方案、移动端适配建议
 """
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.OPENROUTER_API_KEY}"
-        }
-
-        data = {
-            "model": self.OPENROUTER_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-        }
-
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=data
+    @instrument
+    def generate_thumbnail_design(self, title: str, script_excerpt: str, style: str = "modern", use_cache: bool = True) -> dict:
+        """返回符合 THUMBNAIL_DESIGN_SCHEMA 的设计方案；模型输出不合格时带错误信息重试一次"""
+        prompt = self._build_design_prompt(title, script_excerpt, style)
+        return generate_structured(
+            self.llm, self.OPENROUTER_MODEL, prompt, THUMBNAIL_DESIGN_SCHEMA, "thumbnail_design",
+            agent="ThumbnailAgent", use_cache=use_cache
         )
 
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API请求失败: {response.text}")
+    @instrument
+    async def agenerate_thumbnail_design(self, title: str, script_excerpt: str, style: str = "modern", use_cache: bool = True) -> dict:
+        """generate_thumbnail_design 的 asyncio 版本"""
+        prompt = self._build_design_prompt(title, script_excerpt, style)
+        return await agenerate_structured(
+            self.llm, self.OPENROUTER_MODEL, prompt, THUMBNAIL_DESIGN_SCHEMA, "thumbnail_design",
+            agent="ThumbnailAgent", use_cache=use_cache
+        )
 
-        return response.json()["choices"][0]["message"]["content"]
+    @instrument
+    async def astream_thumbnail_design(self, title: str, script_excerpt: str, style: str = "modern", use_cache: bool = True) -> AsyncIterator[Dict]:
+        """流式生成设计方案：每个字段完成即产出 field 事件，最后产出校验后的 result 事件"""
+        prompt = self._build_design_prompt(title, script_excerpt, style)
+        async for event in astream_structured(
+            self.llm, self.OPENROUTER_MODEL, prompt, THUMBNAIL_DESIGN_SCHEMA, "thumbnail_design",
+            agent="ThumbnailAgent", use_cache=use_cache
+        ):
+            yield event
     
-    def get_asset_suggestions(self, design):
-        """根据缩略图设计提取素材建议"""
-        try:
-            # 如果design是字符串（JSON格式），尝试提取关键视觉元素作为素材建议
-            # 这里简单实现，实际应用中可能需要更复杂的解析逻辑
-            suggestions = []
-            
-            # 从设计方案中提取关键词作为素材建议
-            if isinstance(design, str):
-                if "关键视觉元素" in design:
-                    # 简单提取关键视觉元素部分
-                    lines = design.split("\n")
-                    extract_mode = False
-                    for line in lines:
-                        if "关键视觉元素" in line:
-                            extract_mode = True
-                            continue
-                        if extract_mode and line.strip() and "处理" not in line:
-                            if line.startswith("4.") or line.startswith("5."):
-                                extract_mode = False
-                                continue
-                            if "-" in line:
-                                suggestion = line.split("-")[1].strip()
-                                if suggestion and len(suggestion) > 5:
-                                    suggestions.append(suggestion)
-            
-            # 如果没有提取到建议，添加一些默认建议
-            if not suggestions:
-                suggestions = [
-                    "高质量的主题相关图片",
-                    "醒目的图标或符号",
-                    "与主题相关的背景图像",
-                    "考虑使用对比色增强视觉效果"
-                ]
-                
-            return suggestions
-        except Exception as e:
-            # 出错时返回默认建议
-            return ["无法解析设计方案，请手动选择合适素材", str(e)]
+    @instrument
+    def render_thumbnails(self, title: str, subtitle: str = "", design=None, backgrounds=None, count: int = 12, layouts=None) -> list:
+        """按设计方案渲染 count 个 1280x720 PNG 变体到 assets/images/thumbnails
+
+        背景默认取 assets/pexels 中最近的素材；配色优先取设计方案中出现的颜色，
+        未指定 layouts 时设计方案中的 layout.style 排在最前。
+        """
+        if not title.strip():
+            raise ValueError("标题不能为空")
+        if not layouts and isinstance(design, dict):
+            preferred = (design.get("layout") or {}).get("style")
+            if preferred in LAYOUTS:
+                layouts = [preferred] + [layout for layout in LAYOUTS if layout != preferred]
+        specs = build_variants(
+            title, subtitle, design,
+            backgrounds=backgrounds or default_backgrounds() or [None],
+            layouts=layouts or LAYOUTS,
+            count=count,
+        )
+        return render_many(specs)
+
+    def get_asset_suggestions(self, design) -> list:
+        """从设计方案的 visual_elements 中取图片素材与图标建议；取不到时返回默认建议"""
+        if isinstance(design, str):
+            try:
+                design = parse_json(design)
+            except ValueError:
+                design = None
+        elements = design.get("visual_elements") if isinstance(design, dict) else None
+        if not isinstance(elements, dict):
+            return list(DEFAULT_ASSET_SUGGESTIONS)
+        suggestions = [
+            item.strip() for key in ("image_assets", "icons")
+            for item in elements.get(key) or [] if isinstance(item, str) and item.strip()
+        ]
+        return list(dict.fromkeys(suggestions)) or list(DEFAULT_ASSET_SUGGESTIONS)
 
 # === 示例运行（调试/独立运行用）===
 if __name__ == "__main__":
@@ -130,4 +168,4 @@ if __name__ == "__main__":
         style="modern business"
     )
     print("\n=== 缩略图设计方案 ===\n")
-    print(design)
+    print(json.dumps(design, ensure_ascii=False, indent=2))
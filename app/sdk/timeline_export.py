@@ -0,0 +1,178 @@
+"""时间线导出：HH:MM:SS:FF 时间码，CSV / SRT / FCPXML 三种格式，逐条生成文本块以便流式返回
+
+输入是素材标记序列 [{start, end, keyword, title, ai_image_prompt, ...}]（单位：秒），
+即 recommend_assets_for_script 返回的 markers；单片段的 recommend_assets_for_segment 结果
+可先用 markers_from_assets 转换。所有导出函数都是生成器，内存占用与标记数量无关。
+"""
+
+import io
+import csv
+from fractions import Fraction
+from typing import Dict, Iterable, Iterator, Optional
+from xml.sax.saxutils import quoteattr
+
+# 常用帧率对应的精确有理数（NTSC 帧率为 1000/1001 倍）
+_FRAME_RATES = {
+    23.976: Fraction(24000, 1001),
+    29.97: Fraction(30000, 1001),
+    59.94: Fraction(60000, 1001),
+}
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),  # text/* 类型由 Starlette 自动补 charset
+    "srt": ("application/x-subrip; charset=utf-8", "srt"),
+    "fcpxml": ("application/xml; charset=utf-8", "fcpxml"),
+}
+
+
+def frame_rate(fps: float) -> Fraction:
+    if fps <= 0:
+        raise ValueError(f"帧率必须大于 0: {fps}")
+    return _FRAME_RATES.get(round(fps, 3), Fraction(fps).limit_denominator(1001))
+
+
+def to_frames(seconds: float, fps: float) -> int:
+    return int(round(Fraction(seconds).limit_denominator(1000) * frame_rate(fps)))
+
+
+def format_timecode(seconds: float, fps: float = 25) -> str:
+    """HH:MM:SS:FF（非丢帧），小时数不设上限"""
+    nominal = round(float(frame_rate(fps)))
+    frames = to_frames(seconds, fps)
+    total_seconds, frame = divmod(frames, nominal)
+    minutes, second = divmod(total_seconds, 60)
+    hours, minute = divmod(minutes, 60)
+    return f"{hours:02d}:{minute:02d}:{second:02d}:{frame:02d}"
+
+
+def format_srt_time(seconds: float) -> str:
+    """HH:MM:SS,mmm"""
+    millis = int(round(seconds * 1000))
+    total_seconds, milli = divmod(millis, 1000)
+    minutes, second = divmod(total_seconds, 60)
+    hours, minute = divmod(minutes, 60)
+    return f"{hours:02d}:{minute:02d}:{second:02d},{milli:03d}"
+
+
+def _fcpx_time(seconds: float, fps: float) -> str:
+    """FCPXML 有理数时间（对齐到帧）：25fps 下 0.04 秒为 "1/25s"，29.97fps 下 1 秒为 "1001/1000s" """
+    rate = frame_rate(fps)
+    frames = to_frames(seconds, fps)
+    value = frames * Fraction(rate.denominator, rate.numerator)
+    return f"{value.numerator}/{value.denominator}s" if value.denominator != 1 else f"{value.numerator}s"
+
+
+def markers_from_assets(assets: Dict, segment_duration: float = 10) -> Iterator[Dict]:
+    """单片段结果 -> 标记序列：每个素材依次占用 segment_duration 秒"""
+    prompt = (assets.get("ai_image_prompt") or {}).get("prompt", "")
+    for i, item in enumerate(assets.get("pexels_results", [])):
+        yield {
+            "start": i * segment_duration,
+            "end": (i + 1) * segment_duration,
+            "keyword": item.get("keyword"),
+            "title": item.get("title"),
+            "ai_image_prompt": prompt,
+        }
+
+
+def _marker_text(marker: Dict) -> str:
+    return f"关键词：{marker.get('keyword')}\n素材：{marker.get('title')}\nAI图：{marker.get('ai_image_prompt', '')}"
+
+
+# === CSV ===
+def iter_csv(markers: Iterable[Dict], fps: float = 25) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(["Start", "End", "Text"])
+    yield flush()
+    for marker in markers:
+        writer.writerow([
+            format_timecode(marker["start"], fps), format_timecode(marker["end"], fps), _marker_text(marker)
+        ])
+        yield flush()
+
+
+# === SRT ===
+def iter_srt(markers: Iterable[Dict]) -> Iterator[str]:
+    for index, marker in enumerate(markers, start=1):
+        yield (
+            f"{index}\n{format_srt_time(marker['start'])} --> {format_srt_time(marker['end'])}\n"
+            f"{_marker_text(marker)}\n\n"
+        )
+
+
+# === FCPXML ===
+def iter_fcpxml(
+    markers: Iterable[Dict],
+    fps: float = 25,
+    title: str = "timeline",
+    total_duration: Optional[float] = None,
+    width: int = 1920,
+    height: int = 1080,
+) -> Iterator[str]:
+    """FCPXML 1.9：一个空白 gap 覆盖整条时间线，每个素材作为其上的 marker
+
+    gap 的时长要写在 marker 之前；未给出 total_duration 时需先遍历一次标记取最大结束时间。
+    """
+    if total_duration is None:
+        markers = list(markers)
+        total_duration = max((marker["end"] for marker in markers), default=0)
+
+    rate = frame_rate(fps)
+    frame_duration = Fraction(rate.denominator, rate.numerator)
+    duration = _fcpx_time(total_duration, fps)
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE fcpxml>\n<fcpxml version="1.9">\n'
+        "  <resources>\n"
+        f'    <format id="r1" frameDuration="{frame_duration.numerator}/{frame_duration.denominator}s" '
+        f'width="{width}" height="{height}"/>\n'
+        "  </resources>\n"
+        "  <library>\n"
+        f"    <event name={quoteattr(title)}>\n"
+        f"      <project name={quoteattr(title)}>\n"
+        f'        <sequence format="r1" duration="{duration}" tcStart="0s" tcFormat="NDF">\n'
+        "          <spine>\n"
+        f'            <gap name="Gap" offset="0s" start="0s" duration="{duration}">\n'
+    )
+    for marker in markers:
+        length = max(marker["end"] - marker["start"], float(frame_duration))
+        yield (
+            f'              <marker start="{_fcpx_time(marker["start"], fps)}" '
+            f'duration="{_fcpx_time(length, fps)}" '
+            f"value={quoteattr(str(marker.get('keyword') or ''))} "
+            f"note={quoteattr(_marker_text(marker))}/>\n"
+        )
+    yield (
+        "            </gap>\n"
+        "          </spine>\n"
+        "        </sequence>\n"
+        "      </project>\n"
+        "    </event>\n"
+        "  </library>\n"
+        "</fcpxml>\n"
+    )
+
+
+def iter_export(
+    markers: Iterable[Dict],
+    fmt: str = "csv",
+    fps: float = 25,
+    title: str = "timeline",
+    total_duration: Optional[float] = None,
+) -> Iterator[str]:
+    """按格式名分派；未知格式或非法帧率在开始输出前抛出 ValueError"""
+    frame_rate(fps)
+    if fmt == "csv":
+        return iter_csv(markers, fps)
+    if fmt == "srt":
+        return iter_srt(markers)
+    if fmt == "fcpxml":
+        return iter_fcpxml(markers, fps, title, total_duration)
+    raise ValueError(f"不支持的导出格式: {fmt}（可选 {', '.join(EXPORT_FORMATS)}）")
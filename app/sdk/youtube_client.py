@@ -0,0 +1,217 @@
+"""进程内共享的 YouTube Data API 客户端：服务对象只构建一次，OAuth 令牌在过期前由后台线程刷新
+
+- 服务对象用随 google-api-python-client 发布的静态发现文档构建（不请求网络），
+  构建与解析发现文档只在进程内发生一次；也可用 YOUTUBE_DISCOVERY_FILE 指定文档
+- 服务对象可在多个线程间共享，但 httplib2.Http 不是线程安全的：执行请求时用 execute(request)
+  或 request.execute(http=client.http())，每个线程使用自己的已认证 HTTP 传输
+- 凭据对象全进程共享一份，刷新在锁内进行；后台线程在到期前 YOUTUBE_TOKEN_REFRESH_MARGIN 秒刷新，
+  并把新令牌原子写回令牌文件，请求线程不会因令牌过期而各自刷新
+"""
+
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+import httplib2
+import google.auth.transport.requests
+import google.oauth2.credentials
+import google_auth_httplib2
+import google_auth_oauthlib.flow
+import googleapiclient.discovery
+from dotenv import load_dotenv
+from . import metrics
+
+load_dotenv()
+
+SCOPES = ['https://www.googleapis.com/auth/youtube.readonly']
+API_SERVICE_NAME = 'youtube'
+API_VERSION = 'v3'
+
+YOUTUBE_TOKEN_FILE = os.getenv("YOUTUBE_TOKEN_FILE", "credentials/youtube_token.json")
+YOUTUBE_CLIENT_SECRETS_FILE = os.getenv("YOUTUBE_CLIENT_SECRETS_FILE", "credentials/client_secret.json")
+# 留空则使用 google-api-python-client 自带的静态发现文档
+YOUTUBE_DISCOVERY_FILE = os.getenv("YOUTUBE_DISCOVERY_FILE", "")
+# 令牌在到期前多少秒刷新；应大于 google-auth 自身的刷新阈值，避免请求线程抢先刷新
+YOUTUBE_TOKEN_REFRESH_MARGIN = int(os.getenv("YOUTUBE_TOKEN_REFRESH_MARGIN", "300"))
+# YouTube API 单次请求的 socket 超时（秒）
+YOUTUBE_HTTP_TIMEOUT = float(os.getenv("YOUTUBE_HTTP_TIMEOUT", "15"))
+
+# 刷新失败后的重试间隔与后台线程的最短等待（秒）
+_REFRESH_RETRY = 60
+_MIN_REFRESH_WAIT = 5
+
+TOKEN_REFRESHES = metrics.registry.counter(
+    "youtube_token_refreshes_total", "YouTube OAuth 令牌刷新次数；result=ok/error", ("result",)
+)
+
+
+class YouTubeClientManager:
+    """管理 YouTube OAuth 凭据与 API 服务对象的生命周期"""
+
+    def __init__(
+        self,
+        token_file: str = YOUTUBE_TOKEN_FILE,
+        client_secrets_file: str = YOUTUBE_CLIENT_SECRETS_FILE,
+        discovery_file: str = YOUTUBE_DISCOVERY_FILE,
+        refresh_margin: int = YOUTUBE_TOKEN_REFRESH_MARGIN,
+        timeout: float = YOUTUBE_HTTP_TIMEOUT,
+    ):
+        self.token_file = token_file
+        self.client_secrets_file = client_secrets_file
+        self.discovery_file = discovery_file
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._credentials: Optional[google.oauth2.credentials.Credentials] = None
+        self._service = None
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    # === 凭据 ===
+    def _load_credentials(self) -> google.oauth2.credentials.Credentials:
+        if os.path.exists(self.token_file):
+            with open(self.token_file, 'r') as token_file:
+                return google.oauth2.credentials.Credentials.from_authorized_user_info(json.load(token_file))
+        # 没有保存的凭据时进行 OAuth2 认证流程（需要本机浏览器）
+        flow = google_auth_oauthlib.flow.InstalledAppFlow.from_client_secrets_file(
+            self.client_secrets_file, SCOPES)
+        credentials = flow.run_local_server(port=8080)
+        self._save_credentials(credentials)
+        return credentials
+
+    def _save_credentials(self, credentials: google.oauth2.credentials.Credentials):
+        """先写临时文件再替换，其他进程不会读到写了一半的令牌"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.token_file)), exist_ok=True)
+        tmp_path = f"{self.token_file}.tmp"
+        with open(tmp_path, 'w') as token_file:
+            token_file.write(credentials.to_json())
+        os.replace(tmp_path, self.token_file)
+
+    def _seconds_left(self, credentials: Optional[google.oauth2.credentials.Credentials] = None) -> Optional[float]:
+        """距离令牌到期的秒数；尚未取得访问令牌时为 0，令牌没有到期时间时为 None"""
+        credentials = credentials or self._credentials
+        if credentials is None or not credentials.token:
+            return 0.0
+        if credentials.expiry is None:
+            return None
+        # google-auth 的 expiry 是不带时区的 UTC 时间
+        return (credentials.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+
+    def _needs_refresh(self, credentials: Optional[google.oauth2.credentials.Credentials] = None) -> bool:
+        seconds_left = self._seconds_left(credentials)
+        return seconds_left is not None and seconds_left <= self.refresh_margin
+
+    def _refresh_credentials(self, credentials: google.oauth2.credentials.Credentials):
+        if not credentials.refresh_token:
+            raise ValueError("YouTube 凭据缺少 refresh_token，无法刷新，请删除令牌文件后重新授权")
+        try:
+            credentials.refresh(google.auth.transport.requests.Request())
+        except Exception:
+            TOKEN_REFRESHES.inc(result="error")
+            raise
+        TOKEN_REFRESHES.inc(result="ok")
+        self._save_credentials(credentials)
+
+    def refresh(self, force: bool = False) -> bool:
+        """在锁内刷新令牌并写回文件；令牌仍在有效期内（且未强制）时不刷新。返回是否实际刷新"""
+        with self._lock:
+            credentials = self.credentials()
+            if not force and not self._needs_refresh(credentials):
+                return False
+            self._refresh_credentials(credentials)
+            return True
+
+    def credentials(self) -> google.oauth2.credentials.Credentials:
+        """共享的凭据对象；首次调用时读取令牌文件，已过期则先刷新，再启动后台刷新线程
+
+        首次刷新失败时不保留过期的凭据，下次调用重新读取并刷新。
+        """
+        if self._credentials is None:
+            with self._lock:
+                if self._credentials is None:
+                    credentials = self._load_credentials()
+                    if credentials.refresh_token and self._needs_refresh(credentials):
+                        self._refresh_credentials(credentials)
+                    self._credentials = credentials
+                    if credentials.refresh_token:
+                        self._start_refresher()
+        return self._credentials
+
+    # === 后台刷新 ===
+    def _start_refresher(self):
+        if self._refresher is None or not self._refresher.is_alive():
+            self._stop.clear()
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name="youtube-token-refresh", daemon=True
+            )
+            self._refresher.start()
+
+    def _next_wait(self) -> Optional[float]:
+        seconds_left = self._seconds_left()
+        if seconds_left is None:
+            return None
+        return max(seconds_left - self.refresh_margin, _MIN_REFRESH_WAIT)
+
+    def _refresh_loop(self):
+        wait = self._next_wait()
+        while wait is not None and not self._stop.wait(wait):
+            try:
+                self.refresh()
+                wait = self._next_wait()
+            except Exception as e:
+                print(f"YouTube 令牌刷新失败: {e}")
+                wait = _REFRESH_RETRY
+
+    def close(self):
+        """停止后台刷新线程"""
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout=5)
+
+    # === 服务对象 ===
+    def _build_service(self):
+        if self.discovery_file:
+            with open(self.discovery_file, 'r', encoding='utf-8') as f:
+                return googleapiclient.discovery.build_from_document(f.read(), http=self.http())
+        return googleapiclient.discovery.build(
+            API_SERVICE_NAME, API_VERSION, http=self.http(),
+            static_discovery=True, cache_discovery=False
+        )
+
+    def service(self):
+        """共享的 YouTube API 服务对象（只构建一次）"""
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    self._service = self._build_service()
+        return self._service
+
+    def http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """当前线程专用的已认证 HTTP 传输（带超时，避免请求无限挂起）"""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(
+                self.credentials(), http=httplib2.Http(timeout=self.timeout))
+            self._local.http = http
+        return http
+
+    def execute(self, request):
+        """用当前线程的 HTTP 传输执行 service() 构造的请求"""
+        return request.execute(http=self.http())
+
+
+_client: Optional[YouTubeClientManager] = None
+_client_lock = threading.Lock()
+
+
+def get_youtube_client() -> YouTubeClientManager:
+    """获取进程内共享的 YouTube 客户端管理器"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = YouTubeClientManager()
+    return _client
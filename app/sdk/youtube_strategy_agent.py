@@ -1,11 +1,16 @@
 import os
-import requests
-from typing import Optional
+import asyncio
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from .llm_client import get_llm_client
+from .metrics import instrument
 
 load_dotenv()
 
+# 多地区选题并发生成时的默认并发上限
+DEFAULT_REGION_CONCURRENCY = int(os.getenv("STRATEGY_REGION_CONCURRENCY", "4"))
+
 class YouTubeStrategyAgent:
     def __init__(self):
         self.OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -14,45 +19,32 @@ class YouTubeStrategyAgent:
             raise ValueError("OPENROUTER_API_KEY or OPENROUTER_MODEL not found in .env file")
 
         self.base_url = "https://openrouter.ai/api/v1"
+        self.llm = get_llm_client(self.OPENROUTER_API_KEY, self.base_url)
 
     def _get_date_range(self, months_back: int = 3) -> tuple[str, str]:
         end_date = datetime.now()
         start_date = end_date - timedelta(days=30 * months_back)
         return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
 
-    def _call_api(self, prompt: str) -> str:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.OPENROUTER_API_KEY}"
-        }
-
-        data = {
-            "model": self.OPENROUTER_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-        }
-
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=data
+    def _call_api(self, prompt: str, use_cache: bool = True) -> str:
+        return self.llm.complete(
+            self.OPENROUTER_MODEL, prompt, agent="YouTubeStrategyAgent", use_cache=use_cache
         )
 
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API请求失败: {response.text}")
-
-        return response.json()["choices"][0]["message"]["content"]
+    async def _acall_api(self, prompt: str, use_cache: bool = True) -> str:
+        return await self.llm.acomplete(
+            self.OPENROUTER_MODEL, prompt, agent="YouTubeStrategyAgent", use_cache=use_cache
+        )
 
-    def generate_topic_suggestions_from_youtube(
+    def _build_youtube_prompt(
         self,
         topic: str,
-        category_id: Optional[str] = None,
-        region: str = "US",
-        months_back: int = 3
+        category_id: Optional[str],
+        region: str,
+        months_back: int
     ) -> str:
         start_date, end_date = self._get_date_range(months_back)
-        prompt = f"""
+        return f"""
 你是一位资深的YouTube内容策略顾问，请基于{start_date}至{end_date}期间的YouTube趋势为以下主题提供专业的选题建议。
 
 【主题方向】
@@ -93,17 +85,16 @@ class YouTubeStrategyAgent:
 
 请特别关注近期（最近一个月内）的热点话题和趋势。建议以结构化的方式输出，并标注信息的时效性。
 """
-        return self._call_api(prompt)
 
-    def generate_topic_suggestions_from_news(
+    def _build_news_prompt(
         self,
         topic: str,
-        category_id: Optional[str] = None,
-        query: Optional[str] = None,
-        months_back: int = 3
+        category_id: Optional[str],
+        query: Optional[str],
+        months_back: int
     ) -> str:
         start_date, end_date = self._get_date_range(months_back)
-        prompt = f"""
+        return f"""
 你是一位资深的YouTube内容策略顾问，请基于{start_date}至{end_date}期间的新闻热点为以下主题提供专业的选题建议。
 
 【主题方向】
@@ -144,7 +135,86 @@ class YouTubeStrategyAgent:
 
 请特别关注近期（最近一个月内）的热点新闻。建议以结构化的方式输出，并标注新闻的发布时间和时效性。
 """
-        return self._call_api(prompt)
+
+    @instrument
+    def generate_topic_suggestions_from_youtube(
+        self,
+        topic: str,
+        category_id: Optional[str] = None,
+        region: str = "US",
+        months_back: int = 3,
+        use_cache: bool = True
+    ) -> str:
+        prompt = self._build_youtube_prompt(topic, category_id, region, months_back)
+        return self._call_api(prompt, use_cache=use_cache)
+
+    @instrument
+    async def agenerate_topic_suggestions_from_youtube(
+        self,
+        topic: str,
+        category_id: Optional[str] = None,
+        region: str = "US",
+        months_back: int = 3,
+        use_cache: bool = True
+    ) -> str:
+        """generate_topic_suggestions_from_youtube 的 asyncio 版本"""
+        prompt = self._build_youtube_prompt(topic, category_id, region, months_back)
+        return await self._acall_api(prompt, use_cache=use_cache)
+
+    @instrument
+    async def agenerate_multi_region_suggestions(
+        self,
+        topic: str,
+        regions: List[str],
+        category_id: Optional[str] = None,
+        months_back: int = 3,
+        max_concurrency: Optional[int] = None,
+        use_cache: bool = True
+    ) -> List[Dict[str, Optional[str]]]:
+        """并发生成多个地区的选题建议，按输入顺序返回，单个地区失败不影响其他地区"""
+        semaphore = asyncio.Semaphore(max_concurrency or DEFAULT_REGION_CONCURRENCY)
+
+        async def generate(region: str) -> Dict[str, Optional[str]]:
+            async with semaphore:
+                try:
+                    recommendation = await self.agenerate_topic_suggestions_from_youtube(
+                        topic=topic,
+                        category_id=category_id,
+                        region=region,
+                        months_back=months_back,
+                        use_cache=use_cache
+                    )
+                    return {"region": region, "recommendation": recommendation, "error": None}
+                except Exception as e:
+                    print(f"生成 {region} 地区选题建议失败: {e}")
+                    return {"region": region, "recommendation": None, "error": str(e)}
+
+        return await asyncio.gather(*[generate(region) for region in regions])
+
+    @instrument
+    def generate_topic_suggestions_from_news(
+        self,
+        topic: str,
+        category_id: Optional[str] = None,
+        query: Optional[str] = None,
+        months_back: int = 3,
+        use_cache: bool = True
+    ) -> str:
+        prompt = self._build_news_prompt(topic, category_id, query, months_back)
+        return self._call_api(prompt, use_cache=use_cache)
+
+    @instrument
+    async def agenerate_topic_suggestions_from_news(
+        self,
+        topic: str,
+        category_id: Optional[str] = None,
+        query: Optional[str] = None,
+        months_back: int = 3,
+        use_cache: bool = True
+    ) -> str:
+        """generate_topic_suggestions_from_news 的 asyncio 版本"""
+        prompt = self._build_news_prompt(topic, category_id, query, months_back)
+        return await self._acall_api(prompt, use_cache=use_cache)
 
 # === 示例运行（调试/独立运行用）===
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+"""并发基准：验证 async 路由在单个 worker 内可以并行处理 N 个 LLM 请求
+
+用法（在项目根目录）：
+    python -m benchmarks.concurrency_benchmark --requests 20 --latency 0.5
+
+上游 OpenRouter 调用被替换为固定延迟的模拟实现，因此无需网络与 API Key。
+对照组是旧写法：在 async 路由里直接调用同步 Agent 方法，会阻塞事件循环。
+"""
+
+import os
+import time
+import asyncio
+import argparse
+
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+os.environ.setdefault("OPENROUTER_MODEL", "benchmark")
+
+import httpx
+from fastapi import FastAPI
+
+from app.api import script
+from app.sdk.llm_client import LLMClient
+from app.sdk.scriptwriter_agent import ScriptwriterAgent
+
+
+def _fake_body() -> dict:
+    return {"choices": [{"message": {"content": "benchmark script"}}]}
+
+
+def patch_upstream(latency: float):
+    """用固定延迟替换上游请求：异步版本让出事件循环，同步版本阻塞线程"""
+    async def achat_completion(self, payload, timeout=None):
+        await asyncio.sleep(latency)
+        return _fake_body()
+
+    def chat_completion(self, payload, timeout=None):
+        time.sleep(latency)
+        return _fake_body()
+
+    LLMClient.achat_completion = achat_completion
+    LLMClient.chat_completion = chat_completion
+
+
+def build_apps():
+    async_app = FastAPI()
+    async_app.include_router(script.router)
+
+    # 旧写法：async 路由中直接调用同步方法
+    blocking_app = FastAPI()
+
+    @blocking_app.post("/script")
+    async def blocking_script(request: script.ScriptRequest):
+        agent = ScriptwriterAgent()
+        return {"script": agent.generate_script(
+            request.topic_title, request.research_summary, use_cache=False
+        )}
+
+    return async_app, blocking_app
+
+
+async def run(app: FastAPI, count: int) -> float:
+    body = {"topic_title": "benchmark", "research_summary": "benchmark", "use_cache": False}
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[client.post("/script", json=body) for _ in range(count)])
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses]
+    return elapsed
+
+
+async def main(count: int, latency: float):
+    patch_upstream(latency)
+    async_app, blocking_app = build_apps()
+
+    single = await run(async_app, 1)
+    parallel = await run(async_app, count)
+    blocking = await run(blocking_app, count)
+
+    print(f"模拟上游延迟: {latency:.2f}s, 并发请求数: {count}")
+    print(f"  单个请求 (async)          : {single:.2f}s")
+    print(f"  {count} 个并发请求 (async)   : {parallel:.2f}s  ({parallel / single:.1f}x 单请求耗时)")
+    print(f"  {count} 个并发请求 (阻塞写法): {blocking:.2f}s  ({blocking / single:.1f}x 单请求耗时)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.latency))
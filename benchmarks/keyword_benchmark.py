@@ -0,0 +1,58 @@
+"""关键词提取基准：Aho-Corasick 自动机的扫描耗时随文本长度线性增长，且与词表大小无关
+
+用法（在项目根目录）：
+    python -m benchmarks.keyword_benchmark --vocab-sizes 13 1000 10000 --lengths 5000 20000 80000
+
+词表与文本均为随机生成的汉字串；对照组是旧写法：对词表中每个词执行一次 `kw in text`。
+"""
+
+import time
+import random
+import argparse
+
+from app.sdk.keyword_extractor import KeywordExtractor
+
+_CJK = [chr(code) for code in range(0x4e00, 0x4e00 + 800)]
+
+
+def random_vocabulary(size: int, rng: random.Random):
+    return [
+        {"keyword": "".join(rng.choices(_CJK, k=rng.randint(2, 4))), "synonyms": []}
+        for _ in range(size)
+    ]
+
+
+def best_of(func, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(vocab_sizes, lengths, seed: int):
+    rng = random.Random(seed)
+    texts = {length: "".join(rng.choices(_CJK, k=length)) for length in lengths}
+
+    print(f"{'词表大小':>8} {'文本长度':>8} {'自动机(ms)':>11} {'ns/字':>8} {'逐词扫描(ms)':>13}")
+    for size in vocab_sizes:
+        entries = random_vocabulary(size, rng)
+        words = [entry["keyword"] for entry in entries]
+        build = best_of(lambda: KeywordExtractor(entries), repeat=1)
+        extractor = KeywordExtractor(entries)
+        for length in lengths:
+            text = texts[length]
+            automaton = best_of(lambda: extractor.find_matches(text))
+            naive = best_of(lambda: [word for word in words if word in text])
+            print(f"{size:>8} {length:>8} {automaton * 1000:>11.2f} {automaton * 1e9 / length:>8.0f} {naive * 1000:>13.2f}")
+        print(f"{'':>8} 构建自动机耗时 {build * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vocab-sizes", type=int, nargs="+", default=[13, 1000, 10000])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[5000, 20000, 80000])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    main(args.vocab_sizes, args.lengths, args.seed)
@@ -11,11 +11,13 @@ setup(
         "python-dotenv==1.0.0",
         "openai==1.3.7",
         "requests==2.31.0",
+        "httpx==0.25.0",
         "google-api-python-client==2.108.0",
         "google-auth-oauthlib==1.1.0",
         "google-auth-httplib2==0.1.1",
         "numpy==1.24.3",
         "pandas==1.5.3",
+        "Pillow==10.0.1",
         "python-jose==3.3.0",
         "passlib==1.7.4",
         "bcrypt==4.0.1",
@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# 从仓库根目录导入 app 包；Agent 构造时只检查这两个变量是否存在，测试中不会真正请求 OpenRouter
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENROUTER_API_KEY", "test-key")
+os.environ.setdefault("OPENROUTER_MODEL", "test-model")
+
+# 进程级单例使用的 SQLite/索引文件放到临时目录，不写入 assets/cache
+_STATE_DIR = tempfile.mkdtemp(prefix="youtube-agent-tests-")
+os.environ.setdefault("RATE_LIMIT_DB", os.path.join(_STATE_DIR, "ratelimit.sqlite3"))
+os.environ.setdefault("PEXELS_CATALOG_DB", os.path.join(_STATE_DIR, "pexels.sqlite3"))
+os.environ.setdefault("CORPUS_INDEX_DB", os.path.join(_STATE_DIR, "corpus.sqlite3"))
+os.environ.setdefault("IMAGE_INDEX_PATH", os.path.join(_STATE_DIR, "image_hashes.npz"))
+os.environ.setdefault("THUMBNAIL_DIR", os.path.join(_STATE_DIR, "thumbnails"))
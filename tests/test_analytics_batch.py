@@ -0,0 +1,53 @@
+import httplib2
+import googleapiclient.errors
+import pytest
+
+from app.sdk.analytics_agent import YOUTUBE_BATCH_MAX_IDS, AnalyticsAgent, chunk_ids
+
+
+def test_chunk_ids_dedups_strips_and_keeps_order():
+    assert chunk_ids([" b", "a", "", None, "b", "  ", "c"], size=2) == [["b", "a"], ["c"]]
+    assert chunk_ids([]) == []
+
+
+def test_two_thousand_ids_make_forty_requests():
+    ids = [f"video{i:04d}" for i in range(2000)]
+    chunks = chunk_ids(ids + ids[:10])
+    assert len(chunks) == 40
+    assert all(len(chunk) == 50 for chunk in chunks)
+    assert [video_id for chunk in chunks for video_id in chunk] == ids
+
+
+@pytest.fixture
+def agent():
+    agent = AnalyticsAgent()
+    agent.youtube_api = object()  # 只要非空即可，请求由 _fetch_video_chunk 的替身返回
+    return agent
+
+
+def test_batch_metrics_isolate_failed_chunks(agent, monkeypatch):
+    ids = [f"v{i:03d}" for i in range(120)]
+    requested = []
+
+    def fetch(chunk):
+        requested.append(list(chunk))
+        if "v050" in chunk:
+            raise googleapiclient.errors.HttpError(httplib2.Response({"status": 403, "reason": "Forbidden"}), b"")
+        return [{"id": video_id, "statistics": {"viewCount": "10"}} for video_id in chunk if video_id != "v119"]
+
+    monkeypatch.setattr(agent, "_fetch_video_chunk", fetch)
+    result = agent.get_batch_performance_metrics(ids)
+
+    assert result["requests"] == 3
+    assert sorted(map(len, requested)) == [20, 50, 50]
+    assert set(result["metrics"]) == {f"v{i:03d}" for i in list(range(50)) + list(range(100, 119))}
+    assert result["metrics"]["v000"]["views"] == 10
+    assert result["errors"]["v050"].startswith("YouTube API请求失败: HTTP 403")
+    assert result["errors"]["v119"] == "未找到ID为v119的视频"
+
+
+def test_batch_metrics_validate_input(agent):
+    with pytest.raises(ValueError):
+        agent.get_batch_performance_metrics([" ", ""])
+    with pytest.raises(ValueError):
+        agent.get_batch_performance_metrics([f"v{i}" for i in range(YOUTUBE_BATCH_MAX_IDS + 1)])
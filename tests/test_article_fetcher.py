@@ -0,0 +1,86 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.sdk import article_fetcher
+from app.sdk.article_fetcher import ArticleFetcher, ArticleStore, extract_main_text
+
+ARTICLE = (
+    "<html><head><title>电池新闻</title><script>var x = 1;</script></head><body>"
+    "<nav>导航 首页 关于</nav><article><h1>宁德时代港股上市</h1>"
+    "<p>宁德时代今日在香港交易所挂牌上市，募资规模创下年内新高，全球投资者踊跃认购。</p>"
+    "<p>分析人士认为，这将加快其海外工厂建设，并进一步巩固其在动力电池领域的领先地位。</p>"
+    "</article><footer>版权所有</footer></body></html>"
+)
+OTHER = ARTICLE.replace("宁德时代今日", "比亚迪今日")
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        PageHandler.requests.append(self.path)
+        if self.path == "/404":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = (OTHER if self.path.startswith("/other") else ARTICLE).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    PageHandler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    return ArticleFetcher(store=ArticleStore(str(tmp_path)), host_interval=0)
+
+
+def test_extract_main_text_prefers_article_and_drops_boilerplate():
+    extracted = extract_main_text(ARTICLE)
+    assert extracted["title"] == "电池新闻"
+    assert "挂牌上市" in extracted["text"]
+    assert "导航" not in extracted["text"]
+    assert "var x" not in extracted["text"]
+
+
+def test_failures_drop_only_the_failing_url(fetcher, server):
+    urls = [f"{server}/a", "http://[::1", "http://exa\x00mple.com/", f"{server}/404", "ftp://example.com/file", f"{server}/other"]
+    docs = fetcher.fetch_documents(urls)
+    assert set(docs) == {f"{server}/a", f"{server}/other"}
+
+
+def test_extraction_error_drops_only_that_url(fetcher, server, monkeypatch):
+    def flaky_extract(html):
+        if "比亚迪" in html:
+            raise RuntimeError("解析失败")
+        return extract_main_text(html)
+
+    monkeypatch.setattr(article_fetcher, "extract_main_text", flaky_extract)
+    docs = fetcher.fetch_documents([f"{server}/a", f"{server}/other"])
+    assert list(docs) == [f"{server}/a"]
+
+
+def test_duplicate_content_is_returned_once_and_cache_is_reused(fetcher, server):
+    docs = fetcher.fetch_documents([f"{server}/a", f"{server}/b", f"{server}/a"])
+    assert len(docs) == 1
+    assert len(PageHandler.requests) == 2
+
+    again = fetcher.fetch_documents([f"{server}/a"])
+    assert again[f"{server}/a"]["text"] == docs[next(iter(docs))]["text"]
+    assert len(PageHandler.requests) == 2
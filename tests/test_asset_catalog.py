@@ -0,0 +1,51 @@
+import pytest
+
+from app.sdk.asset_catalog import PexelsCatalog
+
+
+def video(video_id, width=1920, height=1080, duration=10):
+    return {"id": video_id, "url": f"https://pexels.test/{video_id}", "image": f"https://img.test/{video_id}.jpg",
+            "width": width, "height": height, "duration": duration, "user": {"name": "author"}}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return PexelsCatalog(str(tmp_path / "pexels.sqlite3"), ttl=3600)
+
+
+def test_recorded_search_is_served_in_rank_order(catalog):
+    catalog.record_search("Stock Market", 3, [video(3), video(1), video(2)])
+    assert [v["id"] for v in catalog.videos_for("stock   market")] == [3, 1, 2]
+    assert catalog.videos_for("stock market", limit=2)[1] == video(1)
+    assert catalog.keywords() == ["stock market"]
+
+
+def test_coverage_depends_on_per_page_and_ttl(catalog, tmp_path):
+    catalog.record_search("inflation", 3, [video(1), video(2), video(3)])
+    assert catalog.covers("inflation", 3)
+    assert not catalog.covers("inflation", 5)
+    # Pexels 返回的条数少于请求数时说明没有更多结果，更大的 per_page 也算覆盖
+    catalog.record_search("rare topic", 5, [video(4)])
+    assert catalog.covers("rare topic", 10)
+    assert not catalog.covers("unknown", 1)
+
+    expired = PexelsCatalog(catalog.path, ttl=0)
+    assert not expired.covers("inflation", 3)
+    assert expired.stats() == {"videos": 4, "keywords": 2, "fresh_keywords": 0}
+
+
+def test_latest_search_replaces_keyword_links(catalog):
+    catalog.record_search("gold", 2, [video(1), video(2)])
+    catalog.record_search("gold", 2, [video(3)])
+    assert [v["id"] for v in catalog.videos_for("gold")] == [3]
+    assert catalog.stats()["videos"] == 3
+
+
+def test_size_orientation_and_duration_filters(catalog):
+    catalog.record_search("city", 4, [
+        video(1, 1280, 720, 30), video(2, 1080, 1920, 8), video(3, 3840, 2160, 12), video(4, 1000, 1000, 5),
+    ])
+    assert [v["id"] for v in catalog.videos_for("city", min_width=1920)] == [3]
+    assert [v["id"] for v in catalog.videos_for("city", orientation="portrait")] == [2]
+    assert [v["id"] for v in catalog.videos_for("city", orientation="square")] == [4]
+    assert [v["id"] for v in catalog.videos_for("city", orientation="landscape", max_duration=20)] == [3]
@@ -0,0 +1,86 @@
+import pytest
+
+from app.sdk.corpus_index import CorpusIndex, tokenize
+
+
+def test_cjk_runs_become_overlapping_bigrams():
+    assert tokenize("宁德时代") == ["宁德", "德时", "时代"]
+    assert tokenize("涨") == ["涨"]
+    # 标点分隔的每段汉字单独取二元组，不跨越标点
+    assert tokenize("锂电，储能") == ["锂电", "储能"]
+
+
+def test_words_are_lowercased_and_stopwords_dropped():
+    assert tokenize("The Fed AND the ECB") == ["fed", "ecb"]
+    assert tokenize("GPT-4 v1.5 it's") == ["gpt", "4", "v1.5", "it's"]
+
+
+def test_mixed_and_fullwidth_text():
+    # NFKC 把全角字母数字转为半角
+    assert tokenize("英伟达ＮＶＤＡ财报2024") == ["英伟", "伟达", "财报", "nvda", "2024"]
+    assert tokenize("") == [] and tokenize(None) == []
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = CorpusIndex(str(tmp_path / "corpus.sqlite3"))
+    index.add("a", "宁德时代发布新一代储能电池，宁德时代股价上涨", "article", title="宁德时代新品")
+    index.add("b", "比亚迪公布月度销量，新能源车销量创新高", "article")
+    index.add("c", "储能行业综述：宁德时代与比亚迪的竞争", "snippet")
+    return index
+
+
+def test_bm25_ranks_by_term_frequency_and_reports_coverage(index):
+    results = index.search("宁德时代")
+    assert [r["doc_key"] for r in results] == ["a", "c"]
+    assert results[0]["score"] > results[1]["score"]
+    assert results[0]["coverage"] == 1.0
+
+    partial = index.search("宁德储能汽车", k=1)[0]
+    assert 0 < partial["coverage"] < 1
+
+
+def test_search_filters(index):
+    assert [r["doc_key"] for r in index.search("宁德时代", kinds=["snippet"])] == ["c"]
+    assert index.search("宁德时代", max_age=0) == []
+    assert index.search("，。") == []
+
+
+def test_add_is_incremental(index):
+    assert index.add("b", "比亚迪公布月度销量，新能源车销量创新高", "article") is False
+    assert index.add("b", "比亚迪发布固态电池", "article") is True
+    assert [r["doc_key"] for r in index.search("销量")] == []
+    assert [r["doc_key"] for r in index.search("固态")] == ["b"]
+    assert index.stats()["article"] == 2
+
+
+def test_search_window_filter_and_narrowest_window_wins(tmp_path):
+    index = CorpusIndex(str(tmp_path / "corpus.sqlite3"))
+    index.add("wide", "固态电池量产进度", "snippet", window_months=12)
+    index.add("narrow", "固态电池装车测试", "snippet", window_months=1)
+    index.add("unknown", "固态电池专利", "snippet")
+
+    assert {r["doc_key"] for r in index.search("固态电池")} == {"wide", "narrow", "unknown"}
+    assert {r["doc_key"] for r in index.search("固态电池", max_window=3)} == {"narrow"}
+
+    # 同一内容再次出现在更窄的搜索中时只更新窗口；更宽的窗口不覆盖
+    assert index.add("wide", "固态电池量产进度", "snippet", window_months=2) is False
+    index.add("narrow", "固态电池装车测试", "snippet", window_months=12)
+    assert {r["doc_key"] for r in index.search("固态电池", max_window=3)} == {"wide", "narrow"}
+
+
+def test_existing_index_without_window_column_is_migrated(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE docs (id INTEGER PRIMARY KEY, doc_key TEXT UNIQUE NOT NULL, kind TEXT NOT NULL, title TEXT, "
+        "url TEXT, text TEXT NOT NULL, content_hash TEXT NOT NULL, length INTEGER NOT NULL, added_at REAL NOT NULL)"
+    )
+    conn.commit()
+    conn.close()
+
+    index = CorpusIndex(path)
+    index.add("a", "储能电池", "snippet", window_months=6)
+    assert [r["doc_key"] for r in index.search("储能", max_window=6)] == ["a"]
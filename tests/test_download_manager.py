@@ -0,0 +1,93 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.sdk.download_manager import DownloadManager
+from app.sdk.resilience import UpstreamError, get_policy
+
+BODY = b"x" * 100_000
+ETAG = '"v1"'
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        FileHandler.requests.append((self.path, dict(self.headers)))
+        if self.path == "/missing.jpg":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+
+@pytest.fixture
+def server():
+    FileHandler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_downloads_once_then_reuses_without_network(tmp_path, server):
+    manager = DownloadManager(str(tmp_path))
+    path = manager.download(f"{server}/a.jpg", "a.jpg")
+    assert open(path, "rb").read() == BODY
+    assert manager.entry("a.jpg")["etag"] == ETAG
+
+    # 新实例从清单恢复，文件大小一致时不发请求
+    again = DownloadManager(str(tmp_path)).download(f"{server}/a.jpg", "a.jpg")
+    assert again == path
+    assert len(FileHandler.requests) == 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+
+
+def test_revalidates_with_etag_after_interval(tmp_path, server):
+    manager = DownloadManager(str(tmp_path), revalidate_after=0)
+    manager.download(f"{server}/a.jpg", "a.jpg")
+    manager.download(f"{server}/a.jpg", "a.jpg")
+    assert len(FileHandler.requests) == 2
+    assert FileHandler.requests[1][1].get("If-None-Match") == ETAG
+
+
+def test_redownloads_when_file_size_changed(tmp_path, server):
+    manager = DownloadManager(str(tmp_path))
+    path = manager.download(f"{server}/a.jpg", "a.jpg")
+    with open(path, "wb") as f:
+        f.write(b"truncated")
+    manager.download(f"{server}/a.jpg", "a.jpg")
+    assert open(path, "rb").read() == BODY
+    assert "If-None-Match" not in FileHandler.requests[-1][1]
+
+
+def test_http_error_leaves_no_file(tmp_path, server):
+    manager = DownloadManager(str(tmp_path))
+    with pytest.raises(UpstreamError):
+        manager.download(f"{server}/missing.jpg", "missing.jpg")
+    assert not os.path.exists(tmp_path / "missing.jpg")
+    assert manager.entry("missing.jpg") is None
+
+
+def test_cdn_downloads_use_their_own_unhedged_policy(tmp_path):
+    manager = DownloadManager(str(tmp_path))
+    assert manager.upstream == "pexels_cdn"
+    policy = get_policy("pexels_cdn")
+    assert policy is not get_policy("pexels")
+    assert policy.hedge is False
+    assert policy.deadline >= 60
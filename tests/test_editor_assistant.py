@@ -0,0 +1,77 @@
+import contextvars
+
+import pytest
+
+from app.sdk import metrics
+from app.sdk.editor_assistant import EditorAssistantAgent, split_script
+
+_request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PEXELS_API_KEY", "test-key")
+    agent = EditorAssistantAgent()
+    monkeypatch.setattr(agent, "collapse_duplicates", lambda videos: videos)
+    return agent
+
+
+def test_segment_subtasks_inherit_caller_context(agent, monkeypatch):
+    seen = []
+
+    def search(query, per_page=3, use_catalog=True):
+        seen.append(("search", _request_id.get(), metrics.current_operation()))
+        return [{"id": query, "url": f"https://pexels.test/{query}", "image": "x"}]
+
+    def download(video):
+        seen.append(("download", _request_id.get(), metrics.current_operation()))
+        return f"/tmp/{video['id']}.jpg"
+
+    monkeypatch.setattr(agent, "search_pexels_videos", search)
+    monkeypatch.setattr(agent, "download_thumbnail", download)
+
+    token = _request_id.set("req-1")
+    try:
+        result = agent.recommend_assets_for_segment("美联储宣布加息，通胀与就业数据")
+    finally:
+        _request_id.reset(token)
+
+    assert result["pexels_results"]
+    assert {kind for kind, _, _ in seen} == {"search", "download"}
+    for _, request_id, operation in seen:
+        assert request_id == "req-1"
+        assert operation == ("EditorAssistantAgent", "recommend_assets_for_segment")
+
+
+def test_split_script_packs_sentences_up_to_max_chars():
+    script = "第一句话。第二句话！第三句话？\n\n  \n另一段。"
+    assert split_script(script, max_chars=10) == ["第一句话。第二句话！", "第三句话？", "另一段。"]
+    assert split_script(script, max_chars=100) == ["第一句话。第二句话！第三句话？", "另一段。"]
+    assert split_script(" \n\n") == []
+
+
+def test_script_timeline_keeps_going_when_a_segment_fails(agent, monkeypatch):
+    def recommend(text):
+        if "失败" in text:
+            raise RuntimeError("Pexels 不可用")
+        return {
+            "keywords": ["加息"],
+            "keyword_matches": [],
+            "pexels_results": [{"keyword": "加息", "title": "a", "thumbnail": None},
+                               {"keyword": "加息", "title": "b", "thumbnail": None}],
+            "ai_image_prompt": {"prompt": "p"},
+        }
+
+    monkeypatch.setattr(agent, "recommend_assets_for_segment", recommend)
+    result = agent.recommend_assets_for_script("美联储加息。\n这一段会失败。\n通胀回落。", chars_per_second=2)
+
+    segments = result["segments"]
+    assert [s["index"] for s in segments] == [0, 1, 2]
+    assert segments[1]["error"] == "Pexels 不可用"
+    assert segments[1]["pexels_results"] == []
+    assert "error" not in segments[0] and "error" not in segments[2]
+    # 失败片段仍占据时间线上的时长，但没有素材标记
+    assert segments[1]["start"] == segments[0]["end"] and segments[2]["start"] == segments[1]["end"]
+    assert [m["segment"] for m in result["markers"]] == [0, 0, 2, 2]
+    assert result["total_duration"] == segments[2]["end"]
@@ -0,0 +1,52 @@
+from app.sdk.keyword_extractor import EDITOR_KEYWORDS_FILE, AhoCorasick, KeywordExtractor, get_keyword_extractor
+
+ENTRIES = [
+    {"keyword": "新能源汽车", "search": "electric vehicle", "synonyms": ["电动车", "EV"]},
+    {"keyword": "能源", "search": "energy"},
+    {"keyword": "人工智能", "synonyms": ["AI"], "category": "科技"},
+    {"keyword": "芯片", "synonyms": ["半导体"]},
+]
+
+
+def test_automaton_reports_overlapping_and_nested_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    found = sorted((start, end, automaton.patterns[i]) for start, end, i in automaton.iter_matches("ushers"))
+    assert found == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+    assert list(AhoCorasick([]).iter_matches("abc")) == []
+
+
+def test_automaton_follows_failure_links_across_cjk():
+    automaton = AhoCorasick(["能源", "新能源汽车", "汽车"])
+    found = sorted((start, end) for start, end, _ in automaton.iter_matches("新能源车和新能源汽车"))
+    assert found == [(1, 3), (5, 10), (6, 8), (8, 10)]
+
+
+def test_leftmost_longest_without_overlaps():
+    extractor = KeywordExtractor(ENTRIES)
+    matches = extractor.find_matches("新能源汽车与能源")
+    assert [(m["keyword"], m["start"], m["end"]) for m in matches] == [("新能源汽车", 0, 5), ("能源", 6, 8)]
+    overlapping = extractor.find_matches("新能源汽车", overlapping=True)
+    assert {m["keyword"] for m in overlapping} == {"新能源汽车", "能源"}
+
+
+def test_ascii_synonyms_need_word_boundaries_and_ignore_width_and_case():
+    extractor = KeywordExtractor(ENTRIES)
+    assert extractor.find_matches("He said nothing") == []
+    matches = extractor.find_matches("ＡＩ芯片和ev")
+    assert [(m["keyword"], m["surface"]) for m in matches] == [("人工智能", "ＡＩ"), ("芯片", "芯片"), ("新能源汽车", "ev")]
+
+
+def test_extract_groups_synonyms_and_ranks_by_count():
+    extractor = KeywordExtractor(ENTRIES)
+    result = extractor.extract("芯片短缺。半导体产业与AI，芯片价格上涨")
+    assert [(item["keyword"], item["count"]) for item in result] == [("芯片", 3), ("人工智能", 1)]
+    assert result[0]["positions"][1] == [5, 8]
+    assert result[0]["search"] == "芯片" and result[1]["category"] == "科技"
+    assert len(extractor.extract("芯片与AI", limit=1)) == 1
+
+
+def test_shipped_keyword_file_loads_from_any_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    extractor = get_keyword_extractor(EDITOR_KEYWORDS_FILE)
+    assert len(extractor) > 0
+    assert extractor.extract("中方表示")[0]["keyword"] == "中国"
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from app.sdk import llm_cache
+from app.sdk.llm_cache import LLMCache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache, "time", clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    return LLMCache(cache_dir=str(tmp_path / "llm"), **{"max_entries": 2, "max_disk_bytes": 10**6, "enabled": True, **kwargs})
+
+
+def test_key_depends_only_on_request_content():
+    payload = {"model": "m", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.2, "max_tokens": 10}
+    key = LLMCache.make_key(payload)
+    assert key == LLMCache.make_key({**payload, "stream": True})
+    assert key != LLMCache.make_key({**payload, "temperature": 0.3})
+    assert key != LLMCache.make_key({**payload, "response_format": {"type": "json_object"}})
+
+
+def test_ttl_expiry_in_memory_and_on_disk(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.set("k", {"text": "v"}, ttl=60)
+    cache.set("never", {"text": "v"}, ttl=0)
+    assert cache.get("k") == {"text": "v"}
+    assert cache.get("never") is None
+
+    clock.now += 61
+    assert cache.get("k") is None
+    # 过期的磁盘文件在读取时删除
+    assert not os.path.exists(cache._path("k"))
+    assert cache.stats()["disk_bytes"] == 0
+
+
+def test_memory_lru_evicts_least_recently_used_and_falls_back_to_disk(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.set("a", {"n": 1}, ttl=60)
+    cache.set("b", {"n": 2}, ttl=60)
+    cache.get("a")
+    cache.set("c", {"n": 3}, ttl=60)
+
+    assert list(cache._memory) == ["a", "c"]
+    assert cache.get("b") == {"n": 2}
+    stats = cache.stats()
+    assert stats["evictions"] == 2 and stats["disk_hits"] == 1 and stats["memory_entries"] == 2
+
+
+def test_disk_entries_survive_a_new_instance(tmp_path, clock):
+    make_cache(tmp_path).set("k", {"text": "v"}, ttl=60)
+    fresh = make_cache(tmp_path)
+    assert fresh.stats()["disk_bytes"] > 0
+    assert fresh.get("k") == {"text": "v"}
+    fresh.delete("k")
+    assert make_cache(tmp_path).get("k") is None
+
+
+def test_disk_usage_is_capped(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=100)
+    cache.set("probe", {"text": "x" * 100}, ttl=60)
+    size = cache.stats()["disk_bytes"]
+    cache.clear()
+
+    cache = make_cache(tmp_path, max_entries=100, max_disk_bytes=size * 3)
+    for i in range(5):
+        cache.set(f"k{i}", {"text": "x" * 100}, ttl=60)
+    assert cache.stats()["disk_bytes"] <= size * 3
+    assert len([name for name in os.listdir(cache.cache_dir) if name.endswith(".json")]) == 3
+
+
+def test_ttl_per_agent(monkeypatch):
+    assert LLMCache.ttl_for("AnalyticsAgent") == 600
+    assert LLMCache.ttl_for("UnknownAgent") == llm_cache.DEFAULT_TTL
+    monkeypatch.setenv("LLM_CACHE_TTL_ANALYTICSAGENT", "0")
+    assert LLMCache.ttl_for("AnalyticsAgent") == 0
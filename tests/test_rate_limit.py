@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from app.sdk.rate_limit import RateLimiter, TokenBucketStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TokenBucketStore(str(tmp_path / "ratelimit.sqlite3"))
+
+
+def test_burst_is_granted_without_waiting(store):
+    waits = [store.reserve("serper", rate=0.001, burst=3.0, max_wait=0) for _ in range(3)]
+    assert waits == [0.0, 0.0, 0.0]
+    assert store.snapshot()["serper"] == pytest.approx(0.0, abs=1e-3)
+
+
+def test_empty_bucket_queues_at_refill_rate(store):
+    store.reserve("serper", rate=2.0, burst=1.0, max_wait=10)
+    assert store.reserve("serper", rate=2.0, burst=1.0, max_wait=10) == pytest.approx(0.5, abs=0.05)
+    # 预约成功的排队请求允许令牌数为负，后来者排在它后面
+    assert store.reserve("serper", rate=2.0, burst=1.0, max_wait=10) == pytest.approx(1.0, abs=0.05)
+
+
+def test_reservation_beyond_max_wait_is_rejected_without_consuming(store):
+    store.reserve("pexels", rate=1.0, burst=1.0, max_wait=0)
+    before = store.snapshot()["pexels"]
+    assert store.reserve("pexels", rate=1.0, burst=1.0, max_wait=0.5) is None
+    assert store.snapshot()["pexels"] == before
+    assert store.reserve("pexels", rate=1.0, burst=1.0, max_wait=5) == pytest.approx(1.0, abs=0.05)
+
+
+def test_buckets_are_shared_across_store_instances(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    worker_a, worker_b = TokenBucketStore(path), TokenBucketStore(path)
+    assert worker_a.reserve("youtube", rate=0.01, burst=2.0, max_wait=0) == 0.0
+    assert worker_b.reserve("youtube", rate=0.01, burst=2.0, max_wait=0) == 0.0
+    assert worker_a.reserve("youtube", rate=0.01, burst=2.0, max_wait=0) is None
+    assert worker_b.reserve("other", rate=0.01, burst=2.0, max_wait=0) == 0.0
+
+
+def test_limiter_sleeps_for_the_reserved_wait(store):
+    limiter = RateLimiter("openrouter", rate=20.0, burst=1.0, max_wait=1.0, store=store)
+    assert limiter.acquire() == 0.0
+    started = time.monotonic()
+    wait = limiter.acquire()
+    assert wait == pytest.approx(0.05, abs=0.02)
+    assert time.monotonic() - started >= wait * 0.9
+    # 调用方给出的 max_wait 比限流器配置更严格时以调用方为准
+    assert limiter.acquire(max_wait=0.01) is None
+
+
+def test_async_acquire(store):
+    limiter = RateLimiter("openrouter", rate=20.0, burst=1.0, max_wait=1.0, store=store)
+
+    async def run():
+        return [await limiter.aacquire(), await limiter.aacquire()]
+
+    first, second = asyncio.run(run())
+    assert first == 0.0
+    assert second == pytest.approx(0.05, abs=0.02)
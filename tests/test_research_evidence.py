@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.sdk import research_agent
+from app.sdk.corpus_index import CorpusIndex
+from app.sdk.research_agent import ResearchAgent
+
+TOPIC = "固态电池"
+
+
+def search_results(prefix):
+    return [
+        {"title": f"{TOPIC} 报道 {i}", "link": f"https://news{i}.test/{prefix}", "snippet": f"{TOPIC}最新进展 {i}"}
+        for i in range(research_agent.RESEARCH_LOCAL_MIN_HITS)
+    ]
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setenv("SERPER_API_KEY", "test-key")
+    agent = ResearchAgent()
+    agent.corpus_index = CorpusIndex(str(tmp_path / "corpus.sqlite3"))
+    agent.searches = []
+
+    def collect(topic, time_range, use_cache, mode):
+        agent.searches.append(time_range)
+        return search_results(f"m{time_range}")
+
+    async def acollect(topic, time_range, use_cache, mode):
+        return collect(topic, time_range, use_cache, mode)
+
+    monkeypatch.setattr(agent, "_collect_articles", collect)
+    monkeypatch.setattr(agent, "_acollect_articles", acollect)
+    return agent
+
+
+def test_local_evidence_is_reused_only_within_the_requested_window(agent):
+    # 第一次外部搜索：Serper 的时间窗口放宽到 12 个月，收录的摘要记为 12 个月窗口
+    agent._gather_evidence(TOPIC, 1, True, "single", fetch_content=False)
+    assert agent.searches == [1]
+
+    # 请求 1 个月：本地摘要来自 12 个月窗口的搜索，时效不够，仍然外部搜索
+    agent._gather_evidence(TOPIC, 1, True, "single", fetch_content=False)
+    assert agent.searches == [1, 1]
+
+    # 请求 12 个月：本地摘要的窗口不超过请求范围，直接复用
+    articles = agent._gather_evidence(TOPIC, 12, True, "single", fetch_content=False)
+    assert agent.searches == [1, 1]
+    assert len(articles) == research_agent.RESEARCH_LOCAL_MIN_HITS
+
+
+def test_async_evidence_applies_the_same_window(agent):
+    async def gather(time_range):
+        return await agent._agather_evidence(TOPIC, time_range, True, "single", False)
+
+    asyncio.run(gather(24))
+    asyncio.run(gather(6))
+    # 6 个月的请求不能复用 24 个月窗口的结果
+    assert agent.searches == [24, 6]
+    assert agent._local_evidence(TOPIC, 24)
@@ -0,0 +1,238 @@
+import asyncio
+
+import pytest
+
+from app.sdk.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RateLimitedError,
+    UpstreamError,
+    UpstreamPolicy,
+    is_retryable,
+)
+
+
+class RejectingLimiter:
+    """排队时间总是超限的令牌桶"""
+
+    max_wait = 1.0
+
+    def acquire(self, max_wait=None):
+        return None
+
+    async def aacquire(self, max_wait=None):
+        return None
+
+
+def make_policy(**kwargs):
+    options = {"deadline": 5.0, "max_attempts": 3, "base_delay": 0.0, "max_delay": 0.0}
+    options.update(kwargs)
+    return UpstreamPolicy("test", **options)
+
+
+def open_breaker(policy):
+    """让熔断器进入 open 状态且冷却期已过，下一个请求即为探测请求"""
+    policy.breaker.reset_timeout = 0.0
+    for _ in range(policy.breaker.failure_threshold):
+        policy.breaker.record_failure()
+    assert policy.breaker.state == "open"
+
+
+def failing(status):
+    def func(timeout):
+        raise UpstreamError("boom", upstream="test", status_code=status)
+    return func
+
+
+# === CircuitBreaker ===
+def test_breaker_opens_after_threshold_and_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.is_open()
+
+    assert breaker.acquire() is True
+    assert breaker.state == "half_open"
+    assert breaker.acquire() is None  # 探测请求未返回前拒绝其他请求
+
+
+def test_breaker_probe_failure_reopens_and_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    breaker.acquire()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    breaker.acquire()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.acquire() is False
+
+
+def test_release_probe_only_affects_unsettled_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.release_probe()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    breaker.acquire()
+    breaker.release_probe()
+    assert breaker.state == "open"
+    assert breaker.acquire() is True  # 冷却期已过，可立即重新探测
+
+
+def test_is_open_does_not_consume_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert breaker.is_open()
+    assert breaker.state == "open"
+
+
+# === UpstreamPolicy.call ===
+def test_rate_limited_probe_does_not_wedge_breaker():
+    policy = make_policy(limiter=RejectingLimiter())
+    open_breaker(policy)
+
+    with pytest.raises(RateLimitedError):
+        policy.call(lambda timeout: "ok")
+    assert policy.breaker.state == "open"
+
+    assert policy.call(lambda timeout: "ok", limit=False) == "ok"
+    assert policy.breaker.state == "closed"
+
+
+def test_async_rate_limited_probe_does_not_wedge_breaker():
+    policy = make_policy(limiter=RejectingLimiter())
+    open_breaker(policy)
+
+    async def ok(timeout):
+        return "ok"
+
+    async def run():
+        with pytest.raises(RateLimitedError):
+            await policy.acall(ok)
+        assert policy.breaker.state == "open"
+        return await policy.acall(ok, limit=False)
+
+    assert asyncio.run(run()) == "ok"
+    assert policy.breaker.state == "closed"
+
+
+def test_cancelled_async_probe_releases_breaker():
+    policy = make_policy()
+    open_breaker(policy)
+
+    async def hang(timeout):
+        await asyncio.sleep(10)
+
+    async def run():
+        task = asyncio.ensure_future(policy.acall(hang))
+        await asyncio.sleep(0.05)
+        assert policy.breaker.state == "half_open"
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert policy.breaker.state == "open"
+    assert policy.breaker.acquire() is True
+
+
+def test_retries_transient_errors_then_succeeds():
+    policy = make_policy()
+    calls = []
+
+    def flaky(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise UpstreamError("busy", upstream="test", status_code=503)
+        return "ok"
+
+    assert policy.call(flaky) == "ok"
+    assert len(calls) == 3
+    assert policy.breaker.state == "closed"
+
+
+def test_retry_stops_when_breaker_opens_without_taking_probe():
+    policy = make_policy(failure_threshold=1, reset_timeout=0.0)
+    calls = []
+
+    def func(timeout):
+        calls.append(timeout)
+        raise UpstreamError("busy", upstream="test", status_code=503)
+
+    with pytest.raises(UpstreamError):
+        policy.call(func)
+    assert len(calls) == 1
+    assert policy.breaker.state == "open"  # 重试判断不应把 open 转为 half_open
+
+
+def test_non_retryable_error_is_raised_immediately_and_counts_as_reachable():
+    policy = make_policy(failure_threshold=1)
+    calls = []
+
+    def func(timeout):
+        calls.append(timeout)
+        raise UpstreamError("not found", upstream="test", status_code=404)
+
+    with pytest.raises(UpstreamError):
+        policy.call(func)
+    assert len(calls) == 1
+    assert policy.breaker.state == "closed"
+
+
+def test_local_errors_do_not_reset_failure_count():
+    policy = make_policy(failure_threshold=2)
+    policy.breaker.record_failure()
+
+    def garbage_body(timeout):
+        raise KeyError("choices")
+
+    with pytest.raises(KeyError):
+        policy.call(garbage_body)
+    assert policy.breaker._failures == 1
+    policy.breaker.record_failure()
+    assert policy.breaker.is_open()
+
+
+@pytest.mark.parametrize("run", ["sync", "async"])
+def test_local_error_on_probe_keeps_breaker_open(run):
+    policy = make_policy()
+    open_breaker(policy)
+
+    def broken(timeout):
+        raise ValueError("Expecting value")
+
+    async def abroken(timeout):
+        raise ValueError("Expecting value")
+
+    with pytest.raises(ValueError):
+        if run == "sync":
+            policy.call(broken)
+        else:
+            asyncio.run(policy.acall(abroken))
+    # 探测没有得到上游的有效响应：不关闭熔断器，探测名额归还给下一个请求
+    assert policy.breaker.state == "open"
+    assert policy.breaker.acquire() is True
+
+
+def test_open_breaker_rejects_without_calling():
+    policy = make_policy(failure_threshold=1, reset_timeout=60.0)
+    policy.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        policy.call(lambda timeout: pytest.fail("不应发出请求"))
+
+
+def test_is_retryable_classification():
+    assert is_retryable(UpstreamError("x", status_code=429))
+    assert is_retryable(UpstreamError("x", status_code=502))
+    assert not is_retryable(UpstreamError("x", status_code=400))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(CircuitOpenError("x"))
+    assert not is_retryable(ValueError())
+
+
+def test_backoff_honours_retry_after_up_to_max_delay():
+    policy = make_policy(max_delay=8.0)
+    assert policy._backoff(1, UpstreamError("x", retry_after=3)) == 3
+    assert policy._backoff(1, UpstreamError("x", retry_after=30)) == 8.0
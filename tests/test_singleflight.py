@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.sdk.llm_cache import LLMCache
+from app.sdk.llm_client import LLMClient
+from app.sdk.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight, calls, gate = SingleFlight(), [], threading.Event()
+
+    def slow():
+        calls.append(1)
+        gate.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(flight.do, "k", slow) for _ in range(8)]
+        while flight.in_flight() == 0:
+            time.sleep(0.001)
+        time.sleep(0.1)
+        gate.set()
+        assert [f.result() for f in futures] == ["result"] * 8
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+    # 调用结束后不再合并
+    assert flight.do("k", lambda: "again") == "again"
+
+
+def test_errors_are_shared_and_not_remembered():
+    flight, gate = SingleFlight(), threading.Event()
+
+    def fail():
+        gate.wait(5)
+        raise RuntimeError("upstream down")
+
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(flight.do, "k", fail) for _ in range(2)]
+        time.sleep(0.1)
+        gate.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="upstream down"):
+                future.result()
+    assert flight.do("k", lambda: "ok") == "ok"
+
+
+def test_async_waiters_survive_one_caller_cancelling():
+    flight, calls = SingleFlight(), []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        first = asyncio.create_task(flight.ado("k", fetch))
+        second = asyncio.create_task(flight.ado("k", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "result"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return flight.in_flight()
+
+    assert asyncio.run(run()) == 0
+    assert len(calls) == 1
+
+
+@pytest.fixture
+def client(tmp_path):
+    return LLMClient("test-key", cache=LLMCache(cache_dir=str(tmp_path / "llm"), enabled=True))
+
+
+def reply(text):
+    return {"choices": [{"message": {"content": text}}]}
+
+
+def test_llm_client_coalesces_and_then_serves_from_cache(client, monkeypatch):
+    calls, gate = [], threading.Event()
+
+    def fetch(payload, timeout, agent):
+        calls.append(payload["messages"][0]["content"])
+        gate.wait(5)
+        return reply("answer")
+
+    monkeypatch.setattr(client, "_fetch", fetch)
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(client.complete, "m", "prompt", agent="ResearchAgent") for _ in range(4)]
+        time.sleep(0.1)
+        gate.set()
+        assert [f.result() for f in futures] == ["answer"] * 4
+    assert calls == ["prompt"]
+
+    assert client.complete("m", "prompt", agent="ResearchAgent") == "answer"
+    assert calls == ["prompt"]
+    # use_cache=False 既不读缓存也不参与合并
+    assert client.complete("m", "prompt", agent="ResearchAgent", use_cache=False) == "answer"
+    assert len(calls) == 2
+
+
+def test_llm_client_async_coalescing(client, monkeypatch):
+    calls = []
+
+    async def afetch(payload, timeout, agent):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return reply("answer")
+
+    monkeypatch.setattr(client, "_afetch", afetch)
+
+    async def run():
+        return await asyncio.gather(*(client.acomplete("m", "prompt", agent="ResearchAgent") for _ in range(5)))
+
+    assert asyncio.run(run()) == ["answer"] * 5
+    assert len(calls) == 1
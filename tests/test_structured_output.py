@@ -0,0 +1,194 @@
+import asyncio
+import json
+
+import pytest
+
+from app.sdk.structured_output import (
+    IncrementalJSONParser,
+    SchemaValidationError,
+    agenerate_structured,
+    astream_structured,
+    generate_structured,
+    parse_json,
+    validate,
+)
+from app.sdk.publishing_agent import SEO_METADATA_SCHEMA
+from app.sdk.thumbnail_agent import THUMBNAIL_DESIGN_SCHEMA, DEFAULT_ASSET_SUGGESTIONS, ThumbnailAgent
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string", "minLength": 1},
+        "tags": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+        "count": {"type": "integer"},
+        "style": {"type": "string", "enum": ["left", "right"]},
+    },
+    "required": ["title", "tags"],
+    "additionalProperties": False,
+}
+
+
+# === validate ===
+def test_validate_accepts_valid_instance():
+    assert validate({"title": "t", "tags": ["a"], "count": 1, "style": "left"}, SCHEMA) == []
+
+
+@pytest.mark.parametrize("instance, fragment", [
+    ({"tags": ["a"]}, "缺少字段 title"),
+    ({"title": "", "tags": ["a"]}, "长度至少为 1"),
+    ({"title": "t", "tags": []}, "至少需要 1 项"),
+    ({"title": "t", "tags": [1]}, "$.tags[0]"),
+    ({"title": "t", "tags": ["a"], "count": True}, "$.count"),
+    ({"title": "t", "tags": ["a"], "style": "top"}, "取值应为"),
+    ({"title": "t", "tags": ["a"], "extra": 1}, "不允许的字段 extra"),
+    ([], "应为 object"),
+])
+def test_validate_reports_errors(instance, fragment):
+    errors = validate(instance, SCHEMA)
+    assert any(fragment in error for error in errors), errors
+
+
+def test_additional_properties_schema_validates_extra_values():
+    schema = {"type": "object", "additionalProperties": {"type": "integer"}}
+    assert validate({"a": 1}, schema) == []
+    assert validate({"a": "x"}, schema) == ["$.a: 应为 integer，实际为 str"]
+
+
+@pytest.mark.parametrize("schema", [THUMBNAIL_DESIGN_SCHEMA, SEO_METADATA_SCHEMA])
+def test_agent_schemas_are_strict_mode_compatible(schema):
+    """strict 模式要求每个对象都列出全部必填字段且禁止额外字段"""
+    def walk(node):
+        if node.get("type") == "object":
+            assert node.get("additionalProperties") is False
+            assert set(node["required"]) == set(node["properties"])
+            for child in node["properties"].values():
+                walk(child)
+        if node.get("type") == "array":
+            walk(node["items"])
+    walk(schema)
+
+
+# === parse_json ===
+def test_parse_json_strips_fences_and_trailing_text():
+    assert parse_json('```json\n{"a": 1}\n```') == {"a": 1}
+    assert parse_json('好的，结果如下：{"a": [1, 2]} 以上。') == {"a": [1, 2]}
+    with pytest.raises(ValueError):
+        parse_json("没有 JSON")
+
+
+# === IncrementalJSONParser ===
+DOC = {"title": "引号\"与\\反斜杠\n", "tags": ["a", "中"], "n": -12.5e1, "ok": True, "none": None,
+       "nested": {"list": [{"x": []}], "empty": {}}}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_parser_matches_json_loads_for_any_chunking(chunk_size):
+    text = "```json\n" + json.dumps(DOC, ensure_ascii=True) + "\n``` 尾部文本 {\"ignored\": 1}"
+    parser = IncrementalJSONParser()
+    events = []
+    for i in range(0, len(text), chunk_size):
+        events.extend(parser.feed(text[i:i + chunk_size]))
+    assert parser.done
+    assert parser.value == DOC
+    paths = dict(events)
+    assert paths[("title",)] == DOC["title"]
+    assert paths[("tags", 1)] == "中"
+    assert paths[("nested", "list", 0, "x")] == []
+    assert ("ignored",) not in paths
+
+
+def test_parser_emits_fields_as_soon_as_they_close():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"title": "Hel') == []
+    assert parser.feed('lo", "tags": ["a"') == [(("title",), "Hello"), (("tags", 0), "a")]
+    assert parser.value == {"title": "Hello", "tags": ["a"]}
+    assert parser.feed(', "b"]') == [(("tags", 1), "b"), (("tags",), ["a", "b"])]
+    assert not parser.done
+    parser.feed("}")
+    assert parser.done
+
+
+def test_parser_number_closed_by_next_token():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"n": 12') == []
+    assert parser.feed("3}") == [(("n",), 123)]
+
+
+@pytest.mark.parametrize("text", ['{"a": 1]', '{"a" 1}', '{"a": tru}', '{"a": 1,, "b": 2}', '{1: 2}'])
+def test_parser_rejects_invalid_json(text):
+    with pytest.raises(ValueError):
+        IncrementalJSONParser().feed(text)
+
+
+# === 生成与重试 ===
+class FakeLLM:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+        self.evicted = []
+
+    def complete(self, model, prompt, **kwargs):
+        assert kwargs["response_format"]["json_schema"]["strict"] is True
+        self.prompts.append(prompt)
+        return self.replies.pop(0)
+
+    async def acomplete(self, model, prompt, **kwargs):
+        return self.complete(model, prompt, **kwargs)
+
+    async def astream_complete(self, model, prompt, **kwargs):
+        text = self.complete(model, prompt, **kwargs)
+        for i in range(0, len(text), 4):
+            yield text[i:i + 4]
+
+    def evict(self, model, prompt, **kwargs):
+        self.evicted.append(prompt)
+
+
+VALID = json.dumps({"title": "t", "tags": ["a"]})
+
+
+def test_valid_output_is_not_retried():
+    llm = FakeLLM([VALID])
+    assert generate_structured(llm, "m", "p", SCHEMA, "test") == {"title": "t", "tags": ["a"]}
+    assert len(llm.prompts) == 1 and llm.evicted == []
+
+
+def test_schema_failure_retries_with_errors_and_evicts_cache():
+    llm = FakeLLM(['{"title": "t", "tags": ["a"], "extra": 1}', VALID])
+    assert generate_structured(llm, "m", "p", SCHEMA, "test")["title"] == "t"
+    assert llm.evicted == [llm.prompts[0]]
+    assert "不允许的字段 extra" in llm.prompts[1]
+
+
+def test_gives_up_after_max_attempts():
+    llm = FakeLLM(["not json", "{}"])
+    with pytest.raises(SchemaValidationError) as info:
+        generate_structured(llm, "m", "p", SCHEMA, "test", max_attempts=2)
+    assert "缺少字段 title" in str(info.value)
+    assert len(llm.evicted) == 2
+
+
+def test_async_generation_retries():
+    llm = FakeLLM(["{}", VALID])
+    assert asyncio.run(agenerate_structured(llm, "m", "p", SCHEMA, "test"))["tags"] == ["a"]
+
+
+def test_stream_emits_fields_then_result():
+    async def collect(llm):
+        return [event async for event in astream_structured(llm, "m", "p", SCHEMA, "test")]
+
+    events = asyncio.run(collect(FakeLLM([VALID])))
+    assert events[0] == {"event": "field", "path": ["title"], "value": "t"}
+    assert events[-1] == {"event": "result", "data": {"title": "t", "tags": ["a"]}}
+
+    events = asyncio.run(collect(FakeLLM(['{"title": "t"}', VALID])))
+    assert [event["event"] for event in events][-2:] == ["retry", "result"]
+
+
+# === 缩略图素材建议 ===
+def test_asset_suggestions_read_visual_elements():
+    agent = ThumbnailAgent()
+    design = {"visual_elements": {"image_assets": ["工厂航拍", " "], "icons": ["电池图标", "工厂航拍"], "effects": []}}
+    assert agent.get_asset_suggestions(design) == ["工厂航拍", "电池图标"]
+    assert agent.get_asset_suggestions(json.dumps(design)) == ["工厂航拍", "电池图标"]
+    assert agent.get_asset_suggestions("无法解析") == DEFAULT_ASSET_SUGGESTIONS
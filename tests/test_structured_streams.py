@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from app.sdk import metrics, publishing_agent, thumbnail_agent
+
+
+async def fake_stream(llm, model, prompt, schema, name, agent=None, use_cache=True):
+    yield {"event": "field", "operation": metrics.current_operation()}
+
+
+@pytest.mark.parametrize("module, cls, method, args", [
+    (thumbnail_agent, "ThumbnailAgent", "astream_thumbnail_design", ("标题", "脚本")),
+    (publishing_agent, "PublishingAgent", "astream_seo_metadata", ("标题", "简介", "字幕")),
+])
+def test_structured_streams_are_instrumented(monkeypatch, module, cls, method, args):
+    monkeypatch.setattr(module, "astream_structured", fake_stream)
+    agent = getattr(module, cls)()
+
+    async def run():
+        return [event async for event in getattr(agent, method)(*args)]
+
+    events = asyncio.run(run())
+    # 上游调用在被装饰方法内执行，带上该 Agent 方法的标签
+    assert [event["operation"] for event in events] == [(cls, method)]
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api import thumbnail
+from app.sdk.thumbnail_renderer import (
+    CANVAS_SIZE, LAYOUTS, PRESET_PALETTES, build_variants, palettes_from_design, render_thumbnail,
+)
+
+
+def test_variants_rotate_layouts_and_palettes():
+    specs = build_variants("标题", backgrounds=[None], count=6)
+    assert [spec["layout"] for spec in specs[:4]] == list(LAYOUTS)
+    assert specs[4]["palette"] != specs[0]["palette"]
+    assert len({(s["layout"], s["palette"]["background"]) for s in specs}) == 6
+
+
+def test_unknown_layout_is_rejected():
+    with pytest.raises(ValueError, match="diagonal"):
+        build_variants("标题", layouts=["left", "diagonal"])
+    with pytest.raises(ValueError, match="不支持的布局"):
+        render_thumbnail({"title": "标题", "layout": "diagonal"}, "unused.png")
+
+
+def test_render_without_layout_defaults_to_left(tmp_path):
+    path = render_thumbnail({"title": "宁德时代 Q3 财报"}, str(tmp_path / "thumb.png"))
+    with Image.open(path) as image:
+        assert image.size == CANVAS_SIZE
+
+
+def test_render_route_returns_400_for_unknown_layout():
+    app = FastAPI()
+    app.include_router(thumbnail.router)
+    response = TestClient(app).post("/thumbnail/render", json={"title": "标题", "layouts": ["diagonal"]})
+    assert response.status_code == 400
+    assert "diagonal" in response.json()["detail"]
+
+
+def test_schema_palette_is_mapped_by_role():
+    design = {"palette": {"primary": "#e63946", "secondary": "#457B9D", "text": "#111111", "background": "#FFFFFF"}}
+    expected = {"background": "#FFFFFF", "primary": "#111111", "accent": "#E63946"}
+    assert palettes_from_design(design)[0] == expected
+    assert palettes_from_design(json.dumps(design))[0] == expected
+    assert palettes_from_design(design)[1:] == PRESET_PALETTES
+
+
+def test_free_text_design_falls_back_to_luma_ranking():
+    text = "主色 #E63946，文字 #111111，背景 #FFFFFF"
+    assert palettes_from_design(text)[0] == {"background": "#111111", "primary": "#FFFFFF", "accent": "#E63946"}
+    # palette 不符合 Schema 时同样按亮度分配
+    loose = {"palette": {"primary": "#E63946", "text": "#111111", "background": "#FFFFFF"}}
+    assert palettes_from_design(loose)[0]["background"] == "#111111"
+    assert palettes_from_design(None) == PRESET_PALETTES
@@ -0,0 +1,76 @@
+import csv
+import io
+import xml.etree.ElementTree as ET
+from fractions import Fraction
+
+import pytest
+
+from app.sdk.timeline_export import (
+    _fcpx_time, format_srt_time, format_timecode, frame_rate, iter_export, markers_from_assets,
+)
+
+MARKERS = [
+    {"start": 0, "end": 2.5, "keyword": "芯片", "title": "chip", "ai_image_prompt": "p"},
+    {"start": 2.5, "end": 61, "keyword": 'A&B "x"', "title": "<b>", "ai_image_prompt": "p"},
+]
+
+
+def test_ntsc_rates_are_exact_rationals():
+    assert frame_rate(29.97) == Fraction(30000, 1001)
+    assert frame_rate(23.976) == Fraction(24000, 1001)
+    assert frame_rate(25) == 25
+    with pytest.raises(ValueError):
+        frame_rate(0)
+
+
+def test_timecodes_count_real_frames_at_nominal_rate():
+    assert format_timecode(0) == "00:00:00:00"
+    assert format_timecode(1.04, 25) == "00:00:01:01"
+    assert format_timecode(90061, 25) == "25:01:01:00"
+    # 非丢帧时间码：NTSC 下一小时实际时长显示为 00:59:56:12
+    assert format_timecode(3600, 29.97) == "00:59:56:12"
+    assert format_timecode(60, 23.976) == "00:00:59:23"
+    assert format_srt_time(3725.5) == "01:02:05,500"
+
+
+def test_fcpxml_time_is_frame_aligned():
+    assert _fcpx_time(0.04, 25) == "1/25s"
+    assert _fcpx_time(2, 25) == "2s"
+    assert _fcpx_time(1, 29.97) == "1001/1000s"
+    assert _fcpx_time(1, 23.976) == "1001/1000s"
+    assert _fcpx_time(0.01, 25) == "0s"
+
+
+def test_fcpxml_output_is_well_formed():
+    xml = "".join(iter_export(iter(MARKERS), "fcpxml", fps=29.97, title='Q3 "财报"'))
+    root = ET.fromstring(xml.encode("utf-8"))
+    assert root.find("resources/format").get("frameDuration") == "1001/30000s"
+    assert root.find("library/event").get("name") == 'Q3 "财报"'
+    sequence = root.find("library/event/project/sequence")
+    gap = sequence.find("spine/gap")
+    assert sequence.get("duration") == gap.get("duration") == _fcpx_time(61, 29.97)
+    markers = gap.findall("marker")
+    assert [m.get("value") for m in markers] == ["芯片", 'A&B "x"']
+    assert markers[1].get("start") == _fcpx_time(2.5, 29.97)
+    assert "素材：<b>" in markers[1].get("note")
+
+
+def test_csv_and_srt_exports():
+    rows = list(csv.reader(io.StringIO("".join(iter_export(MARKERS, "csv", fps=25)))))
+    assert rows[0] == ["Start", "End", "Text"]
+    assert rows[2][:2] == ["00:00:02:12", "00:01:01:00"]
+    srt = "".join(iter_export(MARKERS, "srt"))
+    assert srt.startswith("1\n00:00:00,000 --> 00:00:02,500\n关键词：芯片\n")
+
+
+def test_invalid_arguments_fail_before_any_output():
+    with pytest.raises(ValueError, match="不支持的导出格式"):
+        iter_export(MARKERS, "edl")
+    with pytest.raises(ValueError, match="帧率"):
+        iter_export(MARKERS, "csv", fps=-1)
+
+
+def test_markers_from_single_segment():
+    assets = {"pexels_results": [{"keyword": "a", "title": "x"}, {"keyword": "b", "title": "y"}],
+              "ai_image_prompt": {"prompt": "p"}}
+    assert [(m["start"], m["end"], m["keyword"]) for m in markers_from_assets(assets, 5)] == [(0, 5, "a"), (5, 10, "b")]
@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.sdk import youtube_client
+from app.sdk.youtube_client import TOKEN_REFRESHES, YouTubeClientManager
+
+
+def utcnow():
+    # 与 google-auth 一致：不带时区的 UTC 时间
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class FakeCredentials:
+    """只实现 YouTubeClientManager 用到的接口；expiry 由测试控制"""
+
+    def __init__(self, expires_in, refresh_token="refresh", failures=0, lifetime=3600):
+        self.token = "token-0"
+        self.expiry = None if expires_in is None else utcnow() + timedelta(seconds=expires_in)
+        self.refresh_token = refresh_token
+        self.failures = failures
+        self.lifetime = lifetime
+        self.refreshes = 0
+        self.lock = threading.Lock()
+
+    def refresh(self, request):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("token endpoint unavailable")
+            time.sleep(0.01)  # 放大并发窗口
+            self.token = f"token-{self.refreshes + 1}"
+            self.expiry = utcnow() + timedelta(seconds=self.lifetime)
+            self.refreshes += 1
+
+    def before_request(self, request, method, url, headers):
+        headers["authorization"] = f"Bearer {self.token}"
+
+    def to_json(self):
+        return json.dumps({"token": self.token, "refresh_token": self.refresh_token})
+
+
+@pytest.fixture
+def make_manager(tmp_path, monkeypatch):
+    managers = []
+
+    def make(credentials, **kwargs):
+        manager = YouTubeClientManager(token_file=str(tmp_path / "token.json"), **kwargs)
+        monkeypatch.setattr(manager, "_load_credentials", lambda: credentials)
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        manager.close()
+
+
+def test_seconds_left_uses_naive_utc(make_manager):
+    manager = make_manager(FakeCredentials(expires_in=600))
+    assert 595 < manager._seconds_left(manager._load_credentials()) <= 600
+    assert manager._seconds_left(FakeCredentials(expires_in=None)) is None
+    empty = FakeCredentials(expires_in=600)
+    empty.token = None
+    assert manager._seconds_left(empty) == 0.0
+
+
+def test_expired_token_is_refreshed_once_and_written_back_atomically(make_manager, tmp_path):
+    credentials = FakeCredentials(expires_in=-10)
+    manager = make_manager(credentials, refresh_margin=300)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: manager.credentials(), range(8)))
+
+    assert all(result is credentials for result in results)
+    assert credentials.refreshes == 1
+    with open(tmp_path / "token.json") as f:
+        assert json.load(f)["token"] == "token-1"
+    assert os.listdir(tmp_path) == ["token.json"]  # 临时文件已替换
+    assert manager._refresher is not None and manager._refresher.is_alive()
+
+
+def test_concurrent_refresh_happens_once_under_the_lock(make_manager):
+    credentials = FakeCredentials(expires_in=3600)
+    manager = make_manager(credentials, refresh_margin=300)
+    manager.credentials()
+    credentials.expiry = utcnow() + timedelta(seconds=60)  # 进入刷新窗口
+
+    with ThreadPoolExecutor(8) as pool:
+        refreshed = list(pool.map(lambda _: manager.refresh(), range(8)))
+    assert refreshed.count(True) == 1
+    assert credentials.refreshes == 1
+    assert manager.refresh() is False
+    assert manager.refresh(force=True) is True
+
+
+def test_failed_initial_refresh_is_not_cached(make_manager):
+    credentials = FakeCredentials(expires_in=-10, failures=1)
+    manager = make_manager(credentials)
+    errors_before = TOKEN_REFRESHES.value(result="error")
+
+    with pytest.raises(RuntimeError):
+        manager.credentials()
+    assert manager._credentials is None and manager._refresher is None
+    assert TOKEN_REFRESHES.value(result="error") == errors_before + 1
+
+    assert manager.credentials() is credentials
+    assert credentials.token == "token-1"
+
+
+def test_credentials_without_refresh_token_are_not_refreshed(make_manager):
+    manager = make_manager(FakeCredentials(expires_in=-10, refresh_token=None))
+    manager.credentials()
+    assert manager._refresher is None
+    with pytest.raises(ValueError, match="refresh_token"):
+        manager.refresh()
+
+
+def test_next_wait_targets_margin_before_expiry(make_manager, monkeypatch):
+    credentials = FakeCredentials(expires_in=1000)
+    manager = make_manager(credentials, refresh_margin=300)
+    monkeypatch.setattr(manager, "_start_refresher", lambda: None)
+    manager.credentials()
+
+    assert 695 < manager._next_wait() <= 700
+    credentials.expiry = utcnow() + timedelta(seconds=10)
+    assert manager._next_wait() == youtube_client._MIN_REFRESH_WAIT
+    credentials.expiry = None
+    assert manager._next_wait() is None
+
+
+def test_refresh_loop_retries_after_failure(make_manager, monkeypatch):
+    monkeypatch.setattr(youtube_client, "_MIN_REFRESH_WAIT", 0.01)
+    monkeypatch.setattr(youtube_client, "_REFRESH_RETRY", 0.05)
+    credentials = FakeCredentials(expires_in=3600)
+    manager = make_manager(credentials, refresh_margin=300)
+    manager.credentials()  # 令牌仍然有效：不刷新，后台线程等到到期前 300 秒
+
+    credentials.expiry = utcnow() + timedelta(seconds=1)
+    credentials.failures = 1
+    manager.close()
+    manager._start_refresher()  # 按新的到期时间重新计算等待
+
+    deadline = time.monotonic() + 2
+    while credentials.refreshes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert credentials.failures == 0 and credentials.refreshes == 1
+    assert manager._next_wait() > 3000  # 刷新成功后回到正常节奏
+    manager.close()
+    assert not manager._refresher.is_alive()
+
+
+def test_http_transport_is_per_thread(make_manager):
+    manager = make_manager(FakeCredentials(expires_in=3600), timeout=7)
+    main_http = manager.http()
+    assert manager.http() is main_http
+    assert main_http.http.timeout == 7
+
+    with ThreadPoolExecutor(1) as pool:
+        other_http = pool.submit(manager.http).result()
+    assert other_http is not main_http
+    assert other_http.credentials is main_http.credentials
+
+
+def test_service_is_built_once(make_manager, monkeypatch):
+    manager = make_manager(FakeCredentials(expires_in=3600))
+    builds = []
+    build = manager._build_service
+
+    def counting_build():
+        builds.append(1)
+        time.sleep(0.02)
+        return build()
+
+    monkeypatch.setattr(manager, "_build_service", counting_build)
+    with ThreadPoolExecutor(4) as pool:
+        services = list(pool.map(lambda _: manager.service(), range(4)))
+
+    assert len(builds) == 1
+    assert all(service is services[0] for service in services)
+    # 使用客户端库自带的静态发现文档，不请求网络
+    assert services[0].videos().list(part="id", id="abc").uri.startswith("https://youtube.googleapis.com/")